@@ -1,51 +1,32 @@
 import streamlit as st
-import json
-import os
 import uuid
 
+import pandas as pd
+
+from almacen import get_session, get_store
+from metricas import end_rerun, span, start_rerun
+
+start_rerun('SmartFarm')
+
 # =================================================================
 # SIMULACIÓN DE LA CONEXIÓN A FIREBASE (Firestore)
 # =================================================================
-
-# Variables globales provistas por el entorno
-app_id = os.environ.get('__app_id', 'smartfarm_default_app_id')
-FIREBASE_COLLECTION_PATH = f'artifacts/{app_id}/public/data/client_scores'
-DATA_FILE = "firestore_simulation.json"  # Archivo para persistencia simulada
+# La ruta de la colección y el archivo de datos se definen en almacen.py
 
 
 def init_firestore_db_simulation():
-    """Inicializa la base de datos simulada (carga o crea el archivo JSON)."""
+    """Inicializa la base de datos simulada (almacén compartido del proceso)."""
     if 'db_initialized' not in st.session_state:
-        # Intenta cargar los datos existentes
         try:
-            if os.path.exists(DATA_FILE):
-                with open(DATA_FILE, 'r') as f:
-                    st.session_state.firestore_data = json.load(f)
-            else:
-                st.session_state.firestore_data = {}  # Inicializa vacío si no existe
+            # La sesión no copia los datos: solo registra su vista sobre el almacén compartido.
+            get_session().snapshot()
         except Exception as e:
-            st.session_state.firestore_data = {}
-            st.warning(f"Error al cargar datos simulados: {e}. Inicializando vacío.")
+            st.warning(f"Error al cargar datos simulados: {e}.")
 
         st.session_state.db_initialized = True
 
-    # Inicialización de la base de datos simulada de la colección específica
-    if FIREBASE_COLLECTION_PATH not in st.session_state.firestore_data:
-        st.session_state.firestore_data[FIREBASE_COLLECTION_PATH] = {}
-        # Guardar inmediatamente para asegurar la estructura
-        save_to_json()
-
 
-def save_to_json():
-    """Guarda el diccionario de datos de Firestore simulado en el archivo JSON."""
-    try:
-        with open(DATA_FILE, 'w') as f:
-            json.dump(st.session_state.firestore_data, f, indent=4)
-    except Exception as e:
-        st.error(f"Error al guardar datos simulados en JSON: {e}")
-
-
-# Llamar a la inicialización antes de cualquier uso de st.session_state.firestore_data
+# Llamar a la inicialización antes de cualquier uso del almacén
 init_firestore_db_simulation()
 
 # Configuración inicial de la página Streamlit
@@ -83,9 +64,35 @@ st.markdown("---")
 
 # Nota: El resto del código de la página principal (si existiera) iría aquí.
 
+with st.expander("Uso de memoria del almacén por sesión"):
+    with span('memoria_almacen'):
+        report = get_store().memory_report()
+    figure_cache = report['figure_cache']
+    st.caption(
+        f"Versión de datos: {report['version']} | "
+        f"Instantánea compartida: {report['shared_bytes'] / 1024:,.1f} KiB | "
+        f"Caché de gráficos y KPIs: {figure_cache['entries']} entradas, {figure_cache['bytes'] / 1024:,.1f} KiB, "
+        f"{figure_cache['hits']} aciertos / {figure_cache['misses']} fallos | "
+        f"DataFrames por versión: {report['frame_cache']['entries']} entradas, "
+        f"{report['frame_cache']['bytes'] / 1024:,.1f} KiB"
+    )
+    st.dataframe(
+        pd.DataFrame(report['sessions'], columns=['session_id', 'version', 'pending_edits', 'bytes']).rename(
+            columns={
+                'session_id': 'Sesión',
+                'version': 'Versión leída',
+                'pending_edits': 'Ediciones pendientes',
+                'bytes': 'Memoria propia (bytes)',
+            }
+        ),
+        use_container_width=True,
+        hide_index=True
+    )
+
 # =================================================================
 # La tabla de datos de clientes no se incluye aquí ya que este es el archivo principal
 # pero las funcionalidades de las otras páginas dependen de la inicialización de la DB.
 
 # =================================================================
 
+end_rerun()
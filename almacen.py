@@ -0,0 +1,611 @@
+import os
+import sys
+import threading
+import uuid
+import weakref
+from contextlib import contextmanager
+from datetime import datetime
+from types import MappingProxyType
+
+import pandas as pd
+import streamlit as st
+
+from codificacion_puntajes import decode_scores, encode_scores
+from consultas import QueryLayer
+from figuras import FigureCache, VersionCache
+from instantaneas import FRAME_CACHE_BYTES, FRAME_CACHE_ENTRIES, ColumnarSnapshots
+from metricas import span
+from motor_puntuacion import ScoreAggregates
+from motor_sqlite import SQLITE_FILE, SQLiteEngine
+from motor_wal import ConflictError, WALEngine, WriteBatch, document_version  # noqa: F401 (reexportados para las páginas)
+from perfiles_puntaje import REGISTRY
+
+# =================================================================
+# ALMACÉN DE DOCUMENTOS COMPARTIDO (SIMULACIÓN DE FIRESTORE)
+# =================================================================
+# Único punto de acceso a los datos para SmartFarm.py y todas las páginas.
+# El almacén se crea una sola vez por proceso (st.cache_resource) y mantiene
+# los documentos en memoria; antes de servir una lectura compara inodo/tamaño
+# del WAL con lo ya leído y solo aplica los registros que agregaron otros
+# procesos. Un rerun sin cambios no vuelve a parsear el JSON.
+#
+# Todas las sesiones leen la misma instantánea inmutable (copia en escritura).
+# Cada sesión guarda solo un puntero a la versión que leyó y sus ediciones
+# pendientes, así la memoria no crece con sesiones × tamaño de la base.
+#
+# Varios usuarios (y varios procesos) pueden escribir a la vez: cada documento
+# lleva su versión ('_version'). Las escrituras aceptan expected_version para
+# no pisar cambios ajenos (ConflictError) y transaction() reintenta sola.
+#
+# Una página puede fijar la instantánea de su rerun (SessionView.pin): todas las
+# lecturas de la sesión usan esa misma versión hasta la próxima pin() o hasta que
+# la sesión escribe, así dos lecturas de un mismo rerun nunca se contradicen.
+#
+# Algunas colecciones se guardan codificadas (CODECS): los puntajes de los
+# clientes van como lista compacta (ver codificacion_puntajes.py). Las lecturas
+# reciben siempre los documentos decodificados, armados una vez por versión de
+# la colección.
+
+app_id = os.environ.get('__app_id', 'smartfarm_default_app_id')
+DATA_FILE = "firestore_simulation.json"
+
+# Motor de almacenamiento del despliegue: 'wal' (JSON + WAL) o 'sqlite' (índices por campo).
+# Para pasar a SQLite una base existente: python motor_sqlite.py firestore_simulation.json
+BACKEND = os.environ.get('SMARTFARM_BACKEND', 'wal')
+
+# Rutas de colección (deben ser únicas para cada tipo de dato)
+SCORES_COLLECTION_PATH = f'artifacts/{app_id}/public/data/client_scores'
+SALES_COLLECTION_PATH = f'artifacts/{app_id}/public/data/client_sales'
+PROJECTS_COLLECTION_PATH = f'artifacts/{app_id}/public/data/agronomy_projects'
+
+# Vistas de DuckDB para las consultas analíticas (ver consultas.py)
+QUERY_VIEWS = {
+    'client_scores': SCORES_COLLECTION_PATH,
+    'client_sales': SALES_COLLECTION_PATH,
+    'agronomy_projects': PROJECTS_COLLECTION_PATH,
+}
+
+# Codificación de los documentos guardados, por colección: (codificar, decodificar)
+CODECS = {
+    SCORES_COLLECTION_PATH: (encode_scores, decode_scores),
+}
+DECODED_VERSIONS = 2  # Versiones decodificadas que se conservan por colección (sesiones con pin)
+
+# Índices secundarios que mantiene el motor en memoria (colección, campo)
+INDEXES = [
+    (SALES_COLLECTION_PATH, 'ID_Cliente'),  # Ventas de un cliente sin recorrer todas
+]
+
+
+
+class _PendingEdit:
+    """Edición pendiente de una sesión: operación, documento resultante y campos modificados."""
+
+    __slots__ = ('op', 'document', 'fields')
+
+    def __init__(self, op, document, fields=None):
+        self.op = op  # 'set' | 'update' | 'delete'
+        self.document = document  # Documento tal como lo ve la sesión (None si se borra)
+        self.fields = fields  # Solo para 'update': se aplican como merge, sin pisar otros campos
+
+
+class Collection:
+    """Referencia a una colección con una API al estilo Firestore."""
+
+    def __init__(self, store, path, session=None):
+        self.store = store
+        self.path = path
+        self.session = session
+
+    def _docs(self):
+        source = self.session if self.session is not None else self.store
+        return self.store.documents(source.snapshot(), self.path)
+
+    def _pending(self):
+        if self.session is None:
+            return None
+        return self.session.pending.get(self.path)
+
+    def get(self, doc_id):
+        """Devuelve el documento o None si no existe."""
+        pending = self._pending()
+        if pending and doc_id in pending:
+            return pending[doc_id].document
+        return self._docs().get(doc_id)
+
+    def exists(self, doc_id):
+        return self.get(doc_id) is not None
+
+    def to_dict(self):
+        """Devuelve todos los documentos de la colección (id -> documento), de solo lectura."""
+        docs = self._docs()
+        pending = self._pending()
+        if not pending:
+            return docs
+        merged = dict(docs)
+        for doc_id, edit in pending.items():
+            if edit.document is None:
+                merged.pop(doc_id, None)
+            else:
+                merged[doc_id] = edit.document
+        return MappingProxyType(merged)
+
+    def stream(self):
+        """Devuelve la lista de documentos de la colección."""
+        return list(self.to_dict().values())
+
+    def frame(self, columns=None):
+        """DataFrame de solo lectura de la colección, desde su instantánea columnar (ver instantaneas.py).
+
+        Con ediciones pendientes en la sesión se arma desde los documentos.
+        """
+        if self._pending():
+            return pd.DataFrame(self.stream(), columns=columns)
+        source = self.session if self.session is not None else self.store
+        return self.store.columnar.frame(source.snapshot(), self.path, columns)
+
+    def version(self):
+        """Versión de la colección en la instantánea de la sesión (cambia solo si cambia uno de sus documentos)."""
+        source = self.session if self.session is not None else self.store
+        return source.snapshot().collection_version(self.path)
+
+    def table(self):
+        """Tabla Arrow de la instantánea columnar (sin las ediciones pendientes de la sesión)."""
+        source = self.session if self.session is not None else self.store
+        return self.store.columnar.table(source.snapshot(), self.path)
+
+    def where(self, field, value):
+        """Devuelve los documentos cuyo campo 'field' vale 'value' (por índice con SQLite)."""
+        pinned = self.session.pinned if self.session is not None else None
+        if pinned is None:
+            self.store.refresh()
+        found = self.store.engine.find(self.path, field, value, snapshot=pinned)
+        docs = {doc_id: self.store.decode(self.path, doc) for doc_id, doc in found.items()}
+        for doc_id, edit in (self._pending() or {}).items():
+            docs.pop(doc_id, None)
+            if edit.document is not None and edit.document.get(field) == value:
+                docs[doc_id] = edit.document
+        return list(docs.values())
+
+    # --- Escrituras inmediatas ---
+
+    # expected_version: None no valida; 0 exige que el documento no exista; n exige la
+    # versión n. Si no coincide se lanza ConflictError.
+
+    def _release_pin(self):
+        """La sesión va a escribir: sus próximas lecturas tienen que ver la versión nueva."""
+        if self.session is not None:
+            self.session.unpin()
+
+    def set(self, doc_id, document, expected_version=None):
+        """Crea o reemplaza un documento completo."""
+        self._release_pin()
+        return self.store.engine.put_document(
+            self.path, doc_id, self.store.encode(self.path, document), expected_version
+        )
+
+    def create(self, doc_id, document):
+        """Crea un documento nuevo; lanza ConflictError si ya existe."""
+        return self.set(doc_id, document, expected_version=0)
+
+    def update(self, doc_id, fields, expected_version=None):
+        """Actualiza campos de un documento existente. Devuelve False si no existe."""
+        self._release_pin()
+        if self.path in CODECS:
+            # Se vuelve a codificar el documento completo (los campos pueden ser puntajes de ítems)
+            return self.store.engine.merge_document(
+                self.path, doc_id, self.store.encoded_merge(self.path, fields), expected_version
+            )
+        return self.store.engine.update_document(self.path, doc_id, fields, expected_version)
+
+    def delete(self, doc_id, expected_version=None):
+        """Elimina un documento. Devuelve False si no existía."""
+        self._release_pin()
+        return self.store.engine.delete_document(self.path, doc_id, expected_version)
+
+    def transaction(self, doc_id, fn):
+        """Lee-modifica-escribe sobre la última versión: fn(doc | None) -> doc nuevo | None (borrar)."""
+        self._release_pin()
+
+        def encoded_fn(document):
+            return self.store.encode(self.path, fn(self.store.decode(self.path, document)))
+        return self.store.engine.transact(self.path, doc_id, encoded_fn)
+
+    # --- Ediciones pendientes de la sesión (se aplican con SessionView.commit) ---
+
+    def stage_set(self, doc_id, document):
+        self.session.stage(self.path, doc_id, _PendingEdit('set', dict(document)))
+
+    def stage_update(self, doc_id, fields):
+        """Prepara una actualización. Devuelve False si el documento no existe."""
+        current = self.get(doc_id)
+        if current is None:
+            return False
+        previous = (self._pending() or {}).get(doc_id)
+        if previous is not None and previous.op == 'update':
+            fields = {**previous.fields, **fields}
+        op = 'set' if previous is not None and previous.op == 'set' else 'update'
+        self.session.stage(self.path, doc_id, _PendingEdit(op, {**current, **fields}, dict(fields)))
+        return True
+
+    def stage_delete(self, doc_id):
+        """Prepara un borrado. Devuelve False si el documento no existe."""
+        if self.get(doc_id) is None:
+            return False
+        self.session.stage(self.path, doc_id, _PendingEdit('delete', None))
+        return True
+
+
+class _StoreBatch(WriteBatch):
+    """Lote de escrituras del almacén: guarda los documentos con la codificación de su colección."""
+
+    def __init__(self, store):
+        super().__init__(store.engine)
+        self.store = store
+
+    def set(self, collection, doc_id, document, expected_version=None):
+        return super().set(collection, doc_id, self.store.encode(collection, document), expected_version)
+
+    def update(self, collection, doc_id, fields, expected_version=None):
+        if collection in CODECS:
+            return self.merge(collection, doc_id, self.store.encoded_merge(collection, fields), expected_version)
+        return super().update(collection, doc_id, fields, expected_version)
+
+
+class _SessionBatch(_StoreBatch):
+    """Lote de escrituras de una sesión: al confirmarlo, la sesión suelta su instantánea fijada."""
+
+    def __init__(self, session):
+        super().__init__(session.store)
+        self.session = session
+
+    def commit(self):
+        self.session.unpin()
+        return super().commit()
+
+
+class SessionView:
+    """Vista de una sesión de navegador: versión leída + ediciones pendientes."""
+
+    def __init__(self, store, session_id):
+        self.store = store
+        self.session_id = session_id
+        self.version = None
+        self.pinned = None  # Instantánea fijada para el rerun en curso (ver pin)
+        self.pending = {}  # ruta -> {id: _PendingEdit}
+
+    def snapshot(self):
+        """Instantánea fijada del rerun o, si no hay, la más reciente; registra la versión leída."""
+        snapshot = self.pinned if self.pinned is not None else self.store.snapshot()
+        self.version = snapshot.version
+        return snapshot
+
+    def pin(self):
+        """Toma la instantánea más reciente y la usa para todas las lecturas hasta la próxima pin().
+
+        Se llama al comienzo de cada rerun (y de cada callback, que corre antes). Las
+        escrituras de la sesión la sueltan para que las lecturas siguientes las vean.
+        """
+        self.pinned = None
+        self.pinned = self.snapshot()
+        return self.pinned
+
+    def unpin(self):
+        self.pinned = None
+
+    @contextmanager
+    def snapshot_scope(self):
+        """Fija la instantánea más reciente durante el bloque, salvo que el rerun ya tenga una fijada.
+
+        Para las secciones (fragments) que se re-ejecutan solas: sus lecturas y la versión con la
+        que cachean lo leído salen de la misma instantánea.
+        """
+        if self.pinned is not None:
+            yield self.pinned
+            return
+        try:
+            yield self.pin()
+        finally:
+            self.unpin()
+
+    def collection(self, path):
+        return Collection(self.store, path, session=self)
+
+    def query(self, sql, params=None, **frames):
+        """Consulta SQL sobre la instantánea de la sesión (sin sus ediciones pendientes)."""
+        return self.store.query(sql, params, snapshot=self.snapshot(), **frames)
+
+    def batch(self):
+        return _SessionBatch(self)
+
+    def stage(self, path, doc_id, edit):
+        self.pending.setdefault(path, {})[doc_id] = edit
+
+    def commit(self):
+        """Aplica las ediciones pendientes en un solo lote atómico. Devuelve cuántas se aplicaron.
+
+        Las actualizaciones se aplican como merge de campos sobre la última versión,
+        así no se pierden los cambios que otro usuario hizo en otros campos.
+        """
+        batch = self.batch()
+        for path, docs in self.pending.items():
+            for doc_id, edit in docs.items():
+                if edit.op == 'delete':
+                    batch.delete(path, doc_id)
+                elif edit.op == 'update':
+                    batch.update(path, doc_id, edit.fields)
+                else:
+                    batch.set(path, doc_id, edit.document)
+        applied = batch.commit()
+        self.pending = {}
+        return applied
+
+    def discard(self):
+        self.pending = {}
+
+    def memory_bytes(self):
+        """Memoria propia de la sesión (puntero de versión + ediciones pendientes)."""
+        pending = {
+            path: {doc_id: (edit.op, edit.document, edit.fields) for doc_id, edit in docs.items()}
+            for path, docs in self.pending.items()
+        }
+        return sys.getsizeof(self) + _deep_sizeof(self.version) + _deep_sizeof(pending)
+
+
+class LatestProjects:
+    """Último proyecto de cada cliente (por Fecha_Registro): vista materializada de los proyectos.
+
+    Se actualiza con cada alta, modificación o baja de un proyecto (apply), así
+    buscar el último proyecto de un cliente no recorre ni ordena la colección.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_client = {}  # cliente -> {id de proyecto: clave de orden}
+        self._latest = {}  # cliente -> (clave de orden, id) del más reciente
+
+    @staticmethod
+    def sort_key(document):
+        """Clave de orden: las fechas válidas van después de las que no se pueden interpretar."""
+        registered = document.get('Fecha_Registro')
+        try:
+            return 1, datetime.fromisoformat(str(registered)), document.get('id') or ''
+        except ValueError:
+            return 0, str(registered or '2000-01-01'), document.get('id') or ''
+
+    def reset(self):
+        with self._lock:
+            self._by_client = {}
+            self._latest = {}
+
+    def apply(self, previous, document):
+        with self._lock:
+            if previous is not None and previous.get('Cliente') is not None:
+                self._remove(previous['Cliente'], previous.get('id'))
+            if document is not None and document.get('Cliente') is not None:
+                self._add(document['Cliente'], document.get('id'), self.sort_key(document))
+
+    def _add(self, client, project_id, key):
+        self._by_client.setdefault(client, {})[project_id] = key
+        latest = self._latest.get(client)
+        if latest is None or key > latest[0]:
+            self._latest[client] = (key, project_id)
+
+    def _remove(self, client, project_id):
+        projects = self._by_client.get(client)
+        if projects is None or projects.pop(project_id, None) is None:
+            return
+        if not projects:
+            del self._by_client[client]
+            del self._latest[client]
+        elif self._latest[client][1] == project_id:
+            # Solo se recorren los proyectos de este cliente
+            self._latest[client] = max((key, doc_id) for doc_id, key in projects.items())
+
+    def latest(self, client):
+        """Id del proyecto más reciente del cliente (None si no tiene)."""
+        with self._lock:
+            latest = self._latest.get(client)
+        return latest[1] if latest is not None else None
+
+
+class DocumentStore:
+    """Almacén de documentos del proceso, respaldado por un motor (WAL o SQLite)."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._decoded = {}  # colección -> {versión de la colección: documentos decodificados}
+        self._decoded_lock = threading.Lock()
+        self.columnar = ColumnarSnapshots(documents=self.documents)
+        self.queries = QueryLayer(self.columnar, QUERY_VIEWS)
+        self.figures = FigureCache()  # Figuras y KPIs por versión de colección (ver figuras.py)
+        self.frames = VersionCache(FRAME_CACHE_BYTES, FRAME_CACHE_ENTRIES)  # DataFrames derivados (página 1)
+        self._sessions = weakref.WeakValueDictionary()
+        self._sessions_lock = threading.Lock()
+
+    @property
+    def version(self):
+        """Versión de los datos; cambia con cada escritura o recarga."""
+        return self.engine.version
+
+    def refresh(self):
+        """Incorpora lo que otros procesos agregaron al WAL desde la última lectura."""
+        with span('almacen.refresh'):
+            return self.engine.refresh()
+
+    def snapshot(self):
+        """Instantánea inmutable de la última versión, compartida por todas las sesiones."""
+        self.refresh()
+        return self.engine.snapshot()
+
+    def collection(self, path):
+        return Collection(self, path)
+
+    def documents(self, snapshot, path):
+        """Documentos de la colección en la instantánea, decodificados (id -> documento), de solo lectura."""
+        docs = snapshot.collection(path)
+        codec = CODECS.get(path)
+        if codec is None:
+            return docs
+        version = snapshot.collection_version(path)
+        with self._decoded_lock:
+            versions = self._decoded.setdefault(path, {})
+            decoded = versions.get(version)
+            if decoded is None:
+                decode = codec[1]
+                decoded = versions[version] = MappingProxyType({doc_id: decode(doc) for doc_id, doc in docs.items()})
+                for old in sorted(versions)[:-DECODED_VERSIONS]:
+                    del versions[old]
+        return decoded
+
+    def encode(self, path, document):
+        """Documento tal como se guarda en la colección (ver CODECS)."""
+        codec = CODECS.get(path)
+        return codec[0](document) if codec is not None and document is not None else document
+
+    def decode(self, path, document):
+        """Documento guardado tal como lo leen las páginas."""
+        codec = CODECS.get(path)
+        return codec[1](document) if codec is not None and document is not None else document
+
+    def encoded_merge(self, path, fields):
+        """merge(documento guardado) -> documento codificado con 'fields' aplicados (ver merge_document)."""
+        def merge(stored):
+            return self.encode(path, {**self.decode(path, stored), **fields})
+        return merge
+
+    def migrate_encodings(self):
+        """Reescribe con la codificación de su colección los documentos guardados antes de ella.
+
+        Un solo lote atómico por colección; si otro proceso modificó alguno de esos
+        documentos mientras tanto, se vuelve a intentar. Devuelve cuántos se reescribieron.
+        """
+        migrated = 0
+        for path, (encode, _) in CODECS.items():
+            while True:
+                batch = self.engine.batch()
+                for doc_id, document in self.snapshot().collection(path).items():
+                    encoded = encode(document)
+                    if encoded is not document:
+                        batch.set(path, doc_id, encoded, expected_version=document_version(document))
+                try:
+                    migrated += batch.commit()
+                    break
+                except ConflictError:
+                    continue
+        return migrated
+
+    def query(self, sql, params=None, snapshot=None, **frames):
+        """Consulta SQL de DuckDB sobre las vistas de QUERY_VIEWS (y los DataFrames de 'frames')."""
+        return self.queries.query(snapshot or self.snapshot(), sql, params, **frames)
+
+    def batch(self):
+        """Lote de escrituras atómico: batch.set/update/delete(ruta, id, ...) y luego batch.commit()."""
+        return _StoreBatch(self)
+
+    def score_aggregates(self, snapshot=None):
+        """Agregados de Puntaje Total por Categoría × Sucursal × Perfil, mantenidos con cada escritura.
+
+        snapshot: instantánea fijada por la sesión; se devuelven los agregados de esa
+        instantánea (una copia, o recalculados si la vista ya incluye cambios posteriores).
+        """
+        self.refresh()
+        view = self.engine.ensure_view(
+            'score_aggregates', SCORES_COLLECTION_PATH, lambda: ScoreAggregates(REGISTRY)
+        )
+        if snapshot is None:
+            return view
+        return self.engine.view_at('score_aggregates', snapshot, lambda: ScoreAggregates(REGISTRY))
+
+    def latest_project(self, client, snapshot=None):
+        """(id, documento) del proyecto más reciente del cliente, o (None, None).
+
+        snapshot: instantánea fijada por la sesión; si quedó atrás de la vista, se
+        busca en ella recorriendo solo los proyectos del cliente.
+        """
+        if snapshot is None:
+            self.refresh()
+            snapshot = self.engine.snapshot()
+        projects = snapshot.collection(PROJECTS_COLLECTION_PATH)
+        view = self.engine.ensure_view('latest_projects', PROJECTS_COLLECTION_PATH, LatestProjects)
+        if snapshot.version == self.engine.version:
+            doc_id = view.latest(client)
+            if doc_id is None:
+                return None, None
+            if doc_id in projects:
+                return doc_id, projects[doc_id]
+        # La vista ya incluye cambios posteriores a la instantánea
+        client_projects = self.engine.find(PROJECTS_COLLECTION_PATH, 'Cliente', client, snapshot=snapshot)
+        if not client_projects:
+            return None, None
+        doc_id = max(client_projects, key=lambda project_id: LatestProjects.sort_key(client_projects[project_id]))
+        return doc_id, client_projects[doc_id]
+
+    def open_session(self):
+        view = SessionView(self, uuid.uuid4().hex)
+        with self._sessions_lock:
+            self._sessions[view.session_id] = view
+        return view
+
+    def memory_report(self):
+        """Memoria compartida de la instantánea y memoria propia de cada sesión activa."""
+        snapshot = self.engine.snapshot()
+        shared = sum(_deep_sizeof(snapshot.collection(col)) for col in snapshot.collections())
+        with self._sessions_lock:
+            sessions = list(self._sessions.values())
+        return {
+            'version': snapshot.version,
+            'shared_bytes': shared,
+            'figure_cache': self.figures.stats(),
+            'frame_cache': self.frames.stats(),
+            'sessions': [
+                {
+                    'session_id': view.session_id,
+                    'version': view.version,
+                    'pending_edits': sum(len(docs) for docs in view.pending.values()),
+                    'bytes': view.memory_bytes(),
+                }
+                for view in sessions
+            ],
+        }
+
+
+def _deep_sizeof(obj):
+    """Tamaño aproximado en bytes de una estructura de dicts/listas/escalares."""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (dict, MappingProxyType)):
+        size += sum(_deep_sizeof(k) + _deep_sizeof(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(_deep_sizeof(item) for item in obj)
+    return size
+
+
+def open_engine(backend=BACKEND):
+    """Crea el motor de almacenamiento configurado para el despliegue."""
+    if backend == 'sqlite':
+        engine = SQLiteEngine(SQLITE_FILE)
+    elif backend == 'wal':
+        engine = WALEngine(DATA_FILE)
+    else:
+        raise ValueError(f"SMARTFARM_BACKEND desconocido: '{backend}' (valores posibles: 'wal', 'sqlite').")
+    for collection, field in INDEXES:
+        engine.ensure_index(collection, field)
+    return engine
+
+
+@st.cache_resource(show_spinner=False)
+def get_store(backend=BACKEND):
+    """Devuelve el almacén compartido por todas las sesiones y páginas del proceso."""
+    store = DocumentStore(open_engine(backend))
+    store.migrate_encodings()
+    return store
+
+
+def get_session():
+    """Devuelve la vista del almacén de la sesión actual (solo versión + ediciones pendientes)."""
+    store = get_store()
+    view = st.session_state.get('almacen_session')
+    if view is None or view.store is not store:
+        view = store.open_session()
+        st.session_state.almacen_session = view
+    return view
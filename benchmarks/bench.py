@@ -0,0 +1,351 @@
+"""Benchmarks de los caminos críticos de la app sobre datos sintéticos.
+
+Para cada escala (clientes; ventas = clientes; proyectos = clientes / 10) mide carga y
+guardado del almacén, cálculo de puntajes, KPIs de ventas, dashboard de Agronomy
+Analyzer y reruns completos de cada página con AppTest. Informa p50/p95 (ms) y
+rendimiento, y permite guardar una línea base (con el commit medido) y comparar
+contra ella. También informa cuántas entradas y bytes ocupa la caché de DataFrames
+por versión (store.frames) tras varias versiones de las ventas.
+
+Uso:
+  python benchmarks/bench.py                              # escalas 1k/10k/100k
+  python benchmarks/bench.py --escalas 1000 --guardar-base
+  python benchmarks/bench.py --escalas 1000 --comparar    # sale con 1 si hay regresiones
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from almacen import (  # noqa: E402
+    PROJECTS_COLLECTION_PATH, QUERY_VIEWS, SALES_COLLECTION_PATH, SCORES_COLLECTION_PATH, DocumentStore
+)
+from codificacion_puntajes import decode_scores  # noqa: E402
+from consultas import QueryLayer  # noqa: E402
+from generador import write_dataset  # noqa: E402
+from instantaneas import FRAME_CACHE_BYTES, FRAME_CACHE_ENTRIES, ColumnarSnapshots  # noqa: E402
+from motor_puntuacion import score_clients  # noqa: E402
+from motor_wal import WALEngine  # noqa: E402
+from perfiles_puntaje import REGISTRY  # noqa: E402
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+DEFAULT_SCALES = [1000, 10000, 100000]
+PAGES = [
+    'SmartFarm.py',
+    'pages/1_Puntuación_SmartFarm.py',
+    'pages/2_Análisis_de_Puntuación.py',
+    'pages/3_Gestión_de_Ventas.py',
+    'pages/4_Proyectos_Agronomy_Analyzer.py',
+]
+SALES_COLUMNS = ['ID_Venta', 'ID_Cliente', 'Cliente', 'Tipo de Venta', 'Estado de Venta', 'Detalle', 'Monto',
+                 'Fecha Registro']
+
+
+# --- Medición ---
+
+def measure(fn, repetitions, budget_seconds, items=1):
+    """Ejecuta fn hasta 'repetitions' veces (mínimo 3, o lo que entre en el presupuesto).
+
+    Se descarta una primera ejecución de calentamiento. Devuelve p50/p95 en ms y
+    rendimiento en ítems por segundo (según la mediana).
+    """
+    fn()
+    timings = []
+    deadline = time.perf_counter() + budget_seconds
+    while len(timings) < repetitions and (len(timings) < 3 or time.perf_counter() < deadline):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    p50, p95 = np.percentile(timings, [50, 95])
+    return {
+        'p50_ms': round(p50 * 1000, 3),
+        'p95_ms': round(p95 * 1000, 3),
+        'throughput': round(items / p50, 1) if p50 > 0 else None,
+        'samples': len(timings),
+    }
+
+
+# --- Caminos críticos (mismos cálculos que las páginas) ---
+
+def sales_kpis(records):
+    """KPIs y resúmenes de 'Gestión de Ventas'."""
+    df = pd.DataFrame(records, columns=SALES_COLUMNS)
+    summary_status = df.groupby('Estado de Venta')['Monto'].sum().reset_index()
+    monto_cerrado = summary_status[summary_status['Estado de Venta'] == 'Cerrado']['Monto'].sum()
+    monto_posible = summary_status[summary_status['Estado de Venta'] == 'Posible']['Monto'].sum()
+    summary_type = df.groupby('Tipo de Venta')['Monto'].sum().reset_index()
+    return monto_cerrado + monto_posible, summary_type
+
+
+def sales_kpis_sql(queries, snapshot):
+    """Los mismos KPIs de 'Gestión de Ventas' con DuckDB sobre la vista client_sales."""
+    summaries = [
+        queries.query(snapshot, f'SELECT "{column}", SUM("Monto") AS "Monto" FROM client_sales '
+                                f'WHERE "{column}" IS NOT NULL GROUP BY 1 ORDER BY 1')
+        for column in ('Estado de Venta', 'Tipo de Venta')
+    ]
+    summary_status, summary_type = summaries
+    return summary_status['Monto'].sum(), summary_type
+
+
+def agronomy_dashboard(projects):
+    """Tabla y dashboard de 'Proyectos Agronomy Analyzer' (sin filtros)."""
+    df = pd.DataFrame(projects)
+    df['Total_Horas'] = df['Planificacion_Horas'] + df['Recopilacion_Horas'] + df['Informe_Horas']
+    df['Fecha_Registro_dt'] = pd.to_datetime(df['Fecha_Registro'], errors='coerce')
+    df = df.sort_values(by='Fecha_Registro_dt', ascending=False).drop(columns=['Fecha_Registro_dt'])
+    total_hours = df['Total_Horas'].sum()
+    completed = df[df['Informe_Estado'] == 'Completado'].shape[0]
+    stage_hours = df[['Planificacion_Horas', 'Recopilacion_Horas', 'Informe_Horas']].sum()
+    protocol_status = df.groupby('Protocolo')['Informe_Estado'].value_counts().unstack(fill_value=0)
+    return total_hours, completed, stage_hours, protocol_status
+
+
+def decoded_documents(snapshot, collection):
+    """Documentos de la colección como los lee la app (puntajes decodificados)."""
+    docs = snapshot.collection(collection)
+    if collection != SCORES_COLLECTION_PATH:
+        return docs
+    return {doc_id: decode_scores(doc) for doc_id, doc in docs.items()}
+
+
+# --- Escenarios ---
+
+def bench_scale(scale, args, profiles):
+    results = {}
+    work = tempfile.mkdtemp(prefix=f'smartfarm_bench_{scale}_')
+    try:
+        data_file = os.path.join(work, 'firestore_simulation.json')
+        data = write_dataset(data_file, scale, scale, max(scale // 10, 1), seed=args.semilla)
+        budget = args.presupuesto
+
+        results['carga_almacen'] = measure(
+            lambda: WALEngine(data_file, compact_threshold=float('inf')).close(), args.repeticiones, budget,
+            items=scale
+        )
+
+        engine = WALEngine(data_file, compact_threshold=float('inf'))
+        client_ids = list(data[SCORES_COLLECTION_PATH])
+        counter = iter(range(10 ** 9))
+
+        def save_one():
+            doc_id = client_ids[next(counter) % len(client_ids)]
+            engine.update_document(SCORES_COLLECTION_PATH, doc_id, {'Sucursal': 'Pilar'})
+
+        def save_batch():
+            batch = engine.batch()
+            for _ in range(100):
+                batch.update(SCORES_COLLECTION_PATH, client_ids[next(counter) % len(client_ids)], {'Sucursal': 'Pilar'})
+            batch.commit()
+
+        results['guardado_documento'] = measure(save_one, args.repeticiones, budget)
+        results['guardado_lote_100'] = measure(save_batch, args.repeticiones, budget, items=100)
+
+        stored_scores = list(engine.get_collection(SCORES_COLLECTION_PATH).values())
+        results['decodificacion_puntajes'] = measure(
+            lambda: [decode_scores(doc) for doc in stored_scores], args.repeticiones, budget, items=scale
+        )
+        scores = [decode_scores(doc) for doc in stored_scores]
+        sales = list(engine.get_collection(SALES_COLLECTION_PATH).values())
+        projects = list(engine.get_collection(PROJECTS_COLLECTION_PATH).values())
+
+        df_scores = pd.DataFrame(scores)
+        results['dataframe_puntajes'] = measure(lambda: pd.DataFrame(scores), args.repeticiones, budget, items=scale)
+        # Instantánea columnar ya publicada: lo que paga cada rerun de una página de solo lectura
+        columnar = ColumnarSnapshots(os.path.join(work, 'columnar'), documents=decoded_documents)
+        snapshot = engine.snapshot()
+        results['dataframe_columnar'] = measure(
+            lambda: columnar.frame(snapshot, SCORES_COLLECTION_PATH), args.repeticiones, budget, items=scale
+        )
+        queries = QueryLayer(columnar, QUERY_VIEWS)
+        results['kpis_ventas_duckdb'] = measure(
+            lambda: sales_kpis_sql(queries, snapshot), args.repeticiones, budget, items=len(sales)
+        )
+        results.update(bench_sales_frames(scale, engine, sales, args))
+        engine.close()
+        results['puntaje_total'] = measure(
+            lambda: score_clients(df_scores, profiles), args.repeticiones, budget, items=scale
+        )
+        results['kpis_ventas'] = measure(lambda: sales_kpis(sales), args.repeticiones, budget, items=len(sales))
+        results['dashboard_agronomia'] = measure(
+            lambda: agronomy_dashboard(projects), args.repeticiones, budget, items=len(projects)
+        )
+
+        if not args.sin_paginas:
+            results.update(bench_pages(work, data_file, args))
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    return results
+
+
+def bench_sales_frames(scale, engine, sales, args):
+    """DataFrame de 'Gestión de Ventas': st.cache_data sobre los registros vs. la tabla columnar de la colección.
+
+    Con st.cache_data, cada llamada (aun acertando) hashea la lista completa de registros.
+    """
+    import streamlit as st
+    from streamlit.logger import set_log_level
+
+    set_log_level('error')  # Sin el aviso de st.cache_data fuera de una app
+
+    @st.cache_data(max_entries=FRAME_CACHE_ENTRIES, show_spinner=False)
+    def get_sales_dataframe(records):
+        return pd.DataFrame(records, columns=SALES_COLUMNS)
+
+    store = DocumentStore(engine)
+    collection = store.collection(SALES_COLLECTION_PATH)
+    results = {
+        'dataframe_ventas_cache_data': measure(
+            lambda: get_sales_dataframe(sales), args.repeticiones, args.presupuesto, items=len(sales)
+        ),
+        'dataframe_ventas_columnar': measure(
+            lambda: collection.frame(SALES_COLUMNS), args.repeticiones, args.presupuesto, items=len(sales)
+        ),
+    }
+    get_sales_dataframe.clear()
+
+    # Cada escritura es una versión nueva de las ventas: la caché no pasa de sus cotas
+    sale_ids = list(collection.to_dict())
+    versions = FRAME_CACHE_ENTRIES * 3
+    def build():
+        return collection.frame(SALES_COLUMNS)
+
+    for i in range(versions):
+        collection.update(sale_ids[i % len(sale_ids)], {'Monto': float(i)})
+        store.frames.value((SALES_COLLECTION_PATH, 'ventas'), collection.version(), build)
+    stats = store.frames.stats()
+    print(
+        f"Escala {scale:,}: caché de DataFrames de ventas tras {versions} versiones: "
+        f"{stats['entries']} entradas (máx. {FRAME_CACHE_ENTRIES}), {stats['bytes'] / 2 ** 20:,.1f} MiB "
+        f"(máx. {FRAME_CACHE_BYTES / 2 ** 20:,.0f}), {stats['evictions']} desalojos"
+    )
+    return results
+
+
+def bench_pages(work, data_file, args):
+    """Primer render y reruns de cada página con AppTest, sobre una copia de la app."""
+    import streamlit as st
+    from streamlit.logger import set_log_level
+    from streamlit.testing.v1 import AppTest
+
+    set_log_level('error')  # Sin avisos de deprecación en cada rerun
+
+    app_dir = os.path.join(work, 'app')
+    shutil.copytree(ROOT, app_dir, ignore=shutil.ignore_patterns(
+        '.git', '__pycache__', 'benchmarks', 'firestore_simulation.json*', '*.sqlite3*'))
+    shutil.copy(data_file, os.path.join(app_dir, 'firestore_simulation.json'))
+
+    results = {}
+    previous_cwd = os.getcwd()
+    os.chdir(app_dir)
+    try:
+        # El almacén es un recurso cacheado del proceso: se descarta el de la escala anterior
+        st.cache_resource.clear()
+        st.cache_data.clear()
+        for page in PAGES:
+            name = 'pagina_' + os.path.splitext(os.path.basename(page))[0]
+            at = AppTest.from_file(page, default_timeout=args.timeout_pagina)
+            start = time.perf_counter()
+            at.run()
+            first = time.perf_counter() - start
+            if at.exception:
+                print(f"AVISO: {page} lanzó una excepción: {at.exception[0].value}")
+            results[name + '_primer_render'] = {'p50_ms': round(first * 1000, 3), 'p95_ms': round(first * 1000, 3),
+                                                'throughput': None, 'samples': 1}
+            results[name + '_rerun'] = measure(at.run, args.repeticiones, args.presupuesto)
+    finally:
+        os.chdir(previous_cwd)
+    return results
+
+
+# --- Informe y línea base ---
+
+def print_results(scale, results, baseline=None, tolerance=0.0):
+    """Imprime la tabla de una escala; devuelve los escenarios que empeoraron respecto de la base."""
+    regressions = []
+    print(f"\n== Escala {scale:,} ==")
+    print(f"{'Escenario':<48}{'p50 ms':>12}{'p95 ms':>12}{'ítems/s':>14}{'vs base':>10}")
+    for name, result in results.items():
+        base = (baseline or {}).get(str(scale), {}).get(name)
+        comparison = ''
+        if base and base['p50_ms'] > 0:
+            ratio = result['p50_ms'] / base['p50_ms']
+            comparison = f"{ratio:.2f}x"
+            # Un primer render es una sola muestra: se informa pero no se marca como regresión
+            if ratio > 1 + tolerance and result['samples'] >= 3:
+                comparison += ' !'
+                regressions.append((scale, name, ratio))
+        throughput = f"{result['throughput']:,.0f}" if result['throughput'] else '-'
+        print(f"{name:<48}{result['p50_ms']:>12,.2f}{result['p95_ms']:>12,.2f}{throughput:>14}{comparison:>10}")
+    return regressions
+
+
+def current_commit():
+    """Commit sobre el que se midió (HEAD), o None fuera de un repo git."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short=12', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--escalas', type=int, nargs='+', default=DEFAULT_SCALES)
+    parser.add_argument('--repeticiones', type=int, default=20, help="máximo de mediciones por escenario")
+    parser.add_argument('--presupuesto', type=float, default=10.0, help="segundos por escenario (mínimo 3 mediciones)")
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--sin-paginas', action='store_true', help="omite los reruns con AppTest")
+    parser.add_argument('--timeout-pagina', type=float, default=600.0)
+    parser.add_argument('--base', default=BASELINE_FILE, help="archivo de línea base")
+    parser.add_argument('--guardar-base', action='store_true', help="guarda los resultados como línea base")
+    parser.add_argument('--comparar', action='store_true', help="compara contra la línea base")
+    parser.add_argument('--tolerancia', type=float, default=0.25, help="empeoramiento de p50 admitido (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.comparar:
+        with open(args.base) as f:
+            baseline = json.load(f)['results']
+
+    profiles = REGISTRY
+    all_results = {}
+    regressions = []
+    for scale in args.escalas:
+        all_results[str(scale)] = bench_scale(scale, args, profiles)
+        regressions += print_results(scale, all_results[str(scale)], baseline, args.tolerancia)
+
+    if args.guardar_base:
+        with open(args.base, 'w') as f:
+            json.dump({
+                'created': datetime.now().isoformat(timespec='seconds'),
+                'commit': current_commit(),
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'results': all_results,
+            }, f, indent=2)
+        print(f"\nLínea base guardada en {args.base}")
+
+    if regressions:
+        print(f"\nREGRESIONES (p50 más de {args.tolerancia:.0%} peor que la base):")
+        for scale, name, ratio in regressions:
+            print(f"  {scale:,} · {name}: {ratio:.2f}x")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""Generador reproducible de datos sintéticos para los benchmarks.
+
+Crea N clientes repartidos entre las categorías del registro de perfiles, M ventas y
+K proyectos de Agronomy Analyzer con la misma forma que guarda el almacén (los
+puntajes codificados como lista compacta), en el formato de firestore_simulation.json.
+
+Uso:  python benchmarks/generador.py salida.json [--clientes 1000] [--ventas 1000] [--proyectos 100] [--semilla 42]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from almacen import PROJECTS_COLLECTION_PATH, SALES_COLLECTION_PATH, SCORES_COLLECTION_PATH  # noqa: E402
+from codificacion_puntajes import encode_scores  # noqa: E402
+from perfiles_puntaje import REGISTRY  # noqa: E402
+
+SUCURSALES = ["Córdoba", "Sinsacate", "Pilar", "Arroyito", "Santa Rosa"]
+PERFILES = ["Tipo 1", "Tipo 2", "Tipo 3"]
+TIPOS_VENTA = ["Componente", "Activación", "Servicio"]
+ESTADOS_VENTA = ["Posible", "Cerrado"]
+PROTOCOLOS_AA = ["Pulverizadora PLA", "Sembradora PLA", "Sembradora JD", "ExactApply", "AutoPath",
+                 "S700 Combine Advisor", "S7 Automation", "Autotrac Turn Automation", "Machine Sync",
+                 "HarvestLab", "Grain Sensing"]
+ESTADOS_PROYECTO = ["No Iniciado", "En Proceso", "Completado"]
+
+
+def generate_dataset(clients, sales, projects, seed=42, profiles=None):
+    """Devuelve {ruta de colección: {id: documento}} con los datos sintéticos."""
+    rng = random.Random(seed)
+    profiles = profiles or REGISTRY
+    categories = list(profiles.categories)
+    start = datetime(2025, 1, 1)
+
+    scores = {}
+    for i in range(clients):
+        client_id = f"{100000 + i}"
+        category = categories[i % len(categories)]
+        doc = {
+            "Cliente": f"Cliente {i:06d}",
+            "Categoria_Evaluacion": category,
+            "Sucursal": rng.choice(SUCURSALES),
+            "Perfil Tecnológico": rng.choice(PERFILES),
+        }
+        profile = profiles.current(category)
+        doc.update({item: rng.randint(0, max_score) for item, max_score in zip(profile.items, profile.max_scores)})
+        doc["ID_Cliente"] = client_id
+        scores[client_id] = encode_scores(doc)
+
+    client_ids = list(scores)
+    sales_docs = {}
+    for i in range(sales if client_ids else 0):
+        client_id = rng.choice(client_ids)
+        sale_id = f"venta-{i:07d}"
+        sales_docs[sale_id] = {
+            'ID_Venta': sale_id,
+            'ID_Cliente': client_id,
+            'Cliente': scores[client_id]['Cliente'],
+            'Tipo de Venta': rng.choice(TIPOS_VENTA),
+            'Estado de Venta': rng.choice(ESTADOS_VENTA),
+            'Detalle': f"Oportunidad sintética {i}",
+            'Monto': float(rng.randrange(100, 50000, 100)),
+            'Fecha Registro': (start + timedelta(minutes=i)).strftime("%Y-%m-%d %H:%M"),
+        }
+
+    project_docs = {}
+    for i in range(projects if client_ids else 0):
+        client = scores[rng.choice(client_ids)]
+        project_id = f"proyecto-{i:07d}"
+        hours = [rng.randint(0, 40) for _ in range(3)]
+        project_docs[project_id] = {
+            "id": project_id,
+            "Cliente": client["Cliente"],
+            "Sucursal": client["Sucursal"],
+            "Perfil_Tecnologico": client["Categoria_Evaluacion"],
+            "Protocolo": rng.choice(PROTOCOLOS_AA),
+            "Nombre_Evaluacion": f"Evaluación {i}",
+            "Ubicacion_Evaluacion": f"Lote {rng.randint(1, 50)}",
+            "Planificacion_Estado": rng.choice(ESTADOS_PROYECTO),
+            "Planificacion_Horas": hours[0],
+            "Recopilacion_Estado": rng.choice(ESTADOS_PROYECTO),
+            "Recopilacion_Horas": hours[1],
+            "Informe_Estado": rng.choice(ESTADOS_PROYECTO),
+            "Informe_Horas": hours[2],
+            "Total_Horas": sum(hours),
+            "Fecha_Registro": (start + timedelta(minutes=i)).strftime('%Y-%m-%d %H:%M:%S'),
+        }
+
+    return {
+        SCORES_COLLECTION_PATH: scores,
+        SALES_COLLECTION_PATH: sales_docs,
+        PROJECTS_COLLECTION_PATH: project_docs,
+    }
+
+
+def write_dataset(path, clients, sales, projects, seed=42):
+    """Escribe los datos sintéticos como instantánea JSON (sin WAL)."""
+    data = generate_dataset(clients, sales, projects, seed)
+    with open(path, 'w') as f:
+        json.dump(data, f)
+    return data
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('salida')
+    parser.add_argument('--clientes', type=int, default=1000)
+    parser.add_argument('--ventas', type=int, default=1000)
+    parser.add_argument('--proyectos', type=int, default=100)
+    parser.add_argument('--semilla', type=int, default=42)
+    args = parser.parse_args()
+    write_dataset(args.salida, args.clientes, args.ventas, args.proyectos, args.semilla)
+    print(f"Se generaron {args.clientes} clientes, {args.ventas} ventas y {args.proyectos} proyectos en {args.salida}.")
@@ -0,0 +1,77 @@
+from perfiles_puntaje import REGISTRY
+
+# =================================================================
+# CODIFICACIÓN COMPACTA DE LOS PUNTAJES POR ÍTEM
+# =================================================================
+# Los documentos de clientes guardaban cada puntaje bajo el título completo
+# del ítem ("**Item 11:** Uso de funcionalidades avanzadas."), repetido en cada
+# registro del JSON, del WAL y de SQLite. Ahora se guarda la versión del perfil
+# de la categoría y la lista de puntajes en el orden de los ítems de esa versión
+# (ver perfiles_puntaje.REGISTRY):
+#   {"Categoria_Evaluacion": "Granos", "Version_Perfil": 1, "Puntajes": [5, 5, 10, ...], ...}
+#
+# El almacén codifica al escribir y decodifica al leer (Collection, instantáneas
+# columnares, vistas materializadas): las páginas siguen viendo una columna por
+# ítem con su título. Los documentos anteriores, con los títulos como claves, se
+# leen igual y DocumentStore.migrate_encodings los reescribe compactos.
+#
+# Un 'update' (también dentro de un lote) no se guarda como merge de campos:
+# el almacén decodifica el documento guardado, le aplica los campos y lo vuelve
+# a codificar completo (DocumentStore.encoded_merge), así los títulos de los
+# ítems nunca quedan como campos sueltos junto a la lista.
+
+CATEGORY_FIELD = 'Categoria_Evaluacion'
+PROFILE_VERSION_FIELD = 'Version_Perfil'
+SCORES_FIELD = 'Puntajes'
+
+
+def encode_scores(document):
+    """Documento con los puntajes como lista compacta.
+
+    Sin Version_Perfil se codifica con el perfil vigente. Devuelve el mismo objeto si
+    ya estaba codificado o si su categoría (o versión) no tiene perfil.
+    """
+    profile = REGISTRY.get(document.get(CATEGORY_FIELD), document.get(PROFILE_VERSION_FIELD))
+    if profile is None:
+        return document
+    items = profile.items
+    scores = document.get(SCORES_FIELD)
+    loose = [position for item, position in profile.positions.items() if item in document]
+    if scores is not None and not loose:
+        return document
+
+    scores = list(scores) if scores is not None and len(scores) == len(items) else [0] * len(items)
+    for position in loose:
+        scores[position] = _compact(document[items[position]])
+    encoded = {key: value for key, value in document.items() if key not in profile.positions}
+    encoded[PROFILE_VERSION_FIELD] = profile.version
+    encoded[SCORES_FIELD] = scores
+    return encoded
+
+
+def decode_scores(document):
+    """Documento con un campo por ítem (título -> puntaje), como lo usan las páginas.
+
+    Los documentos sin lista de puntajes (anteriores a la codificación) se devuelven tal cual.
+    """
+    scores = document.get(SCORES_FIELD)
+    if scores is None:
+        return document
+    profile = REGISTRY.get(document.get(CATEGORY_FIELD), document.get(PROFILE_VERSION_FIELD))
+    if profile is None:
+        return document
+    decoded = {key: value for key, value in document.items() if key != SCORES_FIELD}
+    for item, score in zip(profile.items, scores):
+        decoded.setdefault(item, score)  # Un campo suelto (de una versión anterior) pisa la lista
+    return decoded
+
+
+def _compact(value):
+    """Puntaje como entero si no tiene decimales (vacío = 0)."""
+    if value is None or value != value:
+        return 0
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return value
+    return int(number) if number.is_integer() else number
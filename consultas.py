@@ -0,0 +1,54 @@
+import re
+import threading
+
+import duckdb
+
+# =================================================================
+# CAPA DE CONSULTAS ANALÍTICAS (DUCKDB)
+# =================================================================
+# Los KPIs y gráficos de los tableros se calculan con SQL sobre DuckDB en lugar
+# de filtros y groupby de pandas. Cada colección se expone como una vista
+# (client_scores, client_sales, agronomy_projects) sobre su instantánea
+# columnar (ver instantaneas.py): DuckDB lee las tablas Arrow memory-mapped sin
+# copiarlas y solo materializa el resultado de la consulta.
+#
+# Una consulta también puede recibir DataFrames propios como tablas extra
+# (p. ej. los clientes con el Puntaje Total ya calculado por la página):
+#   store.query('SELECT Sucursal, AVG("Puntaje Total") FROM clientes GROUP BY 1', clientes=df)
+# Los filtros de un tablero, en cambio, van como predicados (WHERE ... IN) sobre
+# la vista de la colección, no como un DataFrame ya filtrado.
+#
+# Se usa la misma instantánea para todas las vistas de una consulta, así un
+# reporte que cruza colecciones nunca mezcla versiones. Con SMARTFARM_BACKEND=sqlite
+# las vistas también van sobre las instantáneas columnares: el almacén ya tiene
+# los documentos en memoria y así no hace falta la extensión sqlite de DuckDB.
+
+
+class QueryLayer:
+    """Consultas SQL de DuckDB sobre las instantáneas columnares de las colecciones."""
+
+    def __init__(self, columnar, views):
+        self.columnar = columnar
+        self.views = views  # nombre de la vista -> ruta de la colección
+        self._db = duckdb.connect()
+        self._lock = threading.Lock()
+        self._patterns = {name: re.compile(rf'\b{re.escape(name)}\b') for name in views}
+
+    def query(self, snapshot, sql, params=None, **frames):
+        """Ejecuta 'sql' (parámetros con '?') y devuelve el resultado como DataFrame.
+
+        Solo se registran (y publican) las vistas de colección que nombra la consulta.
+        """
+        with self._lock:
+            cursor = self._db.cursor()  # Una conexión por consulta: DuckDB no comparte cursores entre hilos
+        try:
+            for name, collection in self.views.items():
+                if self._patterns[name].search(sql):
+                    table = self.columnar.table(snapshot, collection)
+                    if table.num_columns:
+                        cursor.register(name, table)
+            for name, frame in frames.items():
+                cursor.register(name, frame)
+            return cursor.execute(sql, params or []).df()
+        finally:
+            cursor.close()
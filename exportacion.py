@@ -0,0 +1,199 @@
+"""Exportación de las colecciones del almacén a CSV, Parquet o JSON Lines.
+
+Uso:  python exportacion.py client_sales ventas.csv [--filtro ID_Cliente=100001] [--backend sqlite]
+      python exportacion.py agronomy_projects - --formato jsonl --filtro "Protocolo=AutoPath,ExactApply"
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import weakref
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from almacen import BACKEND, QUERY_VIEWS, DocumentStore, open_engine
+from metricas import span
+
+# =================================================================
+# EXPORTACIÓN POR BLOQUES (CSV / PARQUET / JSON LINES)
+# =================================================================
+# Las colecciones client_scores, client_sales y agronomy_projects (los nombres
+# de QUERY_VIEWS) se exportan desde su instantánea columnar (ver
+# instantaneas.py): la tabla Arrow memory-mapped se recorre de a
+# EXPORT_CHUNK_ROWS filas y cada bloque se escribe apenas sale del scan, sin
+# armar nunca el DataFrame completo. Los puntajes salen decodificados, con una
+# columna por ítem.
+#
+# Los filtros de la página ({columna: valores permitidos}, p. ej. el cliente de
+# la tabla de ventas o las selecciones del tablero de proyectos) se pasan como
+# predicado del scan de pyarrow.dataset: las filas que no cumplen no llegan a
+# materializarse. Un filtro sobre una columna que la colección no tiene no deja
+# pasar ninguna fila.
+#
+# Desde las páginas, el archivo se arma al pedirlo (no en cada rerun) en un
+# archivo temporal (ExportFile, en SMARTFARM_EXPORT_DIR o en el directorio
+# temporal del sistema): la sesión guarda solo la referencia y el contenido se
+# lee del disco al dibujar el botón de descarga. El archivo se borra cuando la
+# sesión lo reemplaza o lo descarta. Desde la línea de comandos se escribe
+# directo al archivo o a la salida estándar.
+
+EXPORT_CHUNK_ROWS = 10000
+EXPORT_FORMATS = {
+    # formato -> (extensión, tipo MIME)
+    'csv': ('.csv', 'text/csv'),
+    'parquet': ('.parquet', 'application/vnd.apache.parquet'),
+    'jsonl': ('.jsonl', 'application/jsonl'),
+}
+INTERNAL_FIELDS = ('_version',)  # Metadatos del almacén que no se exportan
+EXPORT_DIR = os.environ.get('SMARTFARM_EXPORT_DIR')
+
+
+def export_batches(source, collection, filters=None, columns=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    """(esquema, iterador de RecordBatch) de la colección, con 'filters' aplicados durante el scan.
+
+    source es el almacén o la vista de una sesión; collection, un nombre de QUERY_VIEWS.
+    filters: {columna: valores permitidos}; columns: columnas a exportar (todas si es None).
+    """
+    table = source.collection(QUERY_VIEWS[collection]).table()
+    if columns is None:
+        columns = [column for column in table.column_names if column not in INTERNAL_FIELDS]
+    for column in columns:
+        if column not in table.column_names:
+            table = table.append_column(column, pa.nulls(table.num_rows))
+    scanner = ds.dataset(table).scanner(
+        columns=list(columns), filter=_predicate(table, filters), batch_size=chunk_rows
+    )
+    return scanner.projected_schema, scanner.to_batches()
+
+
+def _predicate(table, filters):
+    """Expresión de pyarrow.dataset con todos los filtros (None si no hay)."""
+    predicate = None
+    for column, values in (filters or {}).items():
+        column_type = table.schema.field(column).type if column in table.column_names else pa.null()
+        if pa.types.is_null(column_type):
+            condition = pc.scalar(False)  # Columna inexistente o siempre vacía
+        else:
+            # Los valores llegan como texto desde la línea de comandos: se llevan al tipo de la columna
+            condition = pc.field(column).isin(pa.array(list(values)).cast(column_type))
+        predicate = condition if predicate is None else predicate & condition
+    return predicate
+
+
+def export_collection(source, collection, sink, fmt='csv', filters=None, columns=None,
+                      chunk_rows=EXPORT_CHUNK_ROWS):
+    """Escribe la colección filtrada en 'sink' (archivo binario) en el formato pedido. Devuelve las filas.
+
+    El CSV va en UTF-8 con BOM, para que Excel muestre bien los acentos.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Formato desconocido: '{fmt}' (valores posibles: {', '.join(EXPORT_FORMATS)}).")
+    with span('exportacion'):
+        schema, batches = export_batches(source, collection, filters, columns, chunk_rows)
+        if fmt == 'csv':
+            sink.write(b'\xef\xbb\xbf')
+            writer = pa_csv.CSVWriter(sink, schema)
+        elif fmt == 'parquet':
+            writer = pq.ParquetWriter(sink, schema)
+        else:
+            writer = _JSONLinesWriter(sink)
+        rows = 0
+        try:
+            for batch in batches:
+                if batch.num_rows:
+                    writer.write_batch(batch)
+                    rows += batch.num_rows
+        finally:
+            writer.close()
+        return rows
+
+
+class _JSONLinesWriter:
+    """Un objeto JSON por fila, con la misma interfaz write_batch/close que los escritores de Arrow."""
+
+    def __init__(self, sink):
+        self.sink = sink
+
+    def write_batch(self, batch):
+        lines = ''.join(
+            json.dumps(row, ensure_ascii=False, default=str) + '\n' for row in batch.to_pylist()
+        )
+        self.sink.write(lines.encode('utf-8'))
+
+    def close(self):
+        pass
+
+
+def export_file_name(collection, fmt):
+    """Nombre del archivo de descarga, p. ej. 'client_sales.csv'."""
+    return f"{collection}{EXPORT_FORMATS[fmt][0]}"
+
+
+class ExportFile:
+    """Exportación escrita en un archivo temporal, que se borra cuando el objeto deja de usarse."""
+
+    def __init__(self, source, collection, fmt='csv', filters=None, columns=None):
+        self.name = export_file_name(collection, fmt)
+        self.mime = EXPORT_FORMATS[fmt][1]
+        fd, self.path = tempfile.mkstemp(prefix='smartfarm_export_', suffix=EXPORT_FORMATS[fmt][0], dir=EXPORT_DIR)
+        weakref.finalize(self, _remove_file, self.path)
+        with os.fdopen(fd, 'wb') as sink:
+            self.rows = export_collection(source, collection, sink, fmt, filters, columns)
+
+    def open(self):
+        """El archivo, para leerlo (p. ej. como 'data' de st.download_button)."""
+        return open(self.path, 'rb')
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _parse_filters(specs):
+    """['Columna=v1,v2', ...] -> {'Columna': ['v1', 'v2']} (los valores de una misma columna se suman)."""
+    filters = {}
+    for spec in specs:
+        column, separator, values = spec.partition('=')
+        if not separator or not column.strip():
+            raise argparse.ArgumentTypeError(f"Filtro inválido: '{spec}' (se espera Columna=valor1,valor2).")
+        filters.setdefault(column.strip(), []).extend(value.strip() for value in values.split(','))
+    return filters
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('coleccion', choices=sorted(QUERY_VIEWS))
+    parser.add_argument('salida', help="archivo de salida ('-' para la salida estándar)")
+    parser.add_argument('--formato', choices=sorted(EXPORT_FORMATS),
+                        help="por defecto, según la extensión de la salida (o csv)")
+    parser.add_argument('--filtro', action='append', default=[], metavar='COLUMNA=V1,V2',
+                        help="solo las filas cuya columna tenga alguno de los valores (se puede repetir)")
+    parser.add_argument('--columnas', help="columnas a exportar, separadas por comas")
+    parser.add_argument('--backend', default=BACKEND, choices=['wal', 'sqlite'])
+    args = parser.parse_args()
+
+    fmt = args.formato
+    if fmt is None:
+        extension = os.path.splitext(args.salida)[1].lower()
+        fmt = next((name for name, (ext, _) in EXPORT_FORMATS.items() if ext == extension), 'csv')
+    try:
+        filters = _parse_filters(args.filtro)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+    columns = [column.strip() for column in args.columnas.split(',')] if args.columnas else None
+
+    store = DocumentStore(open_engine(args.backend))
+    if args.salida == '-':
+        exported = export_collection(store, args.coleccion, sys.stdout.buffer, fmt, filters, columns)
+    else:
+        with open(args.salida, 'wb') as f:
+            exported = export_collection(store, args.coleccion, f, fmt, filters, columns)
+    print(f"Se exportaron {exported} filas de {args.coleccion}.", file=sys.stderr)
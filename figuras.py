@@ -0,0 +1,138 @@
+import json
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io as pio
+
+# =================================================================
+# CACHÉ DE FIGURAS Y KPIs POR VERSIÓN DE LOS DATOS
+# =================================================================
+# Los gráficos de Plotly (radar del análisis, torta y barras de ventas, dona
+# de horas de Agronomy Analyzer) y los bloques de KPIs se volvían a armar en
+# cada rerun aunque los datos no hubieran cambiado: solo plotly.express tarda
+# decenas de ms por figura. Ahora se guardan por
+#   (nombre, versión de la colección, filtros, cliente)
+# La versión de la colección (Snapshot.collection_version) cambia con cualquier
+# escritura en ella, así que una entrada nunca queda desactualizada: la vista
+# siguiente simplemente usa otra clave, y las viejas salen por LRU.
+#
+# De cada figura se guarda su JSON (ya validado al armarla) y se vuelve a armar
+# el objeto sin validar, que cuesta ~1 ms. Los KPIs se guardan tal cual (valores
+# o DataFrames chicos, de solo lectura). La caché es del almacén (una por
+# proceso, compartida por todas las sesiones) y está acotada en entradas y en
+# bytes (SMARTFARM_FIGURE_CACHE_MB); una entrada más grande que el límite no
+# se guarda.
+#
+# VersionCache es la misma LRU sin la parte de Plotly: el almacén la usa también
+# para los DataFrames derivados de una colección (store.frames; los clientes
+# puntuados de la página 1).
+
+FIGURE_CACHE_BYTES = int(float(os.environ.get('SMARTFARM_FIGURE_CACHE_MB', 32)) * 1024 * 1024)
+FIGURE_CACHE_ENTRIES = 512
+
+
+class VersionCache:
+    """LRU de valores calculados por versión de una colección, acotada en entradas y en bytes."""
+
+    def __init__(self, max_bytes, max_entries):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # clave -> (valor, bytes)
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def value(self, name, version, build, filters=None, client=None):
+        """Valor de solo lectura (KPIs, DataFrames); build() lo calcula si no está para esta versión."""
+        key = ('valor', name, version, _freeze(filters), client)
+        value = self._get(key)
+        if value is None:
+            value = build()
+            self._put(key, value, _size(value))
+        return value
+
+    def stats(self):
+        """Entradas, bytes ocupados, aciertos, fallos y desalojos desde que se creó la caché."""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def _put(self, key, value, size):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+
+class FigureCache(VersionCache):
+    """LRU de figuras (JSON de Plotly) y bloques de KPIs, acotada en entradas y en bytes."""
+
+    def __init__(self, max_bytes=FIGURE_CACHE_BYTES, max_entries=FIGURE_CACHE_ENTRIES):
+        super().__init__(max_bytes, max_entries)
+
+    def figure(self, name, version, build, filters=None, client=None):
+        """Figura de Plotly; build() la arma solo si no hay una para esta versión, filtros y cliente."""
+        key = ('figura', name, version, _freeze(filters), client)
+        spec = self._get(key)
+        if spec is None:
+            spec = pio.to_json(build(), validate=False)
+            self._put(key, spec, len(spec))
+        return go.Figure(json.loads(spec), skip_invalid=True, _validate=False)
+
+
+def _freeze(filters):
+    """{columna: valores} -> tupla ordenada y hashable (el orden de los valores elegidos no importa)."""
+    if not filters:
+        return ()
+    if isinstance(filters, dict):
+        return tuple(sorted((column, _freeze_values(values)) for column, values in filters.items()))
+    return _freeze_values(filters)
+
+
+def _freeze_values(values):
+    if isinstance(values, (list, tuple, set, frozenset)):
+        return tuple(sorted(values, key=str))
+    return values
+
+
+def _size(value):
+    """Bytes aproximados de un valor cacheado."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
@@ -0,0 +1,463 @@
+import io
+import os
+import uuid
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from almacen import PROJECTS_COLLECTION_PATH, SALES_COLLECTION_PATH, SCORES_COLLECTION_PATH, ConflictError
+from codificacion_puntajes import CATEGORY_FIELD, PROFILE_VERSION_FIELD, SCORES_FIELD
+from metricas import span
+from perfiles_puntaje import REGISTRY
+
+# =================================================================
+# IMPORTACIÓN MASIVA DESDE CSV / EXCEL
+# =================================================================
+# Carga de muchas evaluaciones a la vez (p. ej. las planillas de las sucursales
+# al comienzo de la campaña) sin pasar por el formulario registro por registro.
+#
+# El archivo se lee de a IMPORT_CHUNK_ROWS filas (pandas.read_csv con chunksize;
+# openpyxl en modo read_only para .xlsx), así nunca está entero en memoria. Cada
+# bloque se valida con operaciones vectorizadas de pandas y las filas válidas se
+# guardan en un solo lote atómico por bloque (un registro en el WAL), no una
+# escritura por fila. Las filas rechazadas vuelven en el informe con el número
+# de fila del archivo y el motivo, para corregirlas y volver a importarlas.
+#
+# Los IDs se validan contra los documentos de la colección (el id del documento
+# es el ID_Cliente) y contra las filas anteriores del mismo archivo. Las altas se
+# guardan con expected_version=0: si otro usuario crea el mismo ID mientras dura
+# la importación, esa fila se rechaza y el resto del bloque se vuelve a intentar.
+#
+# Las ventas y los proyectos de Agronomy Analyzer se importan igual, con dos
+# diferencias. El cliente se resuelve por ID_Cliente en un índice armado una vez
+# por importación (client_index), no por el nombre que muestra el selector: los
+# datos del cliente (nombre, sucursal, perfil) se copian de su evaluación. Y las
+# filas válidas de todo el archivo se guardan en un único lote atómico: la
+# importación entra entera o no entra (los archivos de ventas y proyectos son
+# mucho más chicos que las planillas de evaluaciones).
+
+IMPORT_CHUNK_ROWS = 5000
+EXCEL_EXTENSIONS = ('.xlsx', '.xlsm')
+
+ID_COLUMN = 'ID_Cliente'
+SCORE_METADATA_COLUMNS = ['Cliente', CATEGORY_FIELD, 'Sucursal', 'Perfil Tecnológico']
+ROW_COLUMN = 'Fila'
+REASON_COLUMN = 'Motivo'
+
+SALE_ID_COLUMN = 'ID_Venta'
+SALES_REQUIRED_COLUMNS = [ID_COLUMN, 'Tipo de Venta', 'Estado de Venta', 'Monto']
+SALES_DATE_FORMAT = '%Y-%m-%d %H:%M'
+
+PROJECT_ID_COLUMN = 'id'
+PROJECT_REQUIRED_COLUMNS = [ID_COLUMN, 'Protocolo', 'Nombre_Evaluacion', 'Ubicacion_Evaluacion']
+PROJECT_STAGES = ['Planificacion', 'Recopilacion', 'Informe']
+PROJECTS_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class ImportReport:
+    """Resultado de una importación: filas leídas, guardadas y rechazadas (con su motivo)."""
+
+    def __init__(self):
+        self.read = 0
+        self.imported = 0
+        self._rejected = []  # DataFrames con las filas rechazadas de cada bloque
+
+    def reject(self, rows):
+        if not rows.empty:
+            self._rejected.append(rows)
+
+    @property
+    def rejected_count(self):
+        return sum(len(rows) for rows in self._rejected)
+
+    def rejected_frame(self):
+        """Filas rechazadas tal como venían en el archivo, con 'Fila' y 'Motivo' al principio."""
+        if not self._rejected:
+            return pd.DataFrame(columns=[ROW_COLUMN, REASON_COLUMN])
+        rejected = pd.concat(self._rejected, ignore_index=True)
+        columns = [ROW_COLUMN, REASON_COLUMN] + [c for c in rejected.columns if c not in (ROW_COLUMN, REASON_COLUMN)]
+        return rejected[columns]
+
+
+# --- Lectura por bloques ---
+
+def read_chunks(file, filename, chunk_rows=IMPORT_CHUNK_ROWS):
+    """DataFrames de texto de a chunk_rows filas de un CSV o Excel, con la columna 'Fila' del archivo.
+
+    Todas las celdas llegan como texto ('' si están vacías). Los CSV pueden venir separados
+    por ',' o ';' (Excel en español) y en UTF-8 o Latin-1.
+    """
+    if os.path.splitext(filename)[1].lower() in EXCEL_EXTENSIONS:
+        chunks = _excel_chunks(file, chunk_rows)
+    else:
+        chunks = _csv_chunks(file, chunk_rows)
+    first_row = 2  # La fila 1 es el encabezado
+    for chunk in chunks:
+        chunk.columns = [str(column).strip() for column in chunk.columns]
+        chunk.insert(0, ROW_COLUMN, np.arange(first_row, first_row + len(chunk)))
+        first_row += len(chunk)
+        yield chunk.reset_index(drop=True)
+
+
+def _csv_chunks(file, chunk_rows):
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, 'rb') as f:
+            yield from _csv_chunks(f, chunk_rows)
+        return
+    header = file.readline()
+    file.seek(0)
+    encoding = 'utf-8-sig'
+    try:
+        header_text = header.decode(encoding)
+    except UnicodeDecodeError:
+        encoding = 'latin-1'
+        header_text = header.decode(encoding)
+    separator = ';' if header_text.count(';') > header_text.count(',') else ','
+    yield from pd.read_csv(
+        io.TextIOWrapper(file, encoding=encoding, newline=''), sep=separator, dtype=str,
+        keep_default_na=False, chunksize=chunk_rows,
+    )
+
+
+def _excel_chunks(file, chunk_rows):
+    from openpyxl import load_workbook  # Solo hace falta para importar planillas de Excel
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [_cell_text(value) for value in next(rows, ())]
+        block = []
+        for row in rows:
+            if not any(value is not None for value in row):
+                continue
+            values = [_cell_text(value) for value in row[:len(header)]]
+            block.append(values + [''] * (len(header) - len(values)))
+            if len(block) == chunk_rows:
+                yield pd.DataFrame(block, columns=header, dtype=str)
+                block = []
+        if block:
+            yield pd.DataFrame(block, columns=header, dtype=str)
+    finally:
+        workbook.close()
+
+
+def _cell_text(value):
+    """Celda de Excel como el texto que tendría en un CSV (los números enteros sin '.0')."""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+# --- Validación ---
+
+class _ChunkErrors:
+    """Motivos de rechazo de cada fila de un bloque, acumulados por máscaras booleanas."""
+
+    def __init__(self, chunk):
+        self.reasons = pd.Series('', index=chunk.index, dtype=object)
+
+    def flag(self, mask, message):
+        mask = np.asarray(mask, dtype=bool)
+        if mask.any():
+            self.reasons[mask] = self.reasons[mask] + message + '; '
+
+    @property
+    def valid(self):
+        return (self.reasons == '').to_numpy()
+
+    def rejected(self, chunk):
+        invalid = ~self.valid
+        rows = chunk[invalid].copy()
+        rows[REASON_COLUMN] = self.reasons[invalid].str.rstrip('; ')
+        return rows
+
+
+def _require_columns(chunk, columns, errors):
+    """Marca todas las filas si al archivo le falta alguna columna obligatoria; si no, les quita los espacios."""
+    missing = [column for column in columns if column not in chunk.columns]
+    if missing:
+        errors.flag(np.ones(len(chunk), dtype=bool), f"faltan las columnas {', '.join(missing)}")
+        return False
+    for column in columns:
+        chunk[column] = chunk[column].str.strip()
+    return True
+
+
+def _check_values(chunk, column, allowed, errors):
+    """Marca las filas cuyo valor de 'column' no está entre los permitidos."""
+    if allowed is not None and column in chunk.columns:
+        errors.flag(~chunk[column].isin(list(allowed)), f"{column} inválido")
+
+
+def _check_new_ids(ids, existing, seen, errors, label):
+    """Marca IDs vacíos, ya guardados o repetidos en el archivo; agrega los válidos a 'seen'."""
+    errors.flag(ids == '', f"{label} vacío")
+    errors.flag(ids.map(existing.__contains__), f"el {label} ya existe")
+    errors.flag(ids.map(seen.__contains__) | ids.duplicated(), f"{label} repetido en el archivo")
+    seen.update(ids[errors.valid])
+
+
+def _new_ids(chunk, id_column, existing, seen, errors):
+    """Completa 'id_column' con un uuid4 donde viene vacía (o falta) y valida los IDs como altas nuevas."""
+    ids = _optional_text(chunk, id_column)
+    blank = (ids == '').to_numpy()
+    ids[blank] = [str(uuid.uuid4()) for _ in range(int(blank.sum()))]
+    chunk[id_column] = ids
+    _check_new_ids(ids, existing, seen, errors, id_column)
+
+
+def _optional_text(chunk, column, default=''):
+    """Columna opcional sin espacios a los costados; las celdas vacías (o la columna ausente) valen 'default'."""
+    if column not in chunk.columns:
+        return pd.Series(default, index=chunk.index, dtype=object)
+    text = chunk[column].str.strip()
+    return text.where(text != '', default)
+
+
+def _resolve_clients(chunk, clients, errors):
+    """Datos del cliente de cada fila según su ID_Cliente (alineados con el bloque); marca los desconocidos."""
+    errors.flag(~chunk[ID_COLUMN].isin(clients.index), "ID_Cliente desconocido")
+    return clients.reindex(chunk[ID_COLUMN].to_numpy()).reset_index(drop=True)
+
+
+def _numbers(chunk, column, errors, integer=False, positive=False):
+    """Valores de 'column' como números (vacío = 0); marca los no numéricos, negativos, cero si positive
+    y con decimales si integer."""
+    text = _optional_text(chunk, column)
+    values = pd.to_numeric(text, errors='coerce').to_numpy(dtype=float)
+    values[(text == '').to_numpy()] = 0.0
+    invalid = np.isnan(values) | ((values <= 0) if positive else (values < 0))
+    if integer:
+        invalid |= values % 1 != 0
+    kind = 'un entero' if integer else 'un número'
+    errors.flag(invalid, f"{column}: debe ser {kind} {'mayor que 0' if positive else 'no negativo'}")
+    values[invalid] = 0.0
+    return values.astype(np.int64) if integer else values
+
+
+def _dates(chunk, column, date_format, errors):
+    """Fechas de 'column' con el formato de la colección (vacía = ahora); marca las que no son fechas."""
+    text = _optional_text(chunk, column)
+    parsed = pd.to_datetime(text, format='ISO8601', errors='coerce')
+    errors.flag(parsed.isna() & (text != ''), f"{column}: fecha inválida (AAAA-MM-DD HH:MM)")
+    return parsed.dt.strftime(date_format).where(parsed.notna(), datetime.now().strftime(date_format))
+
+
+def _item_columns(profile, columns):
+    """Columna del archivo de cada ítem del perfil (título, título sin markdown o 'Item N'); None si falta."""
+    available = set(columns)
+    resolved = []
+    for position, (item, label) in enumerate(zip(profile.items, profile.labels)):
+        candidates = (item, label, f"Item {position + 1}")
+        resolved.append(next((column for column in candidates if column in available), None))
+    return resolved
+
+
+def _score_matrix(chunk, mask, profile, errors):
+    """Puntajes (filas de 'mask' × ítems) del perfil; marca los no numéricos, no enteros o fuera de rango.
+
+    Las celdas vacías valen 0; los números pueden traer espacios a los costados.
+    """
+    matrix = np.zeros((int(mask.sum()), len(profile.items)), dtype=np.int64)
+    rows = chunk[mask]
+    for position, column in enumerate(_item_columns(profile, chunk.columns)):
+        if column is None:
+            continue  # Ítem sin columna: sin puntaje (0), como un slider sin mover
+        text = rows[column]
+        values = pd.to_numeric(text, errors='coerce').to_numpy(dtype=float)
+        blank = (text == '').to_numpy()
+        values[blank] = 0.0
+        max_score = profile.max_scores[position]
+        invalid = np.isnan(values) | (values < 0) | (values > max_score) | (values % 1 != 0)
+        if invalid.any():
+            flagged = np.zeros(len(chunk), dtype=bool)
+            flagged[np.flatnonzero(mask)[invalid]] = True
+            errors.flag(flagged, f"{profile.labels[position]}: debe ser un entero entre 0 y {max_score}")
+            values[invalid] = 0.0
+        matrix[:, position] = values.astype(np.int64)
+    return matrix
+
+
+def _documents(fields, valid, id_field):
+    """{id: documento} de las filas válidas, armados desde las columnas ({campo: valores del bloque})."""
+    names = list(fields)
+    columns = [np.asarray(values, dtype=object)[valid].tolist() for values in fields.values()]
+    position = names.index(id_field)
+    return {values[position]: dict(zip(names, values)) for values in zip(*columns)}
+
+
+# --- Escritura ---
+
+def _write_new_documents(session, path, documents, rows, report, id_column=ID_COLUMN):
+    """Guarda las altas en un lote atómico; las que chocan con un ID creado recién se rechazan.
+
+    rows son las filas del archivo de esas altas, con el ID del documento en 'id_column'.
+    """
+    while documents:
+        batch = session.batch()
+        for doc_id, document in documents.items():
+            batch.set(path, doc_id, document, expected_version=0)
+        try:
+            with span('importacion.guardado'):
+                report.imported += batch.commit()
+            return
+        except ConflictError as e:
+            # Otro usuario creó ese ID durante la importación: se rechaza y se reintenta el resto
+            if documents.pop(e.doc_id, None) is None:
+                raise
+            rejected = rows[rows[id_column] == e.doc_id].copy()
+            rejected[REASON_COLUMN] = f"el {id_column} ya existe"
+            report.reject(rejected)
+
+
+# --- Evaluaciones de clientes ---
+
+def import_scores(session, file, filename, allowed=None, chunk_rows=IMPORT_CHUNK_ROWS):
+    """Importa evaluaciones de clientes desde un CSV o Excel. Devuelve un ImportReport.
+
+    Columnas: ID_Cliente, Cliente, Categoria_Evaluacion, Sucursal, Perfil Tecnológico y una por
+    ítem del perfil vigente de la categoría (título completo, título sin '**' o 'Item N'; las que
+    faltan valen 0). allowed: {columna: valores permitidos} (p. ej. las sucursales).
+    """
+    report = ImportReport()
+    collection = session.collection(SCORES_COLLECTION_PATH)
+    existing = collection.to_dict()
+    seen = set()
+    for chunk in read_chunks(file, filename, chunk_rows):
+        with span('importacion.validacion'):
+            report.read += len(chunk)
+            errors = _ChunkErrors(chunk)
+            if not _require_columns(chunk, [ID_COLUMN] + SCORE_METADATA_COLUMNS, errors):
+                report.reject(errors.rejected(chunk))
+                continue
+            errors.flag(chunk['Cliente'] == '', "Cliente vacío")
+            errors.flag(~chunk[CATEGORY_FIELD].isin(REGISTRY.categories), "Categoria_Evaluacion desconocida")
+            for column, values in (allowed or {}).items():
+                _check_values(chunk, column, values, errors)
+
+            categories = chunk[CATEGORY_FIELD].to_numpy()
+            matrices = {}
+            for category in REGISTRY.categories:
+                mask = categories == category
+                if mask.any():
+                    matrices[category] = (mask, _score_matrix(chunk, mask, REGISTRY.current(category), errors))
+            _check_new_ids(chunk[ID_COLUMN], existing, seen, errors, ID_COLUMN)
+
+            # Documentos ya codificados (ver codificacion_puntajes.py), sin pasar por un dict por ítem
+            valid = errors.valid
+            documents = {}
+            fields = SCORE_METADATA_COLUMNS + [ID_COLUMN, PROFILE_VERSION_FIELD, SCORES_FIELD]
+            for category, (mask, matrix) in matrices.items():
+                keep = valid[mask]
+                rows = chunk[mask][keep]
+                columns = [rows[column].tolist() for column in SCORE_METADATA_COLUMNS + [ID_COLUMN]]
+                versions = [REGISTRY.current(category).version] * len(rows)
+                for values in zip(*columns, versions, matrix[keep].tolist()):
+                    documents[values[-3]] = dict(zip(fields, values))
+            report.reject(errors.rejected(chunk))
+        _write_new_documents(session, SCORES_COLLECTION_PATH, documents, chunk, report)
+    return report
+
+
+# --- Ventas y proyectos de Agronomy Analyzer ---
+
+def client_index(session):
+    """Clientes guardados indexados por ID_Cliente (Cliente, Sucursal, Categoria_Evaluacion)."""
+    clients = session.collection(SCORES_COLLECTION_PATH).to_dict()
+    return pd.DataFrame(
+        [(doc.get('Cliente'), doc.get('Sucursal'), doc.get(CATEGORY_FIELD)) for doc in clients.values()],
+        index=pd.Index(list(clients), dtype=object, name=ID_COLUMN),
+        columns=['Cliente', 'Sucursal', CATEGORY_FIELD],
+    )
+
+
+def _import_new_documents(session, path, file, filename, id_column, required, build, chunk_rows):
+    """Valida el archivo por bloques con build(chunk, errors) -> {campo: valores} y guarda todo en un lote."""
+    report = ImportReport()
+    clients = client_index(session)
+    existing = session.collection(path).to_dict()
+    seen = set()
+    documents = {}
+    imported_rows = []
+    for chunk in read_chunks(file, filename, chunk_rows):
+        with span('importacion.validacion'):
+            report.read += len(chunk)
+            errors = _ChunkErrors(chunk)
+            if not _require_columns(chunk, required, errors):
+                report.reject(errors.rejected(chunk))
+                continue
+            fields = build(chunk, _resolve_clients(chunk, clients, errors), errors)
+            _new_ids(chunk, id_column, existing, seen, errors)
+            fields = {id_column: chunk[id_column], **fields}
+            valid = errors.valid
+            documents.update(_documents(fields, valid, id_column))
+            imported_rows.append(chunk[valid])
+            report.reject(errors.rejected(chunk))
+    if documents:
+        _write_new_documents(session, path, documents, pd.concat(imported_rows), report, id_column)
+    return report
+
+
+def import_sales(session, file, filename, sale_types, sale_statuses, chunk_rows=IMPORT_CHUNK_ROWS):
+    """Importa ventas desde un CSV o Excel en un solo lote atómico. Devuelve un ImportReport.
+
+    Columnas: ID_Cliente, Tipo de Venta, Estado de Venta, Monto y, opcionales, ID_Venta (vacío =
+    uno nuevo), Detalle y Fecha Registro (vacía = ahora). El nombre del cliente sale de su evaluación.
+    """
+    def build(chunk, client, errors):
+        _check_values(chunk, 'Tipo de Venta', sale_types, errors)
+        _check_values(chunk, 'Estado de Venta', sale_statuses, errors)
+        return {
+            ID_COLUMN: chunk[ID_COLUMN],
+            'Cliente': client['Cliente'],
+            'Tipo de Venta': chunk['Tipo de Venta'],
+            'Estado de Venta': chunk['Estado de Venta'],
+            'Detalle': _optional_text(chunk, 'Detalle'),
+            'Monto': _numbers(chunk, 'Monto', errors, positive=True),
+            'Fecha Registro': _dates(chunk, 'Fecha Registro', SALES_DATE_FORMAT, errors),
+        }
+
+    return _import_new_documents(
+        session, SALES_COLLECTION_PATH, file, filename, SALE_ID_COLUMN, SALES_REQUIRED_COLUMNS, build, chunk_rows
+    )
+
+
+def import_projects(session, file, filename, protocols, stage_statuses, chunk_rows=IMPORT_CHUNK_ROWS):
+    """Importa proyectos de Agronomy Analyzer desde un CSV o Excel en un solo lote atómico.
+
+    Columnas: ID_Cliente, Protocolo, Nombre_Evaluacion, Ubicacion_Evaluacion y, opcionales, id
+    (vacío = uno nuevo), <Etapa>_Estado (vacío = el primero de stage_statuses), <Etapa>_Horas
+    (vacío = 0) de Planificacion, Recopilacion e Informe, y Fecha_Registro (vacía = ahora).
+    Sucursal y Perfil_Tecnologico salen de la evaluación del cliente. Devuelve un ImportReport.
+    """
+    def build(chunk, client, errors):
+        _check_values(chunk, 'Protocolo', protocols, errors)
+        for column in ('Nombre_Evaluacion', 'Ubicacion_Evaluacion'):
+            errors.flag(chunk[column] == '', f"{column} vacío")
+        fields = {
+            'Cliente': client['Cliente'],
+            'Sucursal': client['Sucursal'],
+            'Perfil_Tecnologico': client[CATEGORY_FIELD],
+            'Protocolo': chunk['Protocolo'],
+            'Nombre_Evaluacion': chunk['Nombre_Evaluacion'],
+            'Ubicacion_Evaluacion': chunk['Ubicacion_Evaluacion'],
+        }
+        total_hours = 0
+        for stage in PROJECT_STAGES:
+            status = f"{stage}_Estado"
+            chunk[status] = _optional_text(chunk, status, default=stage_statuses[0])
+            _check_values(chunk, status, stage_statuses, errors)
+            fields[status] = chunk[status]
+            fields[f"{stage}_Horas"] = _numbers(chunk, f"{stage}_Horas", errors, integer=True)
+            total_hours = total_hours + fields[f"{stage}_Horas"]
+        fields['Total_Horas'] = total_hours
+        fields['Fecha_Registro'] = _dates(chunk, 'Fecha_Registro', PROJECTS_DATE_FORMAT, errors)
+        return fields
+
+    return _import_new_documents(
+        session, PROJECTS_COLLECTION_PATH, file, filename, PROJECT_ID_COLUMN, PROJECT_REQUIRED_COLUMNS, build,
+        chunk_rows
+    )
@@ -0,0 +1,158 @@
+import atexit
+import os
+import re
+import shutil
+import tempfile
+import threading
+
+import pandas as pd
+import pyarrow as pa
+
+# =================================================================
+# INSTANTÁNEAS COLUMNARES (ARROW) PARA LAS PÁGINAS DE SOLO LECTURA
+# =================================================================
+# Las páginas de análisis y los tableros no editan: en lugar de armar en cada
+# rerun un DataFrame desde la lista de dicts, leen una tabla Arrow de la
+# colección. La tabla se publica una vez por versión de la colección (ver
+# Snapshot.collection_version) como archivo Arrow IPC sin comprimir y se abre
+# con memory-map: todas las sesiones comparten las mismas páginas del archivo
+# y el DataFrame que recibe cada una (columnas pd.ArrowDtype) no copia datos.
+#
+# Se publica con la primera lectura posterior a un cambio de la colección (las
+# escrituras no pagan la conversión). Se conservan las últimas
+# PUBLISHED_VERSIONS versiones de cada colección, para las sesiones que
+# fijaron una instantánea anterior (SessionView.pin). La tabla se arma
+# directamente desde los documentos, de a TABLE_BATCH_ROWS (un lote de Arrow
+# por bloque, sin un DataFrame intermedio de toda la colección).
+#
+# Los archivos son derivados: viven en SMARTFARM_COLUMNAR_DIR o en un
+# directorio temporal del proceso que se borra al salir.
+#
+# Cuando una página deriva un DataFrame de esa tabla (la página 1 agrega el
+# 'Puntaje Total' a los clientes), el almacén guarda el resultado por versión
+# de la colección (store.frames): sin escrituras, el rerun no vuelve a armarlo
+# ni a hashear nada. Esa caché está acotada en entradas (FRAME_CACHE_ENTRIES)
+# y en bytes (SMARTFARM_FRAME_CACHE_MB).
+
+COLUMNAR_DIR = os.environ.get('SMARTFARM_COLUMNAR_DIR')
+PUBLISHED_VERSIONS = 2
+TABLE_BATCH_ROWS = 10000
+FRAME_CACHE_BYTES = int(float(os.environ.get('SMARTFARM_FRAME_CACHE_MB', 128)) * 1024 * 1024)
+FRAME_CACHE_ENTRIES = 8
+
+
+class ColumnarSnapshots:
+    """Tablas Arrow memory-mapped de cada colección, publicadas por versión de colección."""
+
+    def __init__(self, directory=COLUMNAR_DIR, documents=None):
+        if directory is None:
+            directory = tempfile.mkdtemp(prefix='smartfarm_columnar_')
+            atexit.register(shutil.rmtree, directory, True)
+        else:
+            # Un subdirectorio por proceso: las versiones de colección son locales al proceso
+            directory = os.path.join(directory, str(os.getpid()))
+            shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        # documents(instantánea, colección) -> {id: documento}; el almacén pasa los decodificados
+        self.documents = documents or (lambda snapshot, collection: snapshot.collection(collection))
+        self._lock = threading.Lock()
+        self._published = {}  # colección -> {versión: (ruta, tabla)}
+
+    def table(self, snapshot, collection):
+        """Tabla Arrow de la colección en la versión de la instantánea (la publica si hace falta)."""
+        version = snapshot.collection_version(collection)
+        with self._lock:
+            versions = self._published.setdefault(collection, {})
+            if version not in versions:
+                path = os.path.join(self.directory, f"{_slug(collection)}-{version}.arrow")
+                _write_table(path, documents_table(self.documents(snapshot, collection).values()))
+                # Los buffers de la tabla mantienen vivo el mapeo del archivo
+                versions[version] = (path, pa.ipc.open_file(pa.memory_map(path, 'r')).read_all())
+                for old in sorted(versions)[:-PUBLISHED_VERSIONS]:
+                    old_path, _ = versions.pop(old)
+                    try:
+                        os.remove(old_path)  # Las tablas ya entregadas siguen leyendo su mapeo
+                    except OSError:
+                        pass
+            return versions[version][1]
+
+    def frame(self, snapshot, collection, columns=None):
+        """DataFrame de la colección respaldado por la tabla mapeada (sin copiar los datos)."""
+        table = self.table(snapshot, collection)
+        if columns is not None:
+            missing = [column for column in columns if column not in table.column_names]
+            for column in missing:
+                table = table.append_column(column, pa.nulls(table.num_rows))
+            table = table.select(list(columns))
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def documents_table(documents, batch_rows=TABLE_BATCH_ROWS):
+    """Tabla Arrow de una lista de documentos (columnas = unión de sus campos, en orden de aparición).
+
+    Se arma de a 'batch_rows' documentos, un lote por bloque. Los tipos son los que daba pandas: enteros
+    con faltantes o mezclados con decimales quedan como float64, y las columnas con tipos mezclados que
+    Arrow no puede unificar se guardan como texto.
+    """
+    documents = list(documents)
+    names = list(dict.fromkeys(field for doc in documents for field in doc))
+    batches = []
+    for start in range(0, len(documents), batch_rows):
+        block = documents[start:start + batch_rows]
+        batches.append([_block_array([doc.get(name) for doc in block]) for name in names])
+    columns = [
+        _unify_column([arrays[i] for arrays in batches], name, documents, batch_rows) for i, name in enumerate(names)
+    ]
+    return pa.Table.from_arrays(columns, names=[str(name) for name in names])
+
+
+def _block_array(values):
+    """Arreglo Arrow de los valores de un bloque (None si Arrow no puede unificar sus tipos)."""
+    try:
+        return pa.array(values, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+        return None
+
+
+def _unify_column(chunks, name, documents, batch_rows):
+    """Columna con los bloques llevados a un mismo tipo (o como texto si no lo hay)."""
+    target = _common_type(chunks)
+    if target is not None:
+        try:
+            return pa.chunked_array([chunk.cast(target) for chunk in chunks], type=target)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            pass
+    return pa.chunked_array([
+        pa.array([None if _is_missing(doc.get(name)) else str(doc.get(name))
+                  for doc in documents[start:start + batch_rows]], type=pa.string())
+        for start in range(0, len(documents), batch_rows)
+    ], type=pa.string())
+
+
+def _common_type(chunks):
+    if any(chunk is None for chunk in chunks):
+        return None
+    types = {chunk.type for chunk in chunks} - {pa.null()}
+    if not types:
+        return pa.null()
+    if all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in types):
+        # Como en pandas: un faltante o un decimal convierte la columna entera en float64
+        if len(types) > 1 or any(chunk.null_count for chunk in chunks):
+            return pa.float64()
+    return types.pop() if len(types) == 1 else None
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and value != value)
+
+
+def _write_table(path, table):
+    tmp_path = f"{path}.tmp"
+    with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def _slug(collection):
+    return re.sub(r'[^A-Za-z0-9]+', '_', collection).strip('_')
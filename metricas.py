@@ -0,0 +1,230 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from perfilado import discard_capture, start_capture, stop_capture, wanted
+
+# =================================================================
+# MÉTRICAS DE TIEMPO POR RERUN
+# =================================================================
+# Cada página llama a start_rerun('nombre') al principio y a end_rerun() al
+# final (y antes de st.stop()/st.rerun()). En el medio, 'with span("etapa"):'
+# acumula cuánto tarda cada etapa (carga de datos, DataFrame, puntajes,
+# gráficos, guardado...). Fuera de un rerun span() no hace nada, así que los
+# módulos compartidos (almacen.py) pueden usarlo sin condiciones.
+#
+# Al cerrar el rerun:
+#   - se agrega a las últimas reruns de la sesión (panel opcional en la barra
+#     lateral: SMARTFARM_METRICS_PANEL=1 o '?metricas=1' en la URL);
+#   - se exporta según SMARTFARM_METRICS: 'jsonl' agrega una línea por rerun a
+#     SMARTFARM_METRICS_FILE; 'prometheus' mantiene sumas y cantidades del
+#     proceso y reescribe el archivo en formato de texto de Prometheus (para el
+#     textfile collector) como mucho cada PROMETHEUS_WRITE_INTERVAL segundos.
+# El costo es un perf_counter() y una suma de dict por span: se puede dejar
+# activo en producción. Para ver el detalle de una rerun lenta, start_rerun y
+# end_rerun también arrancan y cierran la captura de perfiles de perfilado.py
+# (SMARTFARM_PROFILE=1 o '?perfil=1').
+#
+# Las secciones de las páginas decoradas con @fragment('página', 'sección')
+# corren como st.fragment: un widget de la sección vuelve a ejecutar solo esa
+# función, no la página entera. Dentro de un rerun completo la sección se mide
+# como parte de él; cuando la sección se re-ejecuta sola, abre su propio rerun
+# ('página › sección'), que se exporta igual pero no dibuja en la barra lateral
+# (un fragment no puede escribir fuera de su contenedor).
+#
+# Un rerun cortado por st.rerun()/st.stop() o por una excepción antes de
+# end_rerun() deja su medición abierta en el hilo de la sesión (Streamlit lo
+# reutiliza): el siguiente start_rerun de ese hilo la descarta, junto con su
+# captura de perfiles, en lugar de heredarla.
+
+METRICS_EXPORT = os.environ.get('SMARTFARM_METRICS', '').lower()  # '', 'jsonl' o 'prometheus'
+METRICS_FILE = os.environ.get(
+    'SMARTFARM_METRICS_FILE', 'metricas.prom' if METRICS_EXPORT == 'prometheus' else 'metricas.jsonl'
+)
+METRICS_PANEL = os.environ.get('SMARTFARM_METRICS_PANEL') == '1'
+PANEL_RERUNS = 10  # Reruns que muestra el panel
+PROMETHEUS_WRITE_INTERVAL = 5.0
+
+_local = threading.local()  # Cada rerun de Streamlit corre en el hilo de su sesión
+_export_lock = threading.Lock()
+_prometheus_totals = {}  # (métrica, etiquetas) -> [suma en segundos, cantidad]
+_prometheus_written = 0.0
+
+
+class RerunTrace:
+    """Tiempos de un rerun: total y acumulado por etapa (en segundos)."""
+
+    __slots__ = ('page', 'timestamp', 'started', 'total', 'spans', 'capture')
+
+    def __init__(self, page, fragment=None):
+        self.page = page if fragment is None else f"{page} › {fragment}"
+        self.timestamp = time.time()
+        self.started = time.perf_counter()
+        self.total = None
+        self.spans = {}
+        self.capture = None
+
+    def add(self, name, seconds):
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def as_dict(self):
+        return {
+            'ts': round(self.timestamp, 3),
+            'page': self.page,
+            'total_ms': round(self.total * 1000, 3),
+            'spans_ms': {name: round(seconds * 1000, 3) for name, seconds in self.spans.items()},
+        }
+
+
+def start_rerun(page, fragment=None):
+    """Comienza a medir el rerun actual de la página o de una de sus secciones (y a perfilarlo, si se pidió)."""
+    _discard_trace()
+    trace = RerunTrace(page, fragment)
+    if wanted(st.query_params):
+        trace.capture = start_capture(trace.page)
+    _local.trace = trace
+
+
+def fragment(page, name):
+    """Decorador: la función es una sección de la página que se re-ejecuta sola (st.fragment) y se mide aparte."""
+    def decorator(function):
+        @functools.wraps(function)
+        def run(*args, **kwargs):
+            outer = getattr(_local, 'section', None)
+            _local.section = name
+            try:
+                if getattr(_local, 'trace', None) is not None and (outer is not None or not _fragment_rerun()):
+                    # Parte de un rerun completo de la página o de la sección que la contiene (no uno cortado)
+                    with span(name):
+                        return function(*args, **kwargs)
+                start_rerun(page, fragment=name)
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    end_rerun()
+            finally:
+                _local.section = outer
+        return st.fragment(run)
+    return decorator
+
+
+def _discard_trace():
+    """Descarta la medición (y la captura) que un rerun anterior de este hilo no llegó a cerrar."""
+    trace = getattr(_local, 'trace', None)
+    _local.trace = None
+    if trace is not None and trace.capture is not None:
+        discard_capture(trace.capture)
+
+
+def _fragment_rerun():
+    """Si el rerun en curso re-ejecuta solo secciones (fragments) y no la página entera."""
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return bool(ctx is not None and ctx.fragment_ids_this_run)
+
+
+@contextmanager
+def span(name):
+    """Mide una etapa del rerun actual (no hace nada si no hay un rerun en curso)."""
+    trace = getattr(_local, 'trace', None)
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, time.perf_counter() - start)
+
+
+def end_rerun():
+    """Cierra el rerun actual: lo exporta y, si está activo, dibuja el panel de la barra lateral."""
+    trace = getattr(_local, 'trace', None)
+    if trace is None:
+        return None
+    _local.trace = None
+    trace.total = time.perf_counter() - trace.started
+    profile_path = stop_capture(trace.capture) if trace.capture is not None else None
+
+    history = st.session_state.setdefault('metricas_reruns', deque(maxlen=PANEL_RERUNS))
+    history.append(trace)
+
+    try:
+        if METRICS_EXPORT == 'jsonl':
+            _export_jsonl(trace)
+        elif METRICS_EXPORT == 'prometheus':
+            _export_prometheus(trace)
+    except OSError as e:
+        print(f"AVISO: No se pudieron exportar las métricas a {METRICS_FILE}: {e}")
+
+    if getattr(_local, 'section', None) is not None:
+        # Dentro de una sección (st.fragment) no se puede escribir en la barra lateral
+        if profile_path is not None:
+            print(f"Perfil de {trace.page} guardado en {profile_path}")
+        return trace
+    if METRICS_PANEL or st.query_params.get('metricas') == '1':
+        render_panel(history)
+    if profile_path is not None:
+        st.sidebar.caption(f"🔬 Perfil de esta rerun guardado en `{profile_path}`")
+    return trace
+
+
+def render_panel(history):
+    """Tabla de las últimas reruns de la sesión con el desglose por etapa (ms)."""
+    rows = [
+        {'Página': trace.page, 'Total': trace.total * 1000,
+         **{name: seconds * 1000 for name, seconds in trace.spans.items()}}
+        for trace in reversed(history)
+    ]
+    with st.sidebar.expander(f"⏱️ Últimas {len(rows)} reruns (ms)"):
+        st.dataframe(pd.DataFrame(rows).round(1), hide_index=True)
+
+
+def _export_jsonl(trace):
+    line = json.dumps(trace.as_dict(), ensure_ascii=False) + "\n"
+    with _export_lock, open(METRICS_FILE, 'a', encoding='utf-8') as f:
+        f.write(line)
+
+
+def _export_prometheus(trace):
+    global _prometheus_written
+    with _export_lock:
+        _accumulate(('smartfarm_rerun_seconds', (('page', trace.page),)), trace.total)
+        for name, seconds in trace.spans.items():
+            _accumulate(('smartfarm_span_seconds', (('page', trace.page), ('span', name))), seconds)
+        now = time.monotonic()
+        if now - _prometheus_written < PROMETHEUS_WRITE_INTERVAL:
+            return
+        _prometheus_written = now
+        lines = []
+        for metric, help_text in (('smartfarm_rerun_seconds', 'Duración de los reruns por página.'),
+                                  ('smartfarm_span_seconds', 'Duración acumulada de cada etapa del rerun.')):
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} summary")
+            for (name, labels), (total, count) in sorted(_prometheus_totals.items()):
+                if name != metric:
+                    continue
+                label_text = ','.join(f'{key}="{_escape(value)}"' for key, value in labels)
+                lines.append(f"{metric}_sum{{{label_text}}} {total:.6f}")
+                lines.append(f"{metric}_count{{{label_text}}} {count}")
+        tmp_path = f"{METRICS_FILE}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, METRICS_FILE)
+
+
+def _accumulate(key, seconds):
+    totals = _prometheus_totals.setdefault(key, [0.0, 0])
+    totals[0] += seconds
+    totals[1] += 1
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,194 @@
+import threading
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from codificacion_puntajes import PROFILE_VERSION_FIELD, decode_scores
+
+# =================================================================
+# MOTOR DE PUNTUACIÓN VECTORIZADO
+# =================================================================
+# Cálculo de puntajes compartido por 'Puntuación SmartFarm' y 'Análisis de
+# Puntuación'. Los puntajes de los clientes de una categoría se arman como una
+# matriz NumPy (clientes × ítems) alineada al vector de máximos del perfil
+# (precompilado en perfiles_puntaje.REGISTRY), y totales, rendimiento y
+# cumplimiento por ítem salen de operaciones sobre la matriz completa en lugar
+# de recorrer fila por fila. Cada cliente se puntúa con la versión del perfil
+# con la que se cargó su evaluación (Version_Perfil).
+
+TOTAL_COLUMN = 'Puntaje Total'
+PERFORMANCE_COLUMN = 'Rendimiento (%)'
+CATEGORY_COLUMN = 'Categoria_Evaluacion'
+
+
+class CategoryScores:
+    """Puntajes de un grupo de clientes de una categoría, alineados al vector SCORE_MAX."""
+
+    def __init__(self, items, max_vector, matrix):
+        self.items = items
+        self.max_vector = max_vector
+        self.matrix = matrix
+        self.total_max = float(max_vector.sum())
+
+        self.totals = matrix.sum(axis=1)
+        if self.total_max > 0:
+            self.performance = np.round(self.totals / self.total_max * 100, 1)
+        else:
+            self.performance = np.zeros(len(matrix))
+        # % de cumplimiento de cada ítem (0 donde el máximo es 0)
+        achievement = np.zeros_like(matrix)
+        np.divide(matrix, max_vector, out=achievement, where=max_vector > 0)
+        self.achievement = np.round(achievement * 100, 1)
+
+
+def score_matrix(df, items):
+    """Matriz (clientes × ítems) de puntajes; los ítems faltantes o vacíos valen 0."""
+    return df.reindex(columns=items).to_numpy(dtype=float, na_value=0.0)
+
+
+def score_profile(df, profile):
+    """Calcula totales, rendimiento y cumplimiento por ítem de todas las filas de df.
+
+    profile: CompiledProfile (una versión del perfil de una categoría, ver perfiles_puntaje.py).
+    """
+    return CategoryScores(profile.items, profile.max_vector, score_matrix(df, profile.items))
+
+
+def profile_versions(df, profile):
+    """Versión del perfil de cada fila de df (la vigente, 'profile', donde no está guardada)."""
+    if PROFILE_VERSION_FIELD not in df.columns:
+        return np.full(len(df), float(profile.version))
+    versions = pd.to_numeric(df[PROFILE_VERSION_FIELD], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    return np.where(np.isnan(versions), profile.version, versions)
+
+
+def score_clients(df, registry):
+    """Puntaje Total y Rendimiento (%) de cada fila según el perfil de su categoría y versión.
+
+    registry: perfiles_puntaje.ProfileRegistry. Devuelve un DataFrame con el mismo índice
+    que df; las filas de categorías o versiones desconocidas quedan en 0.
+    """
+    totals = np.zeros(len(df))
+    performance = np.zeros(len(df))
+    if CATEGORY_COLUMN in df.columns:
+        categories = df[CATEGORY_COLUMN].to_numpy()
+        for category in registry.categories:
+            in_category = categories == category
+            if not in_category.any():
+                continue
+            versions = profile_versions(df, registry.current(category))
+            for profile in registry.history(category):
+                mask = in_category & (versions == profile.version)
+                if mask.any():
+                    scores = score_profile(df.loc[mask], profile)
+                    totals[mask] = scores.totals
+                    performance[mask] = scores.performance
+    return pd.DataFrame({TOTAL_COLUMN: totals, PERFORMANCE_COLUMN: performance}, index=df.index)
+
+
+# --- Agregados materializados de Puntaje Total ---
+
+GROUP_COLUMNS = [CATEGORY_COLUMN, 'Sucursal', 'Perfil Tecnológico']
+HISTOGRAM_BIN_WIDTH = 10  # Puntos por barra del histograma
+
+
+class ScoreAggregates:
+    """Cantidad, suma, mínimo, máximo e histograma de Puntaje Total por Categoría × Sucursal × Perfil.
+
+    Vista materializada del almacén: se actualiza con cada alta, modificación o baja
+    de un cliente (apply), sin volver a recorrer la colección. Por grupo se guarda la
+    cantidad de clientes con cada puntaje total; como los totales son pocos valores
+    enteros, mínimo, máximo e histograma siguen siendo exactos después de una baja.
+    """
+
+    def __init__(self, registry):
+        self.registry = registry
+        self._lock = threading.Lock()
+        self._groups = {}  # (categoría, sucursal, perfil) -> Counter(total -> clientes)
+
+    def document_total(self, document):
+        """Puntaje Total de un documento de cliente según la versión de su perfil.
+
+        None si su categoría (o versión) no tiene perfil.
+        """
+        profile = self.registry.get(document.get(CATEGORY_COLUMN), document.get(PROFILE_VERSION_FIELD))
+        if profile is None:
+            return None
+        document = decode_scores(document)  # Las vistas reciben los documentos tal como se guardan
+        return sum(document.get(item) or 0 for item in profile.items)
+
+    def _update(self, document, delta):
+        total = self.document_total(document)
+        if total is None:
+            return
+        key = tuple(document.get(column) for column in GROUP_COLUMNS)
+        counts = self._groups.setdefault(key, Counter())
+        counts[total] += delta
+        if counts[total] <= 0:
+            del counts[total]
+            if not counts:
+                del self._groups[key]
+
+    def reset(self):
+        with self._lock:
+            self._groups = {}
+
+    def copy(self):
+        """Copia independiente de los agregados actuales (no recibe los cambios siguientes)."""
+        copied = ScoreAggregates(self.registry)
+        with self._lock:
+            copied._groups = {key: Counter(counts) for key, counts in self._groups.items()}
+        return copied
+
+    def apply(self, previous, document):
+        with self._lock:
+            if previous is not None:
+                self._update(previous, -1)
+            if document is not None:
+                self._update(document, +1)
+
+    def summary(self, category=None):
+        """DataFrame con Clientes, Suma, Promedio, Mínimo y Máximo por grupo."""
+        with self._lock:
+            groups = [(key, dict(counts)) for key, counts in self._groups.items()
+                      if category is None or key[0] == category]
+        rows = []
+        for key, counts in groups:
+            count = sum(counts.values())
+            total = sum(value * n for value, n in counts.items())
+            rows.append(dict(zip(GROUP_COLUMNS, key), **{
+                'Clientes': count,
+                'Suma': total,
+                'Promedio': round(total / count, 1),
+                'Mínimo': min(counts),
+                'Máximo': max(counts),
+            }))
+        columns = GROUP_COLUMNS + ['Clientes', 'Suma', 'Promedio', 'Mínimo', 'Máximo']
+        return pd.DataFrame(rows, columns=columns).sort_values(GROUP_COLUMNS, ignore_index=True)
+
+    def totals(self, category=None):
+        """Clientes, suma, promedio, mínimo y máximo de todos los grupos (o de una categoría)."""
+        merged = self.distribution(category)
+        if not merged:
+            return {'Clientes': 0, 'Suma': 0, 'Promedio': 0.0, 'Mínimo': None, 'Máximo': None}
+        count = sum(merged.values())
+        total = sum(value * n for value, n in merged.items())
+        return {'Clientes': count, 'Suma': total, 'Promedio': round(total / count, 1),
+                'Mínimo': min(merged), 'Máximo': max(merged)}
+
+    def distribution(self, category=None):
+        """Counter(total -> clientes) de todos los grupos (o de una categoría)."""
+        merged = Counter()
+        with self._lock:
+            for key, counts in self._groups.items():
+                if category is None or key[0] == category:
+                    merged.update(counts)
+        return merged
+
+    def histogram(self, category=None, bin_width=HISTOGRAM_BIN_WIDTH):
+        """Clientes por tramo de Puntaje Total: {inicio del tramo: clientes}."""
+        bins = Counter()
+        for value, n in self.distribution(category).items():
+            bins[int(value // bin_width * bin_width)] += n
+        return dict(sorted(bins.items()))
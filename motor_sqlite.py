@@ -0,0 +1,202 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+
+from motor_wal import DocumentEngine, WALEngine, document_version
+
+# =================================================================
+# MOTOR DE ALMACENAMIENTO SQLITE
+# =================================================================
+# Misma API de colecciones/documentos que WALEngine, persistida en una tabla
+# 'documents' (colección, id, versión, JSON) con índices de expresión sobre los
+# campos que se usan para filtrar: las búsquedas por esos campos (find) van por
+# índice en lugar de recorrer la colección.
+#
+# Los documentos se mantienen también en memoria para servir las instantáneas
+# inmutables a las páginas. Cada escritura recibe un número de secuencia ('seq')
+# creciente y los borrados quedan como lápida (data NULL), así otro proceso se
+# pone al día leyendo solo las filas con seq mayor a la última que vio.
+#
+# Se elige por despliegue con SMARTFARM_BACKEND=sqlite (ver almacen.py). Para
+# pasar los datos existentes:  python motor_sqlite.py firestore_simulation.json
+
+SQLITE_FILE = os.environ.get('SMARTFARM_SQLITE_FILE', 'smartfarm.sqlite3')
+SQLITE_SYNCHRONOUS = 'FULL' if os.environ.get('SMARTFARM_WAL_FSYNC', '1') != '0' else 'NORMAL'
+
+# Campos indexados (los que usan los filtros de las páginas y los cruces por cliente)
+INDEXED_FIELDS = ('Cliente', 'ID_Cliente', 'Categoria_Evaluacion', 'Sucursal', 'Estado de Venta', 'Fecha_Registro')
+
+
+def _json_path(field):
+    """Ruta JSON de un campo (entre comillas: algunos nombres tienen espacios)."""
+    return '$."' + field.replace('"', '\\"') + '"'
+
+
+def _index_name(field):
+    return 'idx_documents_' + ''.join(c if c.isalnum() else '_' for c in field.lower())
+
+
+_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS documents (
+        collection TEXT NOT NULL,
+        doc_id TEXT NOT NULL,
+        version INTEGER NOT NULL,
+        seq INTEGER NOT NULL,
+        data TEXT,
+        PRIMARY KEY (collection, doc_id)
+    ) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS idx_documents_seq ON documents (seq)",
+] + [
+    f"CREATE INDEX IF NOT EXISTS {_index_name(field)} "
+    f"ON documents (collection, json_extract(data, '{_json_path(field)}'))"
+    for field in INDEXED_FIELDS
+]
+
+
+class SQLiteEngine(DocumentEngine):
+    """Almacén de documentos respaldado por SQLite, con índices por campo."""
+
+    def __init__(self, db_file=SQLITE_FILE, synchronous=SQLITE_SYNCHRONOUS):
+        super().__init__()
+        self.db_file = db_file
+        # Autocommit: las transacciones se abren explícitamente con BEGIN IMMEDIATE.
+        self._conn = sqlite3.connect(db_file, isolation_level=None, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA synchronous={synchronous}")
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+        self._last_seq = 0
+        self._data_version = None
+        with self._lock:
+            self._catch_up()
+
+    # --- Sincronización con otros procesos ---
+
+    def _catch_up(self):
+        """Aplica las filas escritas (por cualquier conexión) después de la última secuencia vista."""
+        rows = self._conn.execute(
+            "SELECT collection, doc_id, data, seq FROM documents WHERE seq > ? ORDER BY seq", (self._last_seq,)
+        ).fetchall()
+        for collection, doc_id, data, seq in rows:
+            if data is None:
+                record = {'op': 'delete', 'col': collection, 'id': doc_id}
+            else:
+                record = {'op': 'put', 'col': collection, 'id': doc_id, 'doc': json.loads(data)}
+            self._apply(record)
+            self._last_seq = seq
+        if rows:
+            self.version += 1
+        self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def refresh(self):
+        """Incorpora los cambios de otros procesos. Devuelve si hubo cambios."""
+        with self._lock:
+            # data_version solo cambia cuando otra conexión confirmó una transacción
+            if self._conn.execute("PRAGMA data_version").fetchone()[0] == self._data_version:
+                return False
+            before = self.version
+            self._catch_up()
+            return self.version != before
+
+    def _commit(self, operations):
+        """Compare-and-swap de las operaciones dentro de una sola transacción BEGIN IMMEDIATE."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._catch_up()
+                prepared = self._prepare(operations)
+                if not prepared:
+                    self._conn.execute("ROLLBACK")
+                    return 0
+                rows = []
+                for seq, (record, document) in enumerate(prepared, start=self._last_seq + 1):
+                    if document is None:
+                        # Lápida: conserva la versión del documento eliminado
+                        version = document_version(self._data.get(record['col'], {}).get(record['id']))
+                        rows.append((record['col'], record['id'], version, seq, None))
+                    else:
+                        rows.append((record['col'], record['id'], document_version(document), seq,
+                                     json.dumps(document)))
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO documents (collection, doc_id, version, seq, data) VALUES (?, ?, ?, ?, ?)",
+                    rows
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+                raise
+            for record, _ in prepared:
+                self._apply(record)
+            self._last_seq += len(prepared)
+            self.version += 1
+            return len(prepared)
+
+    # --- Consultas por índice ---
+
+    def find(self, collection, field, value, snapshot=None):
+        """Documentos de la colección cuyo campo 'field' vale 'value' (por índice si está indexado)."""
+        if field not in INDEXED_FIELDS or (collection, field) in self._indexes:
+            return super().find(collection, field, value, snapshot)
+        with self._lock:
+            if snapshot is not None and snapshot.version != self.version:
+                return super().find(collection, field, value, snapshot)
+            rows = self._conn.execute(
+                f"SELECT doc_id FROM documents WHERE collection = ? AND json_extract(data, '{_json_path(field)}') = ?",
+                (collection, value)
+            ).fetchall()
+            docs = self._data.get(collection, {})
+            return {doc_id: docs[doc_id] for doc_id, in rows if doc_id in docs}
+
+    # --- Mantenimiento ---
+
+    def compact(self, wait=False):
+        """Vacía el journal WAL de SQLite en el archivo de base de datos."""
+        with self._lock:
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def migrate_from_json(data_file, db_file=SQLITE_FILE):
+    """Copia todos los documentos de firestore_simulation.json (+ su WAL) a SQLite en una transacción."""
+    source = WALEngine(data_file)
+    engine = SQLiteEngine(db_file)
+    try:
+        if engine.snapshot().collections():
+            raise RuntimeError(f"La base {db_file} ya tiene documentos: la migración se hace una sola vez.")
+        snapshot = source.snapshot()
+        rows = [
+            (col, doc_id, document_version(doc), json.dumps(doc))
+            for col in snapshot.collections()
+            for doc_id, doc in snapshot.collection(col).items()
+        ]
+        conn = engine._conn
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany(
+            "INSERT INTO documents (collection, doc_id, version, seq, data) VALUES (?, ?, ?, ?, ?)",
+            [(col, doc_id, version, seq, data) for seq, (col, doc_id, version, data) in enumerate(rows, start=1)]
+        )
+        conn.execute("COMMIT")
+        conn.execute("ANALYZE")
+        return len(rows)
+    finally:
+        engine.close()
+        source.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Migra la base JSON de la simulación a SQLite.")
+    parser.add_argument('data_file', nargs='?', default='firestore_simulation.json')
+    parser.add_argument('db_file', nargs='?', default=SQLITE_FILE)
+    args = parser.parse_args()
+    try:
+        migrated = migrate_from_json(args.data_file, args.db_file)
+    except RuntimeError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+    print(f"Se migraron {migrated} documentos de {args.data_file} a {args.db_file}.")
@@ -0,0 +1,695 @@
+import json
+import os
+import random
+import threading
+import time
+import zlib
+from types import MappingProxyType
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# =================================================================
+# MOTOR DE ALMACENAMIENTO CON REGISTRO DE ESCRITURA ANTICIPADA (WAL)
+# =================================================================
+# El archivo JSON principal (DATA_FILE) pasa a ser una instantánea compactada.
+# Cada alta, modificación o baja de un documento se agrega como una línea al
+# archivo '<DATA_FILE>.wal', de modo que guardar un puntaje o una venta cuesta
+# O(registro) en lugar de reescribir toda la base.
+#
+# Formato de cada línea del registro:  "<crc32 en hex> <json del registro>\n"
+# Al abrir se carga la instantánea y se reproducen los registros en orden. Una
+# línea incompleta o con CRC inválido (cola truncada por un corte) se descarta
+# y el archivo se recorta hasta el último registro válido.
+#
+# Compactación: cuando el WAL supera el umbral se renombra a
+# '<DATA_FILE>.wal.compacting', se abre un WAL nuevo y un hilo en segundo plano
+# escribe la instantánea completa (archivo temporal + os.replace). Si el proceso
+# se corta a mitad de camino, al abrir se reproduce también '.wal.compacting';
+# los registros son idempotentes, así que reproducirlos dos veces es seguro.
+#
+# Copia en escritura: las lecturas reciben una instantánea inmutable (Snapshot)
+# compartida por todas las sesiones. Al entregarla, las colecciones quedan
+# "congeladas"; la primera escritura posterior sobre una colección congelada
+# la copia antes de modificarla, de modo que la instantánea nunca cambia.
+#
+# Concurrencia entre procesos: cada documento lleva su versión en el campo
+# '_version'. Una escritura toma el lock consultivo '<DATA_FILE>.lock' solo para
+# leer los registros que agregaron otros procesos desde la última vez (la cola
+# del WAL), comparar la versión esperada (compare-and-swap) y agregar una línea.
+# Si la versión no coincide se lanza ConflictError; transact() reintenta.
+
+COMPACT_THRESHOLD_BYTES = int(os.environ.get('SMARTFARM_WAL_COMPACT_BYTES', 1024 * 1024))
+WAL_FSYNC = os.environ.get('SMARTFARM_WAL_FSYNC', '1') != '0'
+TRANSACTION_RETRIES = 50
+STALE_COMPACTION_SECONDS = 60
+
+VERSION_FIELD = '_version'
+
+
+def document_version(document):
+    """Versión de un documento (0 si no existe; 1 para documentos anteriores al versionado)."""
+    if document is None:
+        return 0
+    return document.get(VERSION_FIELD, 1)
+
+
+class ConflictError(Exception):
+    """El documento cambió desde que se leyó (falló la comparación de versiones)."""
+
+    def __init__(self, collection, doc_id, expected, actual):
+        super().__init__(
+            f"Conflicto en '{collection}/{doc_id}': se esperaba la versión {expected} y la actual es {actual}."
+        )
+        self.collection = collection
+        self.doc_id = doc_id
+        self.expected = expected
+        self.actual = actual
+
+
+class _FileLock:
+    """Lock consultivo entre procesos, reentrante dentro del hilo que tiene el lock del motor."""
+
+    def __init__(self, path):
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._depth = 0
+
+    def __enter__(self):
+        if self._depth == 0:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            else:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+
+    def close(self):
+        os.close(self._fd)
+
+
+class Snapshot:
+    """Vista inmutable de la base en una versión dada."""
+
+    def __init__(self, version, collections, collection_versions=None):
+        self.version = version
+        self._collections = collections
+        self._collection_versions = collection_versions or {}
+
+    def collection(self, collection):
+        """Documentos de una colección (id -> documento), de solo lectura."""
+        return self._collections.get(collection, _EMPTY)
+
+    def collection_version(self, collection):
+        """Versión de una colección: cambia solo cuando cambia alguno de sus documentos."""
+        return self._collection_versions.get(collection, 0)
+
+    def collections(self):
+        return list(self._collections)
+
+
+_EMPTY = MappingProxyType({})
+
+
+class DocumentEngine:
+    """Estado en memoria compartido por los motores: documentos, instantáneas y API de documentos.
+
+    Cada motor implementa refresh(), compact(), close() y _commit(), que persiste de
+    forma atómica los registros ('put' / 'update' / 'delete') de una lista de
+    operaciones, con compare-and-swap de la versión de cada documento.
+    """
+
+    def __init__(self):
+        # Los documentos en memoria nunca se modifican en su lugar: cada escritura
+        # reemplaza el dict del documento. Las colecciones se copian solo si
+        # están congeladas por una instantánea entregada (ver _writable).
+        self._lock = threading.RLock()
+        self._data = {}
+        self._frozen = set()
+        self._snapshot = None
+        # Índices secundarios en memoria: (colección, campo) -> {valor: {ids}}
+        self._indexes = {}
+        # Vistas materializadas: nombre -> (colección, vista con reset() y apply(anterior, nuevo))
+        self._views = {}
+
+        # Versión de los datos: aumenta con cada cambio aplicado (propio o de otro proceso).
+        self.version = 0
+        # Versión de cada colección: número del último cambio aplicado a alguno de sus documentos.
+        self._changes = 0
+        self._collection_versions = {}
+        # Cantidad de conflictos de versión reintentados por transact().
+        self.conflicts = 0
+
+    # --- Aplicación de registros ---
+
+    def _apply(self, record):
+        """Aplica un registro al estado en memoria. Devuelve si hubo cambios."""
+        op = record['op']
+        collection = record.get('col')
+        doc_id = record.get('id')
+        docs = self._data.get(collection)
+        previous = docs.get(doc_id) if docs is not None else None
+
+        if op == 'batch':
+            # Lote atómico de WriteBatch: una sola línea del WAL con varios registros
+            return any([self._apply(item) for item in record['records']])
+        if op == 'put':
+            document = self._writable(collection)[doc_id] = record['doc']
+        elif op == 'update':
+            if previous is None:
+                return False
+            document = self._writable(collection)[doc_id] = {**previous, **record['fields']}
+        elif op == 'delete':
+            if previous is None:
+                return False
+            del self._writable(collection)[doc_id]
+            document = None
+        else:
+            raise ValueError(f"Operación de WAL desconocida: {op}")
+        self._touch(collection)
+        self._reindex(collection, doc_id, previous, document)
+        return True
+
+    def _touch(self, collection):
+        self._changes += 1
+        self._collection_versions[collection] = self._changes
+
+    def _writable(self, collection):
+        """Devuelve el dict de la colección listo para modificar (copia si está congelado)."""
+        docs = self._data.get(collection)
+        if docs is None:
+            docs = self._data[collection] = {}
+        elif collection in self._frozen:
+            docs = self._data[collection] = dict(docs)
+            self._frozen.discard(collection)
+        return docs
+
+    # --- Índices secundarios ---
+
+    def ensure_index(self, collection, field):
+        """Mantiene en memoria el índice valor de 'field' -> ids de la colección (lo usa find)."""
+        with self._lock:
+            if (collection, field) not in self._indexes:
+                self._indexes[(collection, field)] = {}
+                self._build_index(collection, field)
+
+    def _build_index(self, collection, field):
+        index = self._indexes[(collection, field)]
+        index.clear()
+        for doc_id, doc in self._data.get(collection, {}).items():
+            index.setdefault(doc.get(field), set()).add(doc_id)
+
+    def ensure_view(self, name, collection, factory):
+        """Registra (una vez) una vista materializada sobre la colección y la devuelve.
+
+        factory() crea la vista; se carga con los documentos actuales y luego recibe
+        apply(anterior, nuevo) por cada cambio (None = no existía / se eliminó).
+        """
+        with self._lock:
+            if name not in self._views:
+                self._views[name] = (collection, factory())
+                self._build_view(name)
+            return self._views[name][1]
+
+    def view_at(self, name, snapshot, factory):
+        """Copia (view.copy()) de una vista registrada tal como estaba en la instantánea de un lector.
+
+        Si la vista ya incluye cambios de su colección posteriores a la instantánea, se arma
+        otra con factory() sobre los documentos de la instantánea (sin registrarla).
+        """
+        with self._lock:
+            collection, view = self._views[name]
+            if self._collection_versions.get(collection, 0) == snapshot.collection_version(collection):
+                return view.copy()
+        view = factory()
+        for doc in snapshot.collection(collection).values():
+            view.apply(None, doc)
+        return view
+
+    def _build_view(self, name):
+        collection, view = self._views[name]
+        view.reset()
+        for doc in self._data.get(collection, {}).values():
+            view.apply(None, doc)
+
+    def _reindex(self, collection, doc_id, previous, document):
+        """Actualiza los índices y vistas de la colección tras el cambio de un documento."""
+        for view_collection, view in self._views.values():
+            if view_collection == collection:
+                view.apply(previous, document)
+        for (indexed_collection, field), index in self._indexes.items():
+            if indexed_collection != collection:
+                continue
+            if previous is not None:
+                ids = index.get(previous.get(field))
+                if ids is not None:
+                    ids.discard(doc_id)
+                    if not ids:
+                        del index[previous.get(field)]
+            if document is not None:
+                index.setdefault(document.get(field), set()).add(doc_id)
+
+    # --- API de documentos ---
+
+    def snapshot(self):
+        """Instantánea inmutable de la versión actual, compartida entre lectores."""
+        with self._lock:
+            if self._snapshot is None or self._snapshot.version != self.version:
+                self._frozen = set(self._data)
+                self._snapshot = Snapshot(
+                    self.version, {col: MappingProxyType(docs) for col, docs in self._data.items()},
+                    dict(self._collection_versions)
+                )
+            return self._snapshot
+
+    def get_collection(self, collection):
+        """Devuelve los documentos de una colección (id -> documento), de solo lectura."""
+        return self.snapshot().collection(collection)
+
+    def get_document(self, collection, doc_id):
+        """Devuelve un documento o None si no existe."""
+        with self._lock:
+            return self._data.get(collection, {}).get(doc_id)
+
+    def find(self, collection, field, value, snapshot=None):
+        """Documentos de la colección cuyo campo 'field' vale 'value' (id -> documento).
+
+        snapshot: instantánea que fijó el lector; si ya no es la versión actual, se busca
+        en ella (sin índice) para no mezclar versiones.
+        """
+        with self._lock:
+            index = self._indexes.get((collection, field))
+            if index is not None and (snapshot is None or snapshot.version == self.version):
+                docs = self._data.get(collection, {})
+                return {doc_id: docs[doc_id] for doc_id in index.get(value, ())}
+        docs = (snapshot or self.snapshot()).collection(collection)
+        return {doc_id: doc for doc_id, doc in docs.items() if doc.get(field) == value}
+
+    def put_document(self, collection, doc_id, document, expected_version=None):
+        """Crea o reemplaza un documento completo.
+
+        expected_version: None no valida; 0 exige que el documento no exista; n exige la versión n.
+        """
+        return self._commit([(collection, doc_id, expected_version, _build_put(collection, doc_id, document))]) == 1
+
+    def update_document(self, collection, doc_id, fields, expected_version=None):
+        """Actualiza campos de un documento existente. Devuelve False si no existe."""
+        return self._commit([(collection, doc_id, expected_version, _build_update(collection, doc_id, fields))]) == 1
+
+    def merge_document(self, collection, doc_id, merge, expected_version=None):
+        """Reemplaza un documento existente por merge(documento actual), calculado con el lock tomado.
+
+        Devuelve False si no existe. Sirve para actualizaciones que no son un merge de campos
+        (p. ej. colecciones codificadas, que tienen que volver a codificar el documento completo).
+        """
+        return self._commit([(collection, doc_id, expected_version, _build_merge(collection, doc_id, merge))]) == 1
+
+    def delete_document(self, collection, doc_id, expected_version=None):
+        """Elimina un documento. Devuelve False si no existía."""
+        return self._commit([(collection, doc_id, expected_version, _build_delete(collection, doc_id))]) == 1
+
+    def batch(self):
+        """Lote de escrituras que se aplican juntas y de forma atómica (ver WriteBatch)."""
+        return WriteBatch(self)
+
+    def _prepare(self, operations):
+        """Valida versiones y arma los registros de las operaciones (con los locks tomados y al día).
+
+        Devuelve [(registro, documento resultante | None)]; las operaciones de un mismo
+        lote ven el resultado de las anteriores sobre el mismo documento.
+        """
+        results = {}
+        prepared = []
+        for collection, doc_id, expected_version, build_record in operations:
+            key = (collection, doc_id)
+            current = results[key] if key in results else self._data.get(collection, {}).get(doc_id)
+            current_version = document_version(current)
+            if expected_version is not None and expected_version != current_version:
+                raise ConflictError(collection, doc_id, expected_version, current_version)
+            record = build_record(current, current_version)
+            if record is None:
+                continue
+            if record['op'] == 'put':
+                results[key] = record['doc']
+            elif record['op'] == 'update':
+                results[key] = {**current, **record['fields']}
+            else:
+                results[key] = None
+            prepared.append((record, results[key]))
+        return prepared
+
+    def transact(self, collection, doc_id, fn, retries=TRANSACTION_RETRIES):
+        """Lee-modifica-escribe con reintento ante conflictos.
+
+        fn(documento_actual | None) devuelve el documento nuevo, o None para eliminarlo.
+        Devuelve el documento escrito (o None si se eliminó).
+        """
+        if retries < 1:
+            raise ValueError(f"retries debe ser al menos 1 (se recibió {retries}).")
+        for attempt in range(retries):
+            self.refresh()
+            current = self.get_document(collection, doc_id)
+            new_document = fn(current)
+            expected = document_version(current)
+            try:
+                if new_document is None:
+                    self.delete_document(collection, doc_id, expected_version=expected)
+                else:
+                    self.put_document(collection, doc_id, new_document, expected_version=expected)
+                return new_document
+            except ConflictError:
+                self.conflicts += 1
+                # Espera breve y aleatoria para no chocar otra vez con el mismo escritor
+                time.sleep(random.uniform(0, 0.001 * (attempt + 1)))
+        raise ConflictError(collection, doc_id, expected, document_version(self.get_document(collection, doc_id)))
+
+
+def _build_put(collection, doc_id, document):
+    def build(current, version):
+        return {'op': 'put', 'col': collection, 'id': doc_id, 'doc': {**document, VERSION_FIELD: version + 1}}
+    return build
+
+
+def _build_update(collection, doc_id, fields):
+    def build(current, version):
+        if current is None:
+            return None
+        return {'op': 'update', 'col': collection, 'id': doc_id, 'fields': {**fields, VERSION_FIELD: version + 1}}
+    return build
+
+
+def _build_merge(collection, doc_id, merge):
+    def build(current, version):
+        if current is None:
+            return None
+        return {'op': 'put', 'col': collection, 'id': doc_id, 'doc': {**merge(current), VERSION_FIELD: version + 1}}
+    return build
+
+
+def _build_delete(collection, doc_id):
+    def build(current, version):
+        if current is None:
+            return None
+        return {'op': 'delete', 'col': collection, 'id': doc_id}
+    return build
+
+
+class WriteBatch:
+    """Escrituras acumuladas que se aplican todas juntas o ninguna, con una sola escritura a disco.
+
+    Si alguna versión esperada no coincide, commit() lanza ConflictError y no aplica nada.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._operations = []
+
+    def __len__(self):
+        return len(self._operations)
+
+    def set(self, collection, doc_id, document, expected_version=None):
+        self._operations.append((collection, doc_id, expected_version, _build_put(collection, doc_id, document)))
+        return self
+
+    def update(self, collection, doc_id, fields, expected_version=None):
+        self._operations.append((collection, doc_id, expected_version, _build_update(collection, doc_id, fields)))
+        return self
+
+    def merge(self, collection, doc_id, merge, expected_version=None):
+        """Como DocumentEngine.merge_document, dentro del lote."""
+        self._operations.append((collection, doc_id, expected_version, _build_merge(collection, doc_id, merge)))
+        return self
+
+    def delete(self, collection, doc_id, expected_version=None):
+        self._operations.append((collection, doc_id, expected_version, _build_delete(collection, doc_id)))
+        return self
+
+    def commit(self):
+        """Aplica el lote. Devuelve cuántas operaciones modificaron un documento."""
+        operations, self._operations = self._operations, []
+        if not operations:
+            return 0
+        return self.engine._commit(operations)
+
+
+class WALEngine(DocumentEngine):
+    """Almacén de documentos en memoria respaldado por instantánea JSON + WAL."""
+
+    def __init__(self, data_file, compact_threshold=COMPACT_THRESHOLD_BYTES, fsync=WAL_FSYNC):
+        self.data_file = data_file
+        self.wal_file = f"{data_file}.wal"
+        self.compacting_file = f"{data_file}.wal.compacting"
+        self.compact_threshold = compact_threshold
+        self.fsync = fsync
+
+        super().__init__()
+        self._file_lock = _FileLock(f"{data_file}.lock")
+        self._compactor = None
+
+        # Posición hasta la que se leyó el WAL actual (identificado por su inodo).
+        self._wal = None
+        self._wal_ino = None
+        self._wal_pos = 0
+
+        with self._lock, self._file_lock:
+            self._load_all()
+        self._maybe_compact()
+
+    # --- Apertura y recuperación ---
+
+    def _load_all(self):
+        """Carga la instantánea y reproduce los registros pendientes (con el lock de archivo tomado)."""
+        if self._wal is not None:
+            self._wal.close()
+        self._data = self._load_snapshot()
+        self._frozen = set()
+        self._snapshot = None
+        self._collection_versions = {}
+        for collection in self._data:
+            self._touch(collection)
+        for collection, field in self._indexes:
+            self._build_index(collection, field)
+        for name in self._views:
+            self._build_view(name)
+        self._replay(self.compacting_file, 0)
+        self._open_wal()
+        self._wal_pos = self._replay(self.wal_file, 0)
+        self.version += 1
+
+    def _open_wal(self):
+        self._wal = open(self.wal_file, 'ab')
+        self._wal_ino = os.fstat(self._wal.fileno()).st_ino
+        self._wal_pos = 0
+
+    def _load_snapshot(self):
+        """Lee la instantánea compactada (el JSON histórico de la simulación)."""
+        if not os.path.exists(self.data_file):
+            return {}
+        try:
+            with open(self.data_file, 'r') as f:
+                data = json.load(f)
+        except json.JSONDecodeError:
+            # No se pisa el archivo dañado: se aparta para poder revisarlo a mano.
+            corrupt_path = f"{self.data_file}.corrupto"
+            os.replace(self.data_file, corrupt_path)
+            print(f"ERROR: Archivo {self.data_file} corrupto. Se movió a {corrupt_path} y se inicia vacío.")
+            return {}
+        return {col: dict(docs) for col, docs in data.items() if isinstance(docs, dict)}
+
+    def _replay(self, path, start):
+        """Reproduce un WAL desde 'start' y recorta la cola si está truncada o dañada.
+
+        Devuelve la posición hasta la que se leyó.
+        """
+        try:
+            with open(path, 'rb') as f:
+                f.seek(start)
+                content = f.read()
+        except FileNotFoundError:
+            return 0
+
+        offset = 0
+        while offset < len(content):
+            end = content.find(b'\n', offset)
+            if end == -1:
+                break  # Última línea sin salto: escritura interrumpida
+            record = self._decode_line(content[offset:end])
+            if record is None:
+                break
+            if self._apply(record):
+                self.version += 1
+            offset = end + 1
+
+        if offset < len(content):
+            # Con el lock de archivo tomado nadie está escribiendo: es la cola de un corte.
+            print(f"AVISO: Se descartan {len(content) - offset} bytes inválidos al final de {path}.")
+            with open(path, 'r+b') as f:
+                f.truncate(start + offset)
+        return start + offset
+
+    def _catch_up(self):
+        """Aplica lo que otros procesos agregaron al WAL (con el lock de archivo tomado)."""
+        try:
+            stat = os.stat(self.wal_file)
+        except FileNotFoundError:
+            stat = None
+        if stat is not None and stat.st_ino == self._wal_ino:
+            if stat.st_size > self._wal_pos:
+                self._wal_pos = self._replay(self.wal_file, self._wal_pos)
+            return
+
+        # Otro proceso rotó el WAL para compactar. Si el archivo rotado sigue siendo
+        # el que veníamos leyendo, alcanza con terminarlo y pasar al nuevo; si no,
+        # la instantánea ya cambió y se recarga todo.
+        try:
+            rotated_ino = os.stat(self.compacting_file).st_ino
+        except FileNotFoundError:
+            rotated_ino = None
+        if rotated_ino == self._wal_ino:
+            self._replay(self.compacting_file, self._wal_pos)
+            self._wal.close()
+            self._open_wal()
+            self._wal_pos = self._replay(self.wal_file, 0)
+        else:
+            self._load_all()
+
+    def refresh(self):
+        """Incorpora los cambios de otros procesos. Devuelve si hubo cambios."""
+        try:
+            stat = os.stat(self.wal_file)
+            if stat.st_ino == self._wal_ino and stat.st_size == self._wal_pos:
+                return False
+        except FileNotFoundError:
+            pass
+        with self._lock, self._file_lock:
+            before = self.version
+            self._catch_up()
+            return self.version != before
+
+    @staticmethod
+    def _encode_line(record):
+        payload = json.dumps(record, separators=(',', ':')).encode('utf-8')
+        return f"{zlib.crc32(payload):08x} ".encode('ascii') + payload + b"\n"
+
+    @staticmethod
+    def _decode_line(line):
+        checksum, _, payload = line.partition(b' ')
+        try:
+            if int(checksum, 16) != zlib.crc32(payload):
+                return None
+            return json.loads(payload)
+        except ValueError:
+            return None
+
+    def _commit(self, operations):
+        """Compare-and-swap de las operaciones: se ponen al día, se validan versiones y se agrega al WAL.
+
+        Varias operaciones se escriben como un único registro 'batch' (una línea con un solo
+        CRC), así que tras un corte se reproducen todas o ninguna. El lock de archivo se
+        mantiene solo durante esta sección. Devuelve cuántos registros se escribieron.
+        """
+        with self._lock:
+            with self._file_lock:
+                self._catch_up()
+                records = [record for record, _ in self._prepare(operations)]
+                if not records:
+                    return 0
+                record = records[0] if len(records) == 1 else {'op': 'batch', 'records': records}
+                line = self._encode_line(record)
+                self._wal.write(line)
+                self._wal.flush()
+                if self.fsync:
+                    os.fsync(self._wal.fileno())
+                self._wal_pos += len(line)
+                self._apply(record)
+                self.version += 1
+            self._maybe_compact()
+            return len(records)
+
+    # --- Compactación ---
+
+    def _maybe_compact(self):
+        if self._wal_pos >= self.compact_threshold:
+            self.compact()
+
+    def compact(self, wait=False):
+        """Rota el WAL y escribe la instantánea completa en un hilo en segundo plano."""
+        with self._lock, self._file_lock:
+            self._catch_up()
+            try:
+                rotated = os.stat(self.compacting_file)
+            except FileNotFoundError:
+                rotated = None
+
+            if self._compactor is not None and self._compactor.is_alive():
+                compactor = self._compactor
+            elif rotated is not None:
+                # Otro proceso está compactando; si el archivo rotado quedó abandonado
+                # (p. ej. por un corte) se completa antes de rotar otra vez.
+                if time.time() - rotated.st_ctime < STALE_COMPACTION_SECONDS:
+                    return
+                compactor = self._start_compactor(rotated.st_ino)
+            elif self._wal_pos == 0:
+                return
+            else:
+                rotated_ino = self._wal_ino
+                self._wal.close()
+                os.replace(self.wal_file, self.compacting_file)
+                self._open_wal()
+                compactor = self._start_compactor(rotated_ino)
+        if wait:
+            compactor.join()
+
+    def _start_compactor(self, rotated_ino):
+        self._compactor = threading.Thread(
+            target=self._write_snapshot, args=(self.snapshot(), rotated_ino), name="wal-compactor", daemon=True
+        )
+        self._compactor.start()
+        return self._compactor
+
+    def _write_snapshot(self, snapshot, rotated_ino):
+        tmp_path = f"{self.data_file}.{os.getpid()}.tmp"
+        data = {col: dict(snapshot.collection(col)) for col in snapshot.collections()}
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            with self._lock, self._file_lock:
+                try:
+                    current_ino = os.stat(self.compacting_file).st_ino
+                except FileNotFoundError:
+                    current_ino = None
+                if current_ino != rotated_ino:
+                    # Otra compactación terminó primero: esta instantánea ya no sirve.
+                    os.remove(tmp_path)
+                    return
+                os.replace(tmp_path, self.data_file)
+                os.remove(self.compacting_file)
+        except Exception as e:
+            # El WAL rotado sigue en disco: se reproducirá en la próxima apertura.
+            print(f"ERROR: Falló la compactación de {self.data_file}: {e}")
+
+    def close(self):
+        """Espera la compactación en curso y cierra el WAL."""
+        with self._lock:
+            compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
+        with self._lock:
+            if self._wal is not None:
+                self._wal.close()
+                self._wal = None
+                self._file_lock.close()
@@ -1,11 +1,17 @@
 import streamlit as st
-import pandas as pd
-import json
-import os
 from datetime import datetime
 import plotly.express as px
 import uuid  # Para generar IDs únicos para cada venta
 
+from almacen import (
+    SALES_COLLECTION_PATH, SCORES_COLLECTION_PATH as SCORE_COLLECTION_PATH, ConflictError, document_version, get_session,
+    get_store
+)
+from exportacion import EXPORT_FORMATS, ExportFile
+from importacion import import_sales
+from metricas import end_rerun, fragment, span, start_rerun
+from paginacion import PagedTable
+
 
 # Configuración inicial de la página Streamlit
 st.set_page_config(
@@ -14,74 +20,138 @@ st.set_page_config(
     page_icon="sf1.png",
     initial_sidebar_state="collapsed",
 )
+start_rerun('Gestión de Ventas')
 
 
 # =================================================================
-# REPLICACIÓN DE CONFIGURACIÓN Y FUNCIONES DE BD
+# CONFIGURACIÓN Y FUNCIONES DE BD (ALMACÉN COMPARTIDO)
 # =================================================================
-# Variables globales para simular la persistencia de datos de Firestore
-app_id = os.environ.get('__app_id', 'smartfarm_default_app_id')
+# Cada venta es un documento propio con ID_Venta como clave; el almacén mantiene el
+# índice ID_Cliente -> ventas (ver INDEXES en almacen.py).
+LEGACY_SALES_DOC_ID = 'all_sales_records'  # Documento único con la lista de ventas (formato anterior)
+SALES_COLUMNS = ['ID_Venta', 'ID_Cliente', 'Cliente', 'Tipo de Venta', 'Estado de Venta', 'Detalle', 'Monto',
+                 'Fecha Registro']
+SALE_TYPES = ["Componente", "Activación", "Servicio"]
+SALE_STATUSES = ["Posible", "Cerrado"]
 
-# Definiciones de rutas de colecciones
-SCORE_COLLECTION_PATH = f'artifacts/{app_id}/public/data/client_scores'
-SALES_COLLECTION_PATH = f'artifacts/{app_id}/public/data/client_sales'
-SALES_DOC_ID = 'all_sales_records'  # ID único del documento que contiene la lista de ventas
+# Las colecciones se leen del almacén compartido; la sesión no guarda copias propias.
+scores_db = get_session().collection(SCORE_COLLECTION_PATH)
+sales_db = get_session().collection(SALES_COLLECTION_PATH)
 
-DATA_FILE = "firestore_simulation.json"
 
-
-def save_to_json():
-    """Guarda el diccionario de datos de Firestore simulado en el archivo JSON."""
+def load_all_client_data():
+    """Carga los datos de todos los clientes (solo para obtener nombres)."""
+    return scores_db.to_dict()
+
+
+def migrate_legacy_sales_db():
+    """Convierte la lista de 'all_sales_records' en un documento por venta (una sola vez)."""
+    legacy_doc = sales_db.get(LEGACY_SALES_DOC_ID)
+    if legacy_doc is None:
+        return
+    # Un solo lote atómico; si otro usuario modificó la lista mientras tanto, la versión
+    # no coincide, no se aplica nada y se reintenta
+    batch = get_session().batch()
+    for record in legacy_doc.get('records', []):
+        batch.set(SALES_COLLECTION_PATH, record['ID_Venta'], record)
+    batch.delete(SALES_COLLECTION_PATH, LEGACY_SALES_DOC_ID, expected_version=document_version(legacy_doc))
     try:
-        if 'firestore_data' in st.session_state:
-            with open(DATA_FILE, 'w') as f:
-                json.dump(st.session_state.firestore_data, f, indent=4)
-    except Exception as e:
-        st.error(f"Error al guardar datos simulados en JSON: {e}")
+        batch.commit()
+    except ConflictError:
+        migrate_legacy_sales_db()
 
 
-if 'db_initialized_sales' not in st.session_state:
+def save_sale_db(sale_id, record):
+    """Guarda una venta nueva como documento propio."""
     try:
-        if os.path.exists(DATA_FILE):
-            with open(DATA_FILE, 'r') as f:
-                st.session_state.firestore_data = json.load(f)
-        else:
-            st.session_state.firestore_data = {}
-    except:
-        st.session_state.firestore_data = {}
-
-    # Inicializa la colección de clientes si no existe (para lectura de nombres)
-    if SCORE_COLLECTION_PATH not in st.session_state.firestore_data:
-        st.session_state.firestore_data[SCORE_COLLECTION_PATH] = {}
-
-    # Inicializa la colección de ventas
-    if SALES_COLLECTION_PATH not in st.session_state.firestore_data:
-        st.session_state.firestore_data[SALES_COLLECTION_PATH] = {}
-
-    # Inicializa el documento de ventas si no existe
-    if SALES_DOC_ID not in st.session_state.firestore_data[SALES_COLLECTION_PATH]:
-        st.session_state.firestore_data[SALES_COLLECTION_PATH][SALES_DOC_ID] = {'records': []}
-        save_to_json()
+        with span('guardado'):
+            sales_db.create(sale_id, record)
+    except Exception as e:
+        st.error(f"Error al guardar datos simulados: {e}")
+        return False
+    return True
 
-    st.session_state.db_initialized_sales = True
 
+def import_sales_db(uploaded_file):
+    """Importa ventas desde un CSV/Excel; el cliente se resuelve por ID_Cliente y todo va en un solo lote."""
+    try:
+        with span('importacion'):
+            return import_sales(get_session(), uploaded_file, uploaded_file.name, SALE_TYPES, SALE_STATUSES)
+    except Exception as e:
+        st.error(f"Error al importar el archivo: {e}")
+        return None
 
-def load_all_client_data():
-    """Carga los datos de todos los clientes (solo para obtener nombres)."""
-    return st.session_state.firestore_data.get(SCORE_COLLECTION_PATH, {})
 
+def apply_sales_changes_db(edits_by_id, deleted_ids):
+    """Aplica ediciones y eliminaciones en un solo lote atómico, sin tocar las demás ventas.
 
-def load_sales_db():
-    """Carga la lista de registros de ventas."""
-    return st.session_state.firestore_data.get(SALES_COLLECTION_PATH, {}).get(SALES_DOC_ID, {}).get('records', [])
+    Devuelve (actualizadas, eliminadas) o None si falló el guardado.
+    """
+    batch = get_session().batch()
+    for sale_id in deleted_ids:
+        batch.delete(SALES_COLLECTION_PATH, sale_id)
+    edited_ids = [sale_id for sale_id in edits_by_id if sale_id not in deleted_ids]
+    for sale_id in edited_ids:
+        batch.update(SALES_COLLECTION_PATH, sale_id, edits_by_id[sale_id])
+    try:
+        with span('guardado'):
+            batch.commit()
+    except Exception as e:
+        st.error(f"Error al guardar datos simulados: {e}")
+        return None
+    return len(edited_ids), len(deleted_ids)
 
 
-def save_sales_db(sales_list):
-    """Guarda la lista completa de registros de ventas."""
-    st.session_state.firestore_data[SALES_COLLECTION_PATH][SALES_DOC_ID] = {'records': sales_list}
-    save_to_json()
-    st.session_state['sales_data_df'] = pd.DataFrame(sales_list)  # Actualiza el estado de la sesión
-    return True
+def export_sales_db(fmt, filters=None):
+    """Exporta las ventas (con el filtro de la tabla) en un archivo temporal (exportacion.ExportFile) o None."""
+    try:
+        return ExportFile(get_session(), 'client_sales', fmt, filters)
+    except Exception as e:
+        st.error(f"Error al exportar: {e}")
+        return None
+
+
+def sales_summary_db(group_column, client_id=None):
+    """Monto total por 'group_column' (SQL de DuckDB sobre la vista client_sales), de todos o de un cliente."""
+    conditions = [f'"{group_column}" IS NOT NULL']
+    params = []
+    if client_id is not None:
+        conditions.append('"ID_Cliente" = ?')
+        params.append(client_id)
+    return get_session().query(
+        f'SELECT "{group_column}", SUM("Monto") AS "Monto" FROM client_sales '
+        f'WHERE {" AND ".join(conditions)} GROUP BY 1 ORDER BY 1',
+        params
+    )
+
+
+def status_pie_figure(summary_status):
+    """Gráfico de torta del monto por estado de venta."""
+    fig_pie = px.pie(
+        summary_status,
+        values='Monto',
+        names='Estado de Venta',
+        title='Monto Total: Posible vs. Cerrado',
+        color='Estado de Venta',
+        color_discrete_map={'Cerrado': '#4CAF50', 'Posible': '#FFC107'}  # Verde y Amarillo
+    )
+    fig_pie.update_traces(textinfo='percent+value')
+    return fig_pie
+
+
+def type_bar_figure(summary_type):
+    """Gráfico de barras del monto por tipo de venta."""
+    fig_bar = px.bar(
+        summary_type,
+        x='Tipo de Venta',
+        y='Monto',
+        title='Monto Generado por Tipo de Venta',
+        color='Tipo de Venta',
+        text_auto=True,
+        labels={'Monto': 'Monto ($)'}
+    )
+    fig_bar.update_layout(yaxis={'tickprefix': '$'})
+    return fig_bar
 
 
 # --- FUNCIÓN DE UTILIDAD PARA OBTENER NOMBRES ---
@@ -94,36 +164,19 @@ def get_client_names_map():
     }
 
 
-# --- FUNCIÓN DE UTILIDAD PARA OBTENER DATOS Y ALMACENAR EN SESIÓN ---
-@st.cache_data
-def get_sales_dataframe(records):
-    """Crea o actualiza el DataFrame de ventas desde los registros brutos."""
-    if not records:
-        # Crea un DF vacío con las columnas esperadas si no hay registros
-        empty_cols = ['ID_Venta', 'ID_Cliente', 'Cliente', 'Tipo de Venta', 'Estado de Venta', 'Detalle', 'Monto',
-                      'Fecha Registro']
-        return pd.DataFrame(columns=empty_cols)
-    return pd.DataFrame(records)
-
-
 # =================================================================
 # LÓGICA DE LA PÁGINA
 # =================================================================
-
-st.title("💸 Gestión de Prospectos y Ventas SmartFarm")
-st.subheader("Registra, edita y analiza el progreso comercial por cliente.")
-
-client_names_map = get_client_names_map()
-# Cargar datos de ventas brutos
-raw_sales_records = load_sales_db()
-
-if not client_names_map:
-    st.warning(
-        "⚠️ No hay clientes cargados. Por favor, ve a la página 'Puntuación SmartFarm' para registrar clientes antes de cargar ventas.")
-else:
-    client_names = sorted(list(client_names_map.keys()))
-
-    # --- 1. CARGA DE NUEVOS DATOS DE VENTA ---
+# Cada sección es un fragment (ver metricas.fragment): un widget de la sección
+# vuelve a ejecutar solo esa sección. Paginar, buscar o editar la tabla no
+# recalcula los KPIs ni los gráficos; cambiar el filtro de cliente recarga la
+# tabla y los KPIs, pero no el formulario. Guardar, importar o aplicar cambios
+# recarga la página completa, así todas las secciones leen la nueva versión
+# de las ventas.
+
+@fragment('Gestión de Ventas', 'formulario')
+def new_sale_section(client_names_map, client_names):
+    """1. Carga de una venta nueva."""
     st.header("1. Carga de Nuevo Prospecto/Venta")
     with st.form("new_sale_form", clear_on_submit=True):
         col1, col2 = st.columns(2)
@@ -138,7 +191,7 @@ else:
 
         selected_type = col2.selectbox(
             "Tipo de Venta:",
-            options=["Componente", "Activación", "Servicio"],
+            options=SALE_TYPES,
             key="input_type"
         )
 
@@ -146,7 +199,7 @@ else:
 
         selected_status = col3.selectbox(
             "Estado de la Venta:",
-            options=["Posible", "Cerrado"],
+            options=SALE_STATUSES,
             key="input_status"
         )
 
@@ -181,176 +234,261 @@ else:
                     'Fecha Registro': datetime.now().strftime("%Y-%m-%d %H:%M")
                 }
 
-                # Cargar, añadir y guardar
-                raw_sales_records.append(new_record)
-                if save_sales_db(raw_sales_records):
-                    st.success(f"Venta de {selected_client_name} registrada exitosamente.")
+                # Un documento nuevo por venta: las demás no se reescriben
+                if save_sale_db(new_record['ID_Venta'], new_record):
+                    # La tabla y los KPIs están fuera de esta sección: se recarga la página completa
+                    st.toast(f"Venta de {selected_client_name} registrada exitosamente.")
+                    end_rerun()
+                    st.rerun()
                 else:
                     st.error("Error al guardar la venta.")
             else:
                 st.error("Por favor, complete el cliente y el monto.")
 
-    # --- 2. TABLA DE DATOS Y EDICIÓN ---
+
+@fragment('Gestión de Ventas', 'importacion')
+def import_sales_section():
+    """Importación masiva de ventas (CSV / Excel)."""
+    with st.expander("📥 Importar ventas desde CSV o Excel"):
+        st.caption(
+            "Una fila por venta con las columnas **ID_Cliente, Tipo de Venta, Estado de Venta, Monto** y, "
+            "opcionalmente, Detalle y Fecha Registro (AAAA-MM-DD HH:MM; vacía = ahora). El nombre del cliente "
+            f"se toma de su evaluación. Tipos: {', '.join(SALE_TYPES)}. Estados: {', '.join(SALE_STATUSES)}."
+        )
+        uploaded_sales = st.file_uploader("Archivo de ventas", type=["csv", "xlsx"], key="import_sales_file")
+        if uploaded_sales is not None and st.button("📥 Importar ventas"):
+            with st.spinner("Importando ventas..."):
+                st.session_state.import_sales_report = import_sales_db(uploaded_sales)
+            if st.session_state.import_sales_report is not None and st.session_state.import_sales_report.imported:
+                end_rerun()
+                st.rerun()  # Recargar la tabla y los KPIs con las ventas importadas (el informe queda en la sesión)
+
+        import_report = st.session_state.get('import_sales_report')
+        if import_report is not None:
+            st.success(f"Se importaron {import_report.imported} de {import_report.read} ventas.")
+            if import_report.rejected_count:
+                rejected_rows = import_report.rejected_frame()
+                st.warning(f"Se rechazaron {import_report.rejected_count} filas (ver 'Motivo').")
+                st.dataframe(rejected_rows, use_container_width=True, hide_index=True)
+                st.download_button(
+                    "⬇️ Descargar filas rechazadas (CSV)",
+                    rejected_rows.to_csv(index=False).encode('utf-8-sig'),
+                    file_name="ventas_rechazadas.csv",
+                    mime="text/csv"
+                )
+
+
+@fragment('Gestión de Ventas', 'ventas')
+def sales_section(client_names_map, client_names):
+    """2. Tabla de ventas y 3. KPIs, con el filtro de cliente que comparten."""
     st.header("2. Registros de Ventas y Edición")
 
-    df_sales = get_sales_dataframe(raw_sales_records)
+    # Basta con contar las filas de la instantánea columnar (incluida la venta recién cargada);
+    # la tabla y los KPIs leen solo lo que muestran
+    with span('carga_datos'):
+        no_sales = sales_db.table().num_rows == 0
 
-    if df_sales.empty:
+    if no_sales:
         st.info("No hay registros de ventas cargados aún.")
-    else:
-        # Columna para el filtro
-        filter_client_name = st.selectbox(
-            "Filtrar Registros por Cliente (opcional):",
-            options=["Todos"] + client_names,
-            key="filter_client"
-        )
+        return
+
+    # Solo la página actual llega al editor: búsqueda, orden y corte en DuckDB sobre client_sales
+    sales_table = PagedTable(
+        'sales_table', 'sales_data_editor', SALES_COLUMNS, id_column='ID_Venta', order_by='Fecha Registro',
+        descending=True
+    )
+
+    # Columna para el filtro
+    filter_client_name = st.selectbox(
+        "Filtrar Registros por Cliente (opcional):",
+        options=["Todos"] + client_names,
+        key="filter_client",
+        on_change=sales_table.reset
+    )
+
+    sales_filters = None
+    if filter_client_name != "Todos":
+        sales_filters = {'ID_Cliente': [client_names_map[filter_client_name]]}
+
+    sales_editor_section(sales_table, sales_filters)
+    export_sales_section(sales_filters)
+
+    selected_client_id = client_names_map[filter_client_name] if filter_client_name != "Todos" else None
+    sales_kpis_section(selected_client_id, filter_client_name)
+
+
+@fragment('Gestión de Ventas', 'editor')
+def sales_editor_section(sales_table, sales_filters):
+    """Página actual de la tabla de ventas, editable, con sus controles."""
+    sales_table.controls()
+    with span('paginacion'):
+        df_display, sales_rows = sales_table.load(get_session(), 'client_sales', sales_filters)
+
+    # Configuración de columnas para la edición
+    column_config = {
+        "ID_Venta": st.column_config.TextColumn("ID Venta", disabled=True),
+        "ID_Cliente": st.column_config.TextColumn("ID Cliente", disabled=True),
+        "Cliente": st.column_config.TextColumn("Cliente", disabled=True),
+        "Fecha Registro": st.column_config.DatetimeColumn("Fecha Registro", disabled=True,
+                                                          format="YYYY-MM-DD HH:mm"),
+        "Tipo de Venta": st.column_config.SelectboxColumn("Tipo de Venta",
+                                                          options=SALE_TYPES,
+                                                          required=True),
+        "Estado de Venta": st.column_config.SelectboxColumn("Estado de Venta", options=["Posible", "Cerrado"],
+                                                            required=True),
+        "Monto": st.column_config.NumberColumn("Monto", format="$%.2f", required=True),
+        "Detalle": st.column_config.TextColumn("Detalle", width="large")
+    }
 
-        df_display = df_sales.copy()
-
-        if filter_client_name != "Todos":
-            df_display = df_display[df_sales['Cliente'] == filter_client_name].reset_index(
-                drop=True)  # Importante resetear index para el editor
-
-        # Configuración de columnas para la edición
-        column_config = {
-            "ID_Venta": st.column_config.TextColumn("ID Venta", disabled=True),
-            "ID_Cliente": st.column_config.TextColumn("ID Cliente", disabled=True),
-            "Cliente": st.column_config.TextColumn("Cliente", disabled=True),
-            "Fecha Registro": st.column_config.DatetimeColumn("Fecha Registro", disabled=True,
-                                                              format="YYYY-MM-DD HH:mm"),
-            "Tipo de Venta": st.column_config.SelectboxColumn("Tipo de Venta",
-                                                              options=["Componente", "Activación", "Servicio"],
-                                                              required=True),
-            "Estado de Venta": st.column_config.SelectboxColumn("Estado de Venta", options=["Posible", "Cerrado"],
-                                                                required=True),
-            "Monto": st.column_config.NumberColumn("Monto", format="$%.2f", required=True),
-            "Detalle": st.column_config.TextColumn("Detalle", width="large")
-        }
-
-        edited_df_display = st.data_editor(
-            df_display,
-            key="sales_data_editor",
-            column_config=column_config,
-            hide_index=True,
-            use_container_width=True,
-            num_rows="dynamic"  # HABILITA EL BOTÓN DE ELIMINAR FILAS
+    edited_df_display = st.data_editor(
+        df_display,
+        key="sales_data_editor",
+        column_config=column_config,
+        hide_index=True,
+        use_container_width=True,
+        num_rows="dynamic"  # HABILITA EL BOTÓN DE ELIMINAR FILAS
+    )
+    sales_table.navigation(sales_rows)
+
+    # Botón para guardar las ediciones y eliminaciones
+    if st.button("📝 Guardar Cambios Editados y Eliminaciones"):
+        changes = st.session_state.sales_data_editor
+
+        edited_rows = changes.get("edited_rows", {})
+        deleted_indices = changes.get("deleted_rows", [])
+
+        # --- 1. PROCESAR ELIMINACIONES ---
+        deleted_ids = []
+        if deleted_indices:
+            # Obtener los IDs de venta de las filas marcadas para eliminación en el DF que se mostró
+            deleted_ids = df_display.iloc[deleted_indices]['ID_Venta'].tolist()
+
+        # --- 2. PROCESAR EDICIONES ---
+        # Obtener el ID de venta de cada fila editada en el DF que se mostró
+        edits_by_id = {df_display.iloc[idx]['ID_Venta']: edits for idx, edits in edited_rows.items()}
+
+        # --- 3. GUARDAR EL RESULTADO FINAL ---
+        # Solo se escriben los documentos de las ventas editadas o eliminadas
+        result = apply_sales_changes_db(edits_by_id, set(deleted_ids))
+        if result is not None:
+            updated_count, deleted_count = result
+            if deleted_indices:
+                st.info(f"🗑️ Se eliminaron {deleted_count} registros de ventas.")
+            if updated_count > 0:
+                st.success(f"✏️ Se actualizaron {updated_count} registros de ventas.")
+            if not deleted_indices and not edited_rows:
+                st.warning("No se detectaron cambios ni eliminaciones para guardar.")
+            end_rerun()
+            st.rerun()  # Recargar para ver los cambios reflejados
+        else:
+            st.error("Error al guardar los cambios.")
+
+
+@fragment('Gestión de Ventas', 'exportacion')
+def export_sales_section(sales_filters):
+    """Exportación (CSV / Parquet / JSON Lines) con el filtro de la tabla."""
+    # Con un cliente seleccionado solo se exportan sus ventas (filtro por ID_Cliente durante el scan)
+    with st.expander("⬇️ Exportar ventas"):
+        export_format = st.selectbox("Formato", options=list(EXPORT_FORMATS), key="export_sales_format")
+        export_request = (export_format, sales_filters)
+        if st.button("Preparar archivo", key="export_sales_prepare"):
+            with st.spinner("Exportando..."):
+                st.session_state.export_sales_file = (
+                    export_request, export_sales_db(export_format, sales_filters)
+                )
+
+        # Solo se ofrece el archivo preparado con el formato y los filtros actuales
+        prepared_request, export_file = st.session_state.get('export_sales_file', (None, None))
+        if export_file is not None and prepared_request != export_request:
+            # Otro formato o filtros: se descarta el archivo preparado (se borra del disco)
+            del st.session_state.export_sales_file
+        elif export_file is not None:
+            # El contenido se lee del archivo al dibujar el botón; la sesión guarda solo la referencia
+            with export_file.open() as data:
+                st.download_button(
+                    f"⬇️ Descargar {export_file.name} ({export_file.rows} filas)", data,
+                    file_name=export_file.name, mime=export_file.mime
+                )
+
+
+def sales_kpis_section(selected_client_id, filter_client_name):
+    """3. KPIs y gráficos de las ventas de todos o del cliente filtrado (sin la búsqueda de la tabla)."""
+    st.header("3. KPIs y Análisis Visual")
+
+    # Los resúmenes se calculan en DuckDB sobre la instantánea columnar de las ventas. Resúmenes y
+    # gráficos se guardan por versión de las ventas y cliente filtrado: sin cambios no se recalculan.
+    # La versión y los resúmenes salen de una misma instantánea (la sección puede correr sola)
+    figures = get_store().figures
+    with get_session().snapshot_scope(), span('kpis'):
+        sales_version = sales_db.version()
+        summary_status = figures.value(
+            'ventas_por_estado', sales_version, lambda: sales_summary_db('Estado de Venta', selected_client_id),
+            client=selected_client_id
+        )
+        summary_type = figures.value(
+            'ventas_por_tipo', sales_version, lambda: sales_summary_db('Tipo de Venta', selected_client_id),
+            client=selected_client_id
         )
 
-        # Botón para guardar las ediciones y eliminaciones
-        if st.button("📝 Guardar Cambios Editados y Eliminaciones"):
-            changes = st.session_state.sales_data_editor
+    if summary_status.empty:
+        st.info(f"No hay registros de ventas para el cliente '{filter_client_name}'.")
+        return
 
-            edited_rows = changes.get("edited_rows", {})
-            deleted_indices = changes.get("deleted_rows", [])
+    # 3.1 KPIs - Monto total por estado
+    st.subheader("Métricas Financieras")
 
-            # --- 1. PROCESAR ELIMINACIONES ---
-            deleted_ids = []
-            if deleted_indices:
-                # Obtener los IDs de venta de las filas marcadas para eliminación en el DF que se mostró
-                deleted_ids = df_display.iloc[deleted_indices]['ID_Venta'].tolist()
+    col_kpi1, col_kpi2, col_kpi3 = st.columns(3)
 
-            # Filtrar los registros brutos para excluir los eliminados
-            current_records_filtered = [
-                record for record in raw_sales_records
-                if record['ID_Venta'] not in deleted_ids
-            ]
+    monto_cerrado = summary_status[summary_status['Estado de Venta'] == 'Cerrado']['Monto'].sum()
+    monto_posible = summary_status[summary_status['Estado de Venta'] == 'Posible']['Monto'].sum()
+    total_oportunidad = monto_cerrado + monto_posible
 
-            # --- 2. PROCESAR EDICIONES ---
-            updated_count = 0
+    col_kpi1.metric("Monto Total Cerrado", f"${monto_cerrado:,.2f}")
+    col_kpi2.metric("Monto Total Posible", f"${monto_posible:,.2f}")
+    col_kpi3.metric("Oportunidad Total (Cerrado + Posible)", f"${total_oportunidad:,.2f}")
 
-            if edited_rows:
-                # Mapear los registros filtrados a su ID de venta para fácil acceso
-                records_map = {record['ID_Venta']: record for record in current_records_filtered}
+    st.markdown("---")
 
-                for idx, edits in edited_rows.items():
-                    # Obtener el ID de venta de la fila editada en el DF que se mostró
-                    sale_id_to_update = df_display.iloc[idx]['ID_Venta']
+    # 3.2 Gráficos
+    col_chart1, col_chart2 = st.columns(2)
 
-                    if sale_id_to_update in records_map:
-                        # Aplicar los cambios al registro en el mapa
-                        records_map[sale_id_to_update].update(edits)
-                        updated_count += 1
+    # Gráfico de Torta (Estado de Venta)
+    with col_chart1:
+        st.subheader("Distribución por Estado de Venta")
+        if not summary_status.empty:
+            with span('graficos'):
+                fig_pie = figures.figure(
+                    'ventas_por_estado', sales_version, lambda: status_pie_figure(summary_status),
+                    client=selected_client_id
+                )
+                st.plotly_chart(fig_pie, use_container_width=True)
 
-                # Convertir el mapa de nuevo a una lista para guardar
-                final_records_to_save = list(records_map.values())
-            else:
-                final_records_to_save = current_records_filtered
-
-            # --- 3. GUARDAR EL RESULTADO FINAL ---
-            if save_sales_db(final_records_to_save):
-                if deleted_indices:
-                    st.info(f"🗑️ Se eliminaron {len(deleted_ids)} registros de ventas.")
-                if updated_count > 0:
-                    st.success(f"✏️ Se actualizaron {updated_count} registros de ventas.")
-                if not deleted_indices and not edited_rows:
-                    st.warning("No se detectaron cambios ni eliminaciones para guardar.")
-                st.rerun()  # Recargar para ver los cambios reflejados
-            else:
-                st.error("Error al guardar los cambios.")
+    # Gráfico de Barras (Tipo de Venta)
+    with col_chart2:
+        st.subheader("Monto por Tipo de Venta")
+        if not summary_type.empty:
+            with span('graficos'):
+                fig_bar = figures.figure(
+                    'ventas_por_tipo', sales_version, lambda: type_bar_figure(summary_type),
+                    client=selected_client_id
+                )
+                st.plotly_chart(fig_bar, use_container_width=True)
 
-    # --- 3. ANÁLISIS Y KPIS ---
-    if not df_sales.empty:
-        st.header("3. KPIs y Análisis Visual")
 
-        # Filtrar datos si se seleccionó un cliente
-        df_analysis = df_sales.copy()
-        if filter_client_name != "Todos":
-            df_analysis = df_analysis[df_sales['Cliente'] == filter_client_name]
+st.title("💸 Gestión de Prospectos y Ventas SmartFarm")
+st.subheader("Registra, edita y analiza el progreso comercial por cliente.")
 
-        if df_analysis.empty:
-            st.info(f"No hay registros de ventas para el cliente '{filter_client_name}'.")
-        else:
+migrate_legacy_sales_db()
+client_names_map = get_client_names_map()
+
+if not client_names_map:
+    st.warning(
+        "⚠️ No hay clientes cargados. Por favor, ve a la página 'Puntuación SmartFarm' para registrar clientes antes de cargar ventas.")
+else:
+    client_names = sorted(list(client_names_map.keys()))
+
+    new_sale_section(client_names_map, client_names)
+    import_sales_section()
+    sales_section(client_names_map, client_names)
 
-            # 3.1 KPIs - Monto total por estado
-            st.subheader("Métricas Financieras")
-
-            summary_status = df_analysis.groupby('Estado de Venta')['Monto'].sum().reset_index()
-
-            col_kpi1, col_kpi2, col_kpi3 = st.columns(3)
-
-            monto_cerrado = summary_status[summary_status['Estado de Venta'] == 'Cerrado']['Monto'].sum()
-            monto_posible = summary_status[summary_status['Estado de Venta'] == 'Posible']['Monto'].sum()
-            total_oportunidad = monto_cerrado + monto_posible
-
-            col_kpi1.metric("Monto Total Cerrado", f"${monto_cerrado:,.2f}")
-            col_kpi2.metric("Monto Total Posible", f"${monto_posible:,.2f}")
-            col_kpi3.metric("Oportunidad Total (Cerrado + Posible)", f"${total_oportunidad:,.2f}")
-
-            st.markdown("---")
-
-            # 3.2 Gráficos
-            col_chart1, col_chart2 = st.columns(2)
-
-            # Gráfico de Torta (Estado de Venta)
-            with col_chart1:
-                st.subheader("Distribución por Estado de Venta")
-                if not summary_status.empty:
-                    fig_pie = px.pie(
-                        summary_status,
-                        values='Monto',
-                        names='Estado de Venta',
-                        title='Monto Total: Posible vs. Cerrado',
-                        color='Estado de Venta',
-                        color_discrete_map={'Cerrado': '#4CAF50', 'Posible': '#FFC107'}  # Verde y Amarillo
-                    )
-                    fig_pie.update_traces(textinfo='percent+value')
-                    st.plotly_chart(fig_pie, use_container_width=True)
-
-            # Gráfico de Barras (Tipo de Venta)
-            with col_chart2:
-                st.subheader("Monto por Tipo de Venta")
-                summary_type = df_analysis.groupby('Tipo de Venta')['Monto'].sum().reset_index()
-
-                if not summary_type.empty:
-                    fig_bar = px.bar(
-                        summary_type,
-                        x='Tipo de Venta',
-                        y='Monto',
-                        title='Monto Generado por Tipo de Venta',
-                        color='Tipo de Venta',
-                        text_auto=True,
-                        labels={'Monto': 'Monto ($)'}
-                    )
-                    fig_bar.update_layout(yaxis={'tickprefix': '$'})
-
-                    st.plotly_chart(fig_bar, use_container_width=True)
+end_rerun()
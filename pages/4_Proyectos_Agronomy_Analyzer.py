@@ -1,27 +1,28 @@
-import json
-import os
 import pandas as pd
 import streamlit as st
 import uuid
 import plotly.express as px
 
+from almacen import (
+    PROJECTS_COLLECTION_PATH, SCORES_COLLECTION_PATH, ConflictError, document_version, get_session, get_store
+)
+from exportacion import EXPORT_FORMATS, ExportFile
+from importacion import import_projects
+from metricas import end_rerun, fragment, span, start_rerun
+from paginacion import PagedTable
+
 st.set_page_config(
     page_title="SmartFarm - Conci",
     layout="wide",
     page_icon="sf1.png",
     initial_sidebar_state="collapsed"
 )
+start_rerun('Proyectos Agronomy Analyzer')
 
 # =================================================================
 # 1. CONFIGURACIÓN DEL ENTORNO Y DATOS MAESTROS
 # =================================================================
-# Variables de entorno para simulación de Firestore
-app_id = os.environ.get('__app_id', 'smartfarm_default_app_id')
-DATA_FILE = "firestore_simulation.json"
-
-# RUTAS DE COLECCIÓN (Las rutas deben ser únicas para cada tipo de dato)
-SCORES_COLLECTION_PATH = f'artifacts/{app_id}/public/data/client_scores'
-PROJECTS_COLLECTION_PATH = f'artifacts/{app_id}/public/data/agronomy_projects'
+# Las rutas de colección de la simulación de Firestore se definen en almacen.py
 
 PROTOCOLOS_AA = [
     "Pulverizadora PLA", "Sembradora PLA", "Sembradora JD",
@@ -31,6 +32,11 @@ PROTOCOLOS_AA = [
 
 ESTADOS_PROYECTO = ["No Iniciado", "En Proceso", "Completado"]
 
+# Columnas de seguimiento que la tabla y el tablero necesitan aunque un documento no las tenga
+REQUIRED_PROJECT_COLUMNS = ['id', 'Planificacion_Estado', 'Planificacion_Horas', 'Recopilacion_Estado',
+                            'Recopilacion_Horas', 'Informe_Estado', 'Informe_Horas', 'Total_Horas']
+STAGE_HOURS_COLUMNS = ['Planificacion_Horas', 'Recopilacion_Horas', 'Informe_Horas']
+
 # Colores primarios para Streamlit (Green theme)
 COLOR_COMPLETADO = "#4CAF50"  # Verde éxito
 COLOR_EN_PROCESO = "#FFC107"  # Amarillo advertencia
@@ -41,72 +47,78 @@ COLOR_NO_INICIADO = "#BDBDBD"  # Gris neutro
 # 2. FUNCIONES DE SIMULACIÓN DE FIRESTORE
 # =================================================================
 
-def load_firestore_data():
-    """Carga todos los datos de la simulación de Firestore desde el archivo JSON."""
-    if not os.path.exists(DATA_FILE):
-        return {}
-    try:
-        with open(DATA_FILE, 'r') as f:
-            return json.load(f)
-    except json.JSONDecodeError:
-        print(f"ERROR: Archivo {DATA_FILE} corrupto o vacío. Iniciando con datos vacíos.")
-        return {}
-    except Exception:
-        return {}
-
-
-def save_firestore_data(data):
-    """Guarda los datos en el archivo JSON, con manejo de errores."""
-    print(f"DEBUG: Intentando guardar datos en {DATA_FILE}. Total de colecciones: {len(data)}")
+# Todas las lecturas de un rerun (clientes, proyectos, último proyecto del cliente,
+# verificaciones) usan la misma instantánea, que se fija al comenzar el rerun
+# (get_session().pin()); guardar o eliminar la suelta para leer lo recién escrito.
+# Las secciones de la página son fragments (ver metricas.fragment): cuando una se
+# re-ejecuta sola, la página no está fijada y la sección lee la versión más reciente
+# (el tablero la fija mientras corre, ver SessionView.snapshot_scope).
+scores_db = get_session().collection(SCORES_COLLECTION_PATH)
+projects_db = get_session().collection(PROJECTS_COLLECTION_PATH)
+
+
+def save_project_document(doc_id, document, expected_version=None):
+    """Guarda un único documento de proyecto en el WAL, con manejo de errores.
+
+    expected_version es la versión que se cargó en el formulario (0 para un proyecto nuevo).
+    """
     try:
-        with open(DATA_FILE, 'w') as f:
-            json.dump(data, f, indent=4)
-        print("DEBUG: Guardado de datos exitoso.")
+        with span('guardado'):
+            projects_db.set(doc_id, document, expected_version=expected_version)
         return True
+    except ConflictError:
+        st.error(
+            "⚠️ Otro usuario modificó este proyecto mientras lo editabas. "
+            "Se recargaron sus datos actuales: revisa los cambios y vuelve a guardar."
+        )
+        return False
     except Exception as e:
         # Mensaje de error muy claro si el guardado falla
         st.error(
             f"❌ ERROR CRÍTICO DE PERSISTENCIA: Falló al guardar los cambios en el archivo de simulación. "
-            f"La eliminación NO es permanente. Causa: {e}"
+            f"Causa: {e}"
         )
         print(f"ERROR: Error crítico al guardar datos: {e}")
         return False
 
 
-def load_client_scores_data():
-    """Carga los datos de clientes (scores) para obtener la lista de clientes."""
-    firestore_data = load_firestore_data()
-    return list(firestore_data.get(SCORES_COLLECTION_PATH, {}).values())
+def import_projects_db(uploaded_file):
+    """Importa proyectos desde un CSV/Excel; el cliente se resuelve por ID_Cliente y todo va en un solo lote."""
+    try:
+        with span('importacion'):
+            return import_projects(get_session(), uploaded_file, uploaded_file.name, PROTOCOLOS_AA, ESTADOS_PROYECTO)
+    except Exception as e:
+        st.error(f"Error al importar el archivo: {e}")
+        return None
+
 
+def export_projects_db(fmt, filters=None):
+    """Exporta los proyectos (con los filtros del tablero) en un archivo temporal (exportacion.ExportFile) o None."""
+    try:
+        return ExportFile(get_session(), 'agronomy_projects', fmt, filters)
+    except Exception as e:
+        st.error(f"Error al exportar: {e}")
+        return None
 
-def load_agronomy_projects():
-    """Carga los proyectos de Agronomy Analyzer registrados."""
-    firestore_data = load_firestore_data()
-    # Retorna una lista de documentos de proyecto
-    return list(firestore_data.get(PROJECTS_COLLECTION_PATH, {}).values())
 
+def load_client_scores_data():
+    """Carga los datos de clientes (scores) para obtener la lista de clientes."""
+    return scores_db.stream()
 
-def get_latest_project_for_client(client_name):
-    """Busca el proyecto más reciente para un cliente dado."""
-    all_projects = load_agronomy_projects()
-    client_projects = [p for p in all_projects if p.get('Cliente') == client_name]
 
-    if not client_projects:
-        return None, None  # No project found
+def project_filter_options(table):
+    """(clientes, protocolos) de los proyectos, en orden de aparición, desde su tabla Arrow (projects_db.table())."""
+    return tuple(
+        table.column(column).unique().drop_null().to_pylist() if column in table.column_names else []
+        for column in ('Cliente', 'Protocolo')
+    )
 
-    # Ordenar por fecha de registro descendente para obtener el último
-    try:
-        df_projects = pd.DataFrame(client_projects)
-        df_projects['Fecha_Registro_dt'] = pd.to_datetime(df_projects['Fecha_Registro'], errors='coerce')
-        # Filtra Nulos antes de ordenar
-        df_projects = df_projects.dropna(subset=['Fecha_Registro_dt'])
-        latest_project = df_projects.sort_values(by='Fecha_Registro_dt', ascending=False).iloc[0].to_dict()
-    except Exception as e:
-        # Fallback a la clasificación de strings si hay un error o no hay datos
-        client_projects.sort(key=lambda x: x.get('Fecha_Registro', '2000-01-01'), reverse=True)
-        latest_project = client_projects[0]
 
-    return latest_project.get('id'), latest_project
+def get_latest_project_for_client(client_name):
+    """Busca el proyecto más reciente para un cliente dado (id, documento) o (None, None)."""
+    # El almacén mantiene el índice Cliente -> último proyecto (sin recorrer ni ordenar
+    # la colección); se lee sobre la instantánea fijada del rerun.
+    return get_store().latest_project(client_name, snapshot=get_session().pinned)
 
 
 def delete_project(project_ids_to_delete):
@@ -114,35 +126,36 @@ def delete_project(project_ids_to_delete):
     if not project_ids_to_delete:
         return
 
-    firestore_data = load_firestore_data()
-    projects = firestore_data.get(PROJECTS_COLLECTION_PATH, {})
-
+    # 1. Eliminar todos los documentos en un solo lote atómico (una única escritura a disco)
     deleted_count = 0
-    original_project_count = len(projects)
-
-    for doc_id in project_ids_to_delete:
-        if doc_id in projects:
-            del projects[doc_id]
-            deleted_count += 1
-
-    # Asignamos el diccionario modificado de vuelta a la estructura global
-    firestore_data[PROJECTS_COLLECTION_PATH] = projects
+    save_success = True
+    try:
+        batch = get_session().batch()
+        for doc_id in project_ids_to_delete:
+            batch.delete(PROJECTS_COLLECTION_PATH, doc_id)
+        with span('guardado'):
+            deleted_count = batch.commit()
+    except Exception as e:
+        st.error(
+            f"❌ ERROR CRÍTICO DE PERSISTENCIA: Falló al guardar los cambios en el archivo de simulación. "
+            f"La eliminación NO es permanente. Causa: {e}"
+        )
+        save_success = False
 
     if deleted_count > 0:
-        # 1. Guardar los cambios
-        save_success = save_firestore_data(firestore_data)
-
         if save_success:
-            # 2. VERIFICACIÓN CRÍTICA: Recargar los datos para confirmar la persistencia
-            reloaded_projects = load_agronomy_projects()
+            # 2. VERIFICACIÓN CRÍTICA: los proyectos eliminados ya no están en la versión más reciente.
+            # No se compara la cantidad de proyectos: otros usuarios pueden crear o eliminar otros mientras tanto
+            remaining = [doc_id for doc_id in project_ids_to_delete if projects_db.get(doc_id) is not None]
 
-            if len(reloaded_projects) == original_project_count - deleted_count:
+            if not remaining:
                 # Éxito en la persistencia
                 st.toast(f"✅ {deleted_count} proyecto(s) eliminado(s) y guardados. Recargando...")
 
                 # 3. Forzar la interfaz a reflejar los cambios
                 if 'select_cliente_widget' in st.session_state:
                     # No es necesario llamar a load_project_data_callback, ya que el st.rerun hará que todo se cargue de nuevo.
+                    end_rerun()
                     st.rerun()
             else:
                 # Fallo en la persistencia (el archivo no se actualizó correctamente)
@@ -162,6 +175,7 @@ def initialize_session_state(first_client):
     """Inicializa todas las claves de session_state con valores seguros."""
     if 'current_project_id' not in st.session_state:
         st.session_state.current_project_id = None
+        st.session_state.current_project_version = 0
         st.session_state.protocol_default = PROTOCOLOS_AA[0]
         st.session_state.nombre_default = ''
         st.session_state.ubicacion_default = ''
@@ -181,7 +195,7 @@ def initialize_session_state(first_client):
         st.session_state.selected_rows_indices = []  # Para la tabla de eliminación
 
 
-def load_project_data_callback():
+def load_project_data_callback(notify=st.toast):
     """Callback para cargar datos del último proyecto al cambiar el cliente y refrescar el estado."""
     client_name = st.session_state.get('select_cliente_widget')
 
@@ -195,6 +209,7 @@ def load_project_data_callback():
 
     if project_data:
         st.session_state.current_project_id = doc_id
+        st.session_state.current_project_version = document_version(project_data)
 
         # Info base
         st.session_state.protocol_default = project_data.get('Protocolo', PROTOCOLOS_AA[0])
@@ -209,10 +224,11 @@ def load_project_data_callback():
         st.session_state.informe_status_default = project_data.get('Informe_Estado', ESTADOS_PROYECTO[0])
         st.session_state.informe_hours_default = int(project_data.get('Informe_Horas', 0))
 
-        st.toast(f"Datos del último proyecto '{project_data.get('Nombre_Evaluacion')}' cargados para edición.")
+        notify(f"Datos del último proyecto '{project_data.get('Nombre_Evaluacion')}' cargados para edición.")
     else:
         # Set clean defaults if no project found
         st.session_state.current_project_id = None
+        st.session_state.current_project_version = 0
         st.session_state.protocol_default = PROTOCOLOS_AA[0]
         st.session_state.nombre_default = ''
         st.session_state.ubicacion_default = ''
@@ -223,7 +239,16 @@ def load_project_data_callback():
         st.session_state.informe_status_default = ESTADOS_PROYECTO[0]
         st.session_state.informe_hours_default = 0
 
-        st.toast(f"No hay proyectos registrados para {client_name}. Ingresa uno nuevo.")
+        notify(f"No hay proyectos registrados para {client_name}. Ingresa uno nuevo.")
+
+
+def on_client_change():
+    """Callback del selector de cliente: corre antes del rerun, con su propia instantánea."""
+    get_session().pin()
+    # El selector está en una sección (fragment): su callback no dibuja, el aviso se muestra con la sección
+    load_project_data_callback(notify=lambda message: st.session_state.update(project_notice=message))
+    # La sección se re-ejecuta sola, sin el unpin del final de la página
+    get_session().unpin()
 
 
 # =================================================================
@@ -237,14 +262,19 @@ st.markdown(
 )
 st.markdown("---")
 
-client_scores_data = load_client_scores_data()
+with span('carga_datos'):
+    get_session().pin()
+    client_scores_data = load_client_scores_data()
 
 if not client_scores_data:
     st.info("No hay clientes cargados. Por favor, registra clientes en la primera hoja.")
+    get_session().unpin()
+    end_rerun()
     st.stop()
 
 # Convertir los datos de clientes a DataFrame
-df_clients = pd.DataFrame(client_scores_data)
+with span('dataframe'):
+    df_clients = pd.DataFrame(client_scores_data)
 df_unique_clients = df_clients[['Cliente', 'Sucursal', 'Categoria_Evaluacion']].drop_duplicates(
     subset=['Cliente']).reset_index(drop=True)
 client_names = df_unique_clients['Cliente'].unique().tolist()
@@ -253,63 +283,19 @@ first_client = client_names[0] if client_names else None
 # Inicialización segura
 initialize_session_state(first_client)
 
-# Carga inicial de datos para el primer cliente al iniciar la página
+# Carga inicial de datos para el primer cliente al iniciar la página (en este mismo
+# rerun: los widgets del formulario se crean más abajo con los valores cargados)
 if not st.session_state.initial_load_done and client_names:
     st.session_state.select_cliente_widget = first_client
     load_project_data_callback()
     st.session_state.initial_load_done = True
-    st.rerun()  # Forzar rerun solo en la carga inicial
-
-# --- SELECCIÓN DE CLIENTE (FUERA DEL FORMULARIO) ---
-with st.container(border=True):
-    st.subheader("Selección y Carga de Proyecto")
-
-    current_client_key = st.session_state.get('select_cliente_widget', first_client)
-
-    safe_index = client_names.index(current_client_key) if current_client_key in client_names else 0
-
-    # Este selectbox debe usar el valor que está en session_state para mantener la selección
-    selected_client_name = st.selectbox(
-        "1. Selecciona el Cliente SmartFarm:",
-        options=client_names,
-        index=safe_index,
-        key="select_cliente_widget",
-        on_change=load_project_data_callback
-    )
-
-    # Obtener los datos del cliente seleccionado para incluirlos en el registro del proyecto
-    client_info = {}
-    if selected_client_name:
-        client_info = df_unique_clients[df_unique_clients['Cliente'] == selected_client_name].iloc[0].to_dict()
-        st.markdown(f"""
-        <div style="
-            padding: 10px; 
-            border: 0px dashed; 
-            border-radius: 5px; 
-            margin-top: 15px; 
-            ">
-            Sucursal: {client_info['Sucursal']}<br>
-            Categoría: {client_info['Categoria_Evaluacion']}
-        </div>
-        """, unsafe_allow_html=True)
 
 # =================================================================
 # 5. FORMULARIO DE REGISTRO DE PROYECTO (USANDO DEFAULTS DE SESSION STATE)
 # =================================================================
-key_suffix = st.session_state.form_key_suffix
-
-st.markdown("---")
-
-# Diccionarios para guardar las claves de los widgets para lectura posterior
-stage_widget_keys = {}
-
-# Definición de claves de widgets base
-base_widget_keys = {
-    'protocol': f"select_protocolo_form_{key_suffix}",
-    'nombre': f"nombre_evaluacion_{key_suffix}",
-    'ubicacion': f"ubicacion_evaluacion_{key_suffix}"
-}
-
+# La selección del cliente y el formulario forman una sola sección (fragment):
+# cambiar de cliente carga su último proyecto y vuelve a dibujar solo el
+# formulario, sin la tabla ni el tablero. Guardar recarga la página completa.
 
 # --- FUNCIÓN DE ENTRADA CON ESTILOS DE COLOR ---
 def create_stage_inputs(stage_name, default_status, default_hours, suffix):
@@ -381,176 +367,255 @@ def create_stage_inputs(stage_name, default_status, default_hours, suffix):
 
 # --- FIN FUNCIÓN DE ENTRADA CON ESTILOS DE COLOR ---
 
-with st.container(border=True):
-    if st.session_state.current_project_id:
-        st.subheader(f"📝 Actualizar Último Proyecto")
-    else:
-        st.subheader("➕ Registrar Nuevo Protocolo")
-
-    with st.form("agronomy_project_form"):
-
-        # --- Info Base (Usando las claves definidas arriba) ---
-        col_sel_protocolo, _ = st.columns([1, 1])
-        with col_sel_protocolo:
-            protocol_index = PROTOCOLOS_AA.index(
-                st.session_state.protocol_default) if st.session_state.protocol_default in PROTOCOLOS_AA else 0
-            st.selectbox(
-                "2. Selecciona el Protocolo (Agronomy Analyzer):",
-                options=PROTOCOLOS_AA,
-                index=protocol_index,
-                key=base_widget_keys['protocol']
-            )
 
-        col_nombre, col_ubicacion = st.columns(2)
-
-        with col_nombre:
-            st.text_input(
-                "3. Nombre de la Evaluación/Proyecto",
-                value=st.session_state.nombre_default,
-                placeholder="Ej: 'SF - AutoPath' o Nombre Predeterminado del Proyecto",
-                key=base_widget_keys['nombre']
-            )
+@fragment('Proyectos Agronomy Analyzer', 'proyecto')
+def project_section(df_unique_clients, client_names, first_client):
+    """Selección del cliente y formulario de registro/actualización de su proyecto."""
+    if 'project_notice' in st.session_state:
+        st.toast(st.session_state.pop('project_notice'))
 
-        with col_ubicacion:
-            st.text_input(
-                "4. Ubicación de la Evaluación (Lote/Campo)",
-                value=st.session_state.ubicacion_default,
-                placeholder="Ej: SF - Juan Ciervo - Granja Illinois - Lote Prueba",
-                key=base_widget_keys['ubicacion']
-            )
+    # --- SELECCIÓN DE CLIENTE (FUERA DEL FORMULARIO) ---
+    with st.container(border=True):
+        st.subheader("Selección y Carga de Proyecto")
 
-        st.markdown("---")
+        current_client_key = st.session_state.get('select_cliente_widget', first_client)
 
-        # --- Seguimiento de Etapas (Llamando a la función mejorada) ---
-        st.subheader("5. Seguimiento de Etapas y Tiempos")
+        safe_index = client_names.index(current_client_key) if current_client_key in client_names else 0
 
-        stage_widget_keys['plan_status'], stage_widget_keys['plan_hours'] = create_stage_inputs(
-            "Planificación",
-            st.session_state.plan_status_default,
-            st.session_state.plan_hours_default,
-            key_suffix
+        # Este selectbox debe usar el valor que está en session_state para mantener la selección
+        selected_client_name = st.selectbox(
+            "1. Selecciona el Cliente SmartFarm:",
+            options=client_names,
+            index=safe_index,
+            key="select_cliente_widget",
+            on_change=on_client_change
         )
-        st.markdown("---")
 
-        stage_widget_keys['reco_status'], stage_widget_keys['reco_hours'] = create_stage_inputs(
-            "Recopilación de Datos",
-            st.session_state.reco_status_default,
-            st.session_state.reco_hours_default,
-            key_suffix
-        )
-        st.markdown("---")
+        # Obtener los datos del cliente seleccionado para incluirlos en el registro del proyecto
+        client_info = {}
+        if selected_client_name:
+            client_info = df_unique_clients[df_unique_clients['Cliente'] == selected_client_name].iloc[0].to_dict()
+            st.markdown(f"""
+            <div style="
+                padding: 10px; 
+                border: 0px dashed; 
+                border-radius: 5px; 
+                margin-top: 15px; 
+                ">
+                Sucursal: {client_info['Sucursal']}<br>
+                Categoría: {client_info['Categoria_Evaluacion']}
+            </div>
+            """, unsafe_allow_html=True)
 
-        stage_widget_keys['informe_status'], stage_widget_keys['informe_hours'] = create_stage_inputs(
-            "Generación de Informe",
-            st.session_state.informe_status_default,
-            st.session_state.informe_hours_default,
-            key_suffix
-        )
-        st.markdown("---")
-
-        submit_label = "Actualizar Proyecto" if st.session_state.current_project_id else "Guardar Nuevo Proyecto"
-        submitted = st.form_submit_button(submit_label, type="primary")
-
-        if submitted:
-            # LECTURA CRÍTICA DE TODOS LOS VALORES DEL FORMULARIO A TRAVÉS DE SESSION STATE
-            selected_protocol = st.session_state[base_widget_keys['protocol']]
-            evaluation_name = st.session_state[base_widget_keys['nombre']]
-            evaluation_location = st.session_state[base_widget_keys['ubicacion']]
-
-            plan_status = st.session_state[stage_widget_keys['plan_status']]
-            plan_hours = st.session_state[stage_widget_keys['plan_hours']]
-            reco_status = st.session_state[stage_widget_keys['reco_status']]
-            reco_hours = st.session_state[stage_widget_keys['reco_hours']]
-            informe_status = st.session_state[stage_widget_keys['informe_status']]
-            informe_hours = st.session_state[stage_widget_keys['informe_hours']]
-
-            # 1. Validación
-            if not selected_client_name or not evaluation_name.strip() or not evaluation_location.strip():
-                st.error("Por favor, completa los campos obligatorios (Cliente, Nombre y Ubicación).")
-            else:
-                # 2. Decidir si es UPDATE o CREATE
-                doc_id = st.session_state.current_project_id if st.session_state.current_project_id else str(
-                    uuid.uuid4())
-                action_type = "Actualizado" if st.session_state.current_project_id else "Guardado"
-
-                # Sumar las horas totales
-                total_hours = plan_hours + reco_hours + informe_hours
-
-                new_project_document = {
-                    "id": doc_id,
-                    "Cliente": selected_client_name,
-                    "Sucursal": client_info.get('Sucursal', 'N/A'),
-                    "Perfil_Tecnologico": client_info.get('Categoria_Evaluacion', 'N/A'),
-                    "Protocolo": selected_protocol,
-                    "Nombre_Evaluacion": evaluation_name.strip(),
-                    "Ubicacion_Evaluacion": evaluation_location.strip(),
-
-                    # Campos de Seguimiento
-                    "Planificacion_Estado": plan_status,
-                    "Planificacion_Horas": plan_hours,
-                    "Recopilacion_Estado": reco_status,
-                    "Recopilacion_Horas": reco_hours,
-                    "Informe_Estado": informe_status,
-                    "Informe_Horas": informe_hours,
-                    "Total_Horas": total_hours,
-
-                    "Fecha_Registro": pd.to_datetime('now').strftime('%Y-%m-%d %H:%M:%S')
-                }
-
-                # 3. Cargar datos existentes y guardar/actualizar el proyecto
-                firestore_data = load_firestore_data()
-                if PROJECTS_COLLECTION_PATH not in firestore_data:
-                    firestore_data[PROJECTS_COLLECTION_PATH] = {}
-
-                # Sobreescribir el documento completo usando doc_id como clave.
-                firestore_data[PROJECTS_COLLECTION_PATH][doc_id] = new_project_document
-
-                # 4. Guardar en la simulación de Firestore
-                save_success = save_firestore_data(firestore_data)
-
-                if save_success:
-                    st.success(
-                        f"¡Proyecto '{evaluation_name.strip()}' para {selected_client_name} {action_type} con éxito! ID: {doc_id[:8]}...")
-
-                    # Si fue un GUARDADO (nuevo), actualizamos el ID de sesión
-                    if action_type == "Guardado":
-                        st.session_state.current_project_id = doc_id
-
-                    # RECARGA: Forzar la recarga de datos al session_state y rotar la clave del formulario
-                    load_project_data_callback()
-                    st.rerun()
 
-# =================================================================
-# 6. TABLA PERMANENTE DE PROYECTOS REGISTRADOS
-# =================================================================
+    # --- FORMULARIO (USANDO DEFAULTS DE SESSION STATE) ---
+    key_suffix = st.session_state.form_key_suffix
 
-st.markdown("---")
-st.header("Historial de Proyectos Registrados")
+    st.markdown("---")
 
-projects_data = load_agronomy_projects()
+    # Diccionarios para guardar las claves de los widgets para lectura posterior
+    stage_widget_keys = {}
 
-if not projects_data:
-    st.info("Aún no hay proyectos de Agronomy Analyzer registrados.")
-else:
-    df_projects = pd.DataFrame(projects_data)
+    # Definición de claves de widgets base
+    base_widget_keys = {
+        'protocol': f"select_protocolo_form_{key_suffix}",
+        'nombre': f"nombre_evaluacion_{key_suffix}",
+        'ubicacion': f"ubicacion_evaluacion_{key_suffix}"
+    }
 
-    # Asegurar la existencia de las columnas y recalcular Total_Horas
-    required_cols = ['id', 'Planificacion_Estado', 'Planificacion_Horas', 'Recopilacion_Estado', 'Recopilacion_Horas',
-                     'Informe_Estado', 'Informe_Horas', 'Total_Horas']
-    for col in required_cols:
-        if col not in df_projects.columns:
-            df_projects[col] = 0 if 'Horas' in col else 'No Iniciado'
 
-    df_projects['Total_Horas'] = df_projects['Planificacion_Horas'] + df_projects['Recopilacion_Horas'] + df_projects[
-        'Informe_Horas']
 
-    # Conversión a datetime para ordenar correctamente
-    df_projects['Fecha_Registro_dt'] = pd.to_datetime(df_projects['Fecha_Registro'], errors='coerce')
-    df_projects.sort_values(by='Fecha_Registro_dt', ascending=False, inplace=True)
-    df_projects.drop(columns=['Fecha_Registro_dt'], inplace=True, errors='ignore')
+    with st.container(border=True):
+        if st.session_state.current_project_id:
+            st.subheader(f"📝 Actualizar Último Proyecto")
+        else:
+            st.subheader("➕ Registrar Nuevo Protocolo")
 
-    # Añadir columna de selección (FALSE por defecto)
-    df_projects['Seleccionar'] = False
+        with st.form("agronomy_project_form"):
+
+            # --- Info Base (Usando las claves definidas arriba) ---
+            col_sel_protocolo, _ = st.columns([1, 1])
+            with col_sel_protocolo:
+                protocol_index = PROTOCOLOS_AA.index(
+                    st.session_state.protocol_default) if st.session_state.protocol_default in PROTOCOLOS_AA else 0
+                st.selectbox(
+                    "2. Selecciona el Protocolo (Agronomy Analyzer):",
+                    options=PROTOCOLOS_AA,
+                    index=protocol_index,
+                    key=base_widget_keys['protocol']
+                )
+
+            col_nombre, col_ubicacion = st.columns(2)
+
+            with col_nombre:
+                st.text_input(
+                    "3. Nombre de la Evaluación/Proyecto",
+                    value=st.session_state.nombre_default,
+                    placeholder="Ej: 'SF - AutoPath' o Nombre Predeterminado del Proyecto",
+                    key=base_widget_keys['nombre']
+                )
+
+            with col_ubicacion:
+                st.text_input(
+                    "4. Ubicación de la Evaluación (Lote/Campo)",
+                    value=st.session_state.ubicacion_default,
+                    placeholder="Ej: SF - Juan Ciervo - Granja Illinois - Lote Prueba",
+                    key=base_widget_keys['ubicacion']
+                )
+
+            st.markdown("---")
+
+            # --- Seguimiento de Etapas (Llamando a la función mejorada) ---
+            st.subheader("5. Seguimiento de Etapas y Tiempos")
+
+            stage_widget_keys['plan_status'], stage_widget_keys['plan_hours'] = create_stage_inputs(
+                "Planificación",
+                st.session_state.plan_status_default,
+                st.session_state.plan_hours_default,
+                key_suffix
+            )
+            st.markdown("---")
+
+            stage_widget_keys['reco_status'], stage_widget_keys['reco_hours'] = create_stage_inputs(
+                "Recopilación de Datos",
+                st.session_state.reco_status_default,
+                st.session_state.reco_hours_default,
+                key_suffix
+            )
+            st.markdown("---")
+
+            stage_widget_keys['informe_status'], stage_widget_keys['informe_hours'] = create_stage_inputs(
+                "Generación de Informe",
+                st.session_state.informe_status_default,
+                st.session_state.informe_hours_default,
+                key_suffix
+            )
+            st.markdown("---")
+
+            submit_label = "Actualizar Proyecto" if st.session_state.current_project_id else "Guardar Nuevo Proyecto"
+            submitted = st.form_submit_button(submit_label, type="primary")
+
+            if submitted:
+                # LECTURA CRÍTICA DE TODOS LOS VALORES DEL FORMULARIO A TRAVÉS DE SESSION STATE
+                selected_protocol = st.session_state[base_widget_keys['protocol']]
+                evaluation_name = st.session_state[base_widget_keys['nombre']]
+                evaluation_location = st.session_state[base_widget_keys['ubicacion']]
+
+                plan_status = st.session_state[stage_widget_keys['plan_status']]
+                plan_hours = st.session_state[stage_widget_keys['plan_hours']]
+                reco_status = st.session_state[stage_widget_keys['reco_status']]
+                reco_hours = st.session_state[stage_widget_keys['reco_hours']]
+                informe_status = st.session_state[stage_widget_keys['informe_status']]
+                informe_hours = st.session_state[stage_widget_keys['informe_hours']]
+
+                # 1. Validación
+                if not selected_client_name or not evaluation_name.strip() or not evaluation_location.strip():
+                    st.error("Por favor, completa los campos obligatorios (Cliente, Nombre y Ubicación).")
+                else:
+                    # 2. Decidir si es UPDATE o CREATE
+                    doc_id = st.session_state.current_project_id if st.session_state.current_project_id else str(
+                        uuid.uuid4())
+                    action_type = "Actualizado" if st.session_state.current_project_id else "Guardado"
+
+                    # Sumar las horas totales
+                    total_hours = plan_hours + reco_hours + informe_hours
+
+                    new_project_document = {
+                        "id": doc_id,
+                        "Cliente": selected_client_name,
+                        "Sucursal": client_info.get('Sucursal', 'N/A'),
+                        "Perfil_Tecnologico": client_info.get('Categoria_Evaluacion', 'N/A'),
+                        "Protocolo": selected_protocol,
+                        "Nombre_Evaluacion": evaluation_name.strip(),
+                        "Ubicacion_Evaluacion": evaluation_location.strip(),
+
+                        # Campos de Seguimiento
+                        "Planificacion_Estado": plan_status,
+                        "Planificacion_Horas": plan_hours,
+                        "Recopilacion_Estado": reco_status,
+                        "Recopilacion_Horas": reco_hours,
+                        "Informe_Estado": informe_status,
+                        "Informe_Horas": informe_hours,
+                        "Total_Horas": total_hours,
+
+                        "Fecha_Registro": pd.to_datetime('now').strftime('%Y-%m-%d %H:%M:%S')
+                    }
+
+                    # 3. Sobreescribir el documento completo usando doc_id como clave
+                    # y 4. guardarlo en la simulación de Firestore.
+                    expected_version = st.session_state.current_project_version if st.session_state.current_project_id else 0
+                    save_success = save_project_document(doc_id, new_project_document, expected_version)
+
+                    if save_success:
+                        st.success(
+                            f"¡Proyecto '{evaluation_name.strip()}' para {selected_client_name} {action_type} con éxito! ID: {doc_id[:8]}...")
+
+                        # Si fue un GUARDADO (nuevo), actualizamos el ID de sesión
+                        if action_type == "Guardado":
+                            st.session_state.current_project_id = doc_id
+
+                        # RECARGA: Forzar la recarga de datos al session_state y rotar la clave del formulario
+                        load_project_data_callback()
+                        end_rerun()
+                        st.rerun()
+                    elif projects_db.get(doc_id) is not None:
+                        # Conflicto de versión: se recargan los datos guardados por el otro usuario
+                        load_project_data_callback()
+
+
+project_section(df_unique_clients, client_names, first_client)
+
+
+# --- IMPORTACIÓN MASIVA DE PROYECTOS (CSV / EXCEL) ---
+@fragment('Proyectos Agronomy Analyzer', 'importacion')
+def import_projects_section():
+    """Importación masiva de proyectos (CSV / Excel)."""
+    with st.expander("📥 Importar proyectos desde CSV o Excel"):
+        st.caption(
+            "Una fila por proyecto con las columnas **ID_Cliente, Protocolo, Nombre_Evaluacion, Ubicacion_Evaluacion** "
+            "y, opcionalmente, Planificacion_Estado/Horas, Recopilacion_Estado/Horas, Informe_Estado/Horas y "
+            "Fecha_Registro. Sucursal y perfil se toman de la evaluación del cliente. "
+            f"Estados: {', '.join(ESTADOS_PROYECTO)}."
+        )
+        uploaded_projects = st.file_uploader("Archivo de proyectos", type=["csv", "xlsx"], key="import_projects_file")
+        if uploaded_projects is not None and st.button("📥 Importar proyectos"):
+            with st.spinner("Importando proyectos..."):
+                st.session_state.import_projects_report = import_projects_db(uploaded_projects)
+            if st.session_state.import_projects_report is not None and st.session_state.import_projects_report.imported:
+                end_rerun()
+                st.rerun()  # Recargar la tabla y el tablero con los proyectos importados (el informe queda en la sesión)
+
+        import_report = st.session_state.get('import_projects_report')
+        if import_report is not None:
+            st.success(f"Se importaron {import_report.imported} de {import_report.read} proyectos.")
+            if import_report.rejected_count:
+                rejected_rows = import_report.rejected_frame()
+                st.warning(f"Se rechazaron {import_report.rejected_count} filas (ver 'Motivo').")
+                st.dataframe(rejected_rows, use_container_width=True, hide_index=True)
+                st.download_button(
+                    "⬇️ Descargar filas rechazadas (CSV)",
+                    rejected_rows.to_csv(index=False).encode('utf-8-sig'),
+                    file_name="proyectos_rechazados.csv",
+                    mime="text/csv"
+                )
+
+
+import_projects_section()
+
+# =================================================================
+# 6. TABLA PERMANENTE DE PROYECTOS REGISTRADOS
+# =================================================================
+# Marcar casillas, paginar o buscar re-ejecuta solo esta sección.
+
+@fragment('Proyectos Agronomy Analyzer', 'historial')
+def project_history_section():
+    """Tabla paginada de los proyectos, con la selección para eliminarlos."""
+    st.markdown("---")
+    st.header("Historial de Proyectos Registrados")
+
+    if projects_db.table().num_rows == 0:
+        st.info("Aún no hay proyectos de Agronomy Analyzer registrados.")
+        return
 
     # Definición de las columnas que queremos mostrar y sus nuevos nombres
     column_mapping = {
@@ -572,10 +637,30 @@ else:
         'Total_Horas': 'Total Horas'
     }
 
-    # Seleccionar y renombrar las columnas
-    df_projects_display = df_projects.rename(columns=column_mapping)
-    df_projects_display = df_projects_display[
-        [col for col in column_mapping.values() if col in df_projects_display.columns]]
+    DATAFRAME_KEY = "data_editor_delete_v4"
+
+    # Solo la página actual llega al editor: búsqueda, orden (por defecto, los más recientes primero;
+    # Fecha_Registro es 'AAAA-MM-DD HH:MM:SS') y corte en DuckDB sobre agronomy_projects
+    project_table = PagedTable(
+        'project_table', DATAFRAME_KEY, [col for col in column_mapping if col != 'Seleccionar'],
+        id_column='id', order_by='Fecha_Registro', descending=True
+    )
+    project_table.controls(labels=column_mapping)
+    with span('paginacion'):
+        df_projects_page, project_rows = project_table.load(get_session(), 'agronomy_projects')
+    for col in REQUIRED_PROJECT_COLUMNS[1:]:  # Estados y horas de las etapas
+        if 'Horas' in col:
+            df_projects_page[col] = df_projects_page[col].fillna(0).astype('int64')
+        else:
+            df_projects_page[col] = df_projects_page[col].fillna('No Iniciado')
+    df_projects_page['Total_Horas'] = (df_projects_page['Planificacion_Horas'] + df_projects_page['Recopilacion_Horas']
+                                       + df_projects_page['Informe_Horas'])
+
+    # Añadir columna de selección (FALSE por defecto)
+    df_projects_page.insert(0, 'Seleccionar', False)
+
+    # Renombrar las columnas (el ID de documento queda en la página, oculto, para mapear la selección)
+    df_projects_display = df_projects_page.rename(columns=column_mapping)
 
     # Columnas visibles en la tabla (incluyendo la nueva columna Seleccionar)
     display_cols_full = [
@@ -593,8 +678,6 @@ else:
         'Total Horas'
     ]
 
-    DATAFRAME_KEY = "data_editor_delete_v4"
-
     st.markdown("### 🗑️ Eliminar Proyectos")
     st.info(
         "💡 **Instrucción:** Marca la casilla de la columna **'Seleccionar'** (a la izquierda) para marcar los proyectos que deseas eliminar.")
@@ -619,8 +702,7 @@ else:
 
     # --- st.data_editor con Checkbox definido por el usuario ---
     edited_df = st.data_editor(
-        df_projects_display.drop(columns=['ID de Documento', 'Sucursal', 'Perfil Tecnológico', 'Ubicación'],
-                                 errors='ignore'),
+        df_projects_display.drop(columns=['Sucursal', 'Perfil Tecnológico', 'Ubicación'], errors='ignore'),
         column_order=display_cols_full,
         column_config=column_config,
         use_container_width=True,
@@ -628,23 +710,17 @@ else:
         key=DATAFRAME_KEY,
         num_rows="fixed",  # Evita que el usuario agregue filas
     )
+    project_table.navigation(project_rows)
 
     # ACCESO CRÍTICO: La selección se obtiene directamente del DataFrame editado
-    # Filtramos las filas donde la columna 'Seleccionar' es True
-    selected_projects_df = edited_df[edited_df['Seleccionar'] == True]
-
-    # Obtenemos los índices posicionales de las filas seleccionadas en el DataFrame actual
-    selected_indices_in_editor = selected_projects_df.index.tolist()
+    # Filtramos las filas donde la columna 'Seleccionar' es True y tomamos su ID de documento
+    # (columna oculta de la misma página que recibió el editor)
+    ids_to_delete = edited_df.loc[edited_df['Seleccionar'] == True, 'ID de Documento'].tolist()
 
     # -----------------------------------------------------
     # LÓGICA DE ELIMINACIÓN CON BOTÓN DE CONFIRMACIÓN
     # -----------------------------------------------------
-    if selected_indices_in_editor:
-        # Mapeamos los índices posicionales del DataFrame filtrado (df_projects)
-        # a los IDs de los documentos originales
-        original_indices = df_projects.iloc[selected_indices_in_editor].index.tolist()
-        ids_to_delete = df_projects.loc[original_indices, 'id'].tolist()
-
+    if ids_to_delete:
         # Botón de Confirmación de Eliminación (Solo visible si hay selección)
         if st.button(f"🗑️ Confirmar Eliminación de {len(ids_to_delete)} Proyecto(s)", type="secondary"):
             delete_project(ids_to_delete)
@@ -653,21 +729,154 @@ else:
 
     st.markdown("---")
 
+
+project_history_section()
+
 # =================================================================
 # 7. DASHBOARDS Y ANÁLISIS DE DATOS (MEJORA ESTÉTICA: TARJETAS Y EXPANDER)
 # =================================================================
+# Cambiar los filtros re-ejecuta solo el tablero (KPIs, gráficos y exportación).
+
+@fragment('Proyectos Agronomy Analyzer', 'exportacion')
+def export_projects_section(project_filters):
+    """Exportación (CSV / Parquet / JSON Lines) con los filtros del tablero."""
+    with st.expander("⬇️ Exportar proyectos filtrados"):
+        export_format = st.selectbox("Formato", options=list(EXPORT_FORMATS), key="export_projects_format")
+        export_request = (export_format, project_filters)
+        if st.button("Preparar archivo", key="export_projects_prepare"):
+            with st.spinner("Exportando..."):
+                st.session_state.export_projects_file = (
+                    export_request, export_projects_db(export_format, project_filters)
+                )
+
+        # Solo se ofrece el archivo preparado con el formato y los filtros actuales
+        prepared_request, export_file = st.session_state.get('export_projects_file', (None, None))
+        if export_file is not None and prepared_request != export_request:
+            # Otro formato o filtros: se descarta el archivo preparado (se borra del disco)
+            del st.session_state.export_projects_file
+        elif export_file is not None:
+            # El contenido se lee del archivo al dibujar el botón; la sesión guarda solo la referencia
+            with export_file.open() as data:
+                st.download_button(
+                    f"⬇️ Descargar {export_file.name} ({export_file.rows} filas)", data,
+                    file_name=export_file.name, mime=export_file.mime
+                )
+
+
+def project_kpis_block(columns, project_filters):
+    """(KPIs de los proyectos filtrados, PIVOT de estado del informe por protocolo), en una consulta de DuckDB.
+
+    columns: columnas de la vista agronomy_projects. Los filtros del tablero van como predicados
+    IN parametrizados: solo los grupos Protocolo × Informe_Estado salen de DuckDB.
+    """
+    conditions, params = [], []
+    for column, values in project_filters.items():
+        if column not in columns:
+            conditions.append('FALSE')
+        else:
+            conditions.append(f'"{column}" IN ({", ".join("?" * len(values))})')
+            params.extend(values)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    # Una columna de seguimiento que ningún documento tiene vale lo mismo que en la tabla de proyectos
+    hours = [f'COALESCE(SUM("{column}"), 0)' if column in columns else '0' for column in STAGE_HOURS_COLUMNS]
+    protocol = '"Protocolo"' if 'Protocolo' in columns else 'NULL'
+    status = '"Informe_Estado"' if 'Informe_Estado' in columns else "'No Iniciado'"
+    groups = get_session().query(
+        f"""
+        SELECT {protocol} AS "Protocolo", {status} AS "Informe_Estado", COUNT(*) AS proyectos,
+               {hours[0]} AS planificacion, {hours[1]} AS recopilacion, {hours[2]} AS informe
+        FROM agronomy_projects {where}
+        GROUP BY 1, 2
+        """,
+        params
+    )
+
+    project_kpis = {
+        'proyectos': int(groups['proyectos'].sum()),
+        'completados': int(groups.loc[groups['Informe_Estado'] == 'Completado', 'proyectos'].sum()),
+        'planificacion': groups['planificacion'].sum(),
+        'recopilacion': groups['recopilacion'].sum(),
+        'informe': groups['informe'].sum(),
+    }
+    project_kpis['total_horas'] = project_kpis['planificacion'] + project_kpis['recopilacion'] + project_kpis['informe']
+    protocol_status = (
+        groups.dropna(subset=['Protocolo', 'Informe_Estado'])
+        .pivot_table(index='Protocolo', columns='Informe_Estado', values='proyectos', aggfunc='sum', fill_value=0)
+        .reset_index()
+        .rename_axis(columns=None)
+    )
+    return project_kpis, protocol_status
+
+
+def stage_hours_figure(project_kpis):
+    """Dona de horas por etapa del proyecto."""
+    stage_hours = {
+        'Planificación': project_kpis['planificacion'],
+        'Recopilación de Datos': project_kpis['recopilacion'],
+        'Generación de Informe': project_kpis['informe']
+    }
+
+    df_stage_hours = pd.DataFrame(
+        list(stage_hours.items()),
+        columns=['Etapa', 'Horas']
+    )
+
+    # Colores que coinciden con los estados (verde para informe, amarillo para recopilación, gris para planificación)
+    color_map_pie = {
+        'Generación de Informe': COLOR_COMPLETADO,
+        'Recopilación de Datos': COLOR_EN_PROCESO,
+        'Planificación': COLOR_NO_INICIADO
+    }
 
-st.header("📊 Resumen de Proyectos y Análisis")
+    fig = px.pie(
+        df_stage_hours,
+        values='Horas',
+        names='Etapa',
+        title='Desglose de Horas por Etapa del Proyecto',
+        hole=.4,  # Efecto dona más marcado
+        color='Etapa',
+        color_discrete_map=color_map_pie
+    )
 
-if projects_data:  # Solo mostrar el dashboard si hay datos
+    fig.update_traces(textposition='outside', textinfo='percent+label')
+    fig.update_layout(
+        showlegend=True,
+        margin=dict(l=20, r=20, t=50, b=20),
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        height=400
+    )
+    return fig
+
+
+@fragment('Proyectos Agronomy Analyzer', 'tablero')
+def project_dashboard_section():
+    """Tablero de los proyectos; proyectos, KPIs y su versión salen de una misma instantánea."""
+    with get_session().snapshot_scope():
+        project_dashboard()
+
+
+def project_dashboard():
+    """Filtros, KPIs y gráficos de los proyectos."""
+    st.header("📊 Resumen de Proyectos y Análisis")
+
+    # El tablero no arma el DataFrame de los proyectos: las opciones de los filtros salen de la
+    # tabla Arrow y los KPIs, de una consulta filtrada sobre la vista agronomy_projects
+    figures = get_store().figures
+    with span('carga_datos'):
+        projects_version = projects_db.version()
+        table = projects_db.table()
+        if not table.num_rows:  # Solo mostrar el dashboard si hay datos
+            return
+        columns = table.column_names
+        all_clients, all_protocols = figures.value(
+            'proyectos_opciones', projects_version, lambda: project_filter_options(table)
+        )
 
     # --- 7.1 FILTROS (dentro de un Expander) ---
     with st.expander("Filtros del Dashboard"):
         col_filter1, col_filter2 = st.columns(2)
 
-        all_clients = df_projects['Cliente'].unique().tolist()
-        all_protocols = df_projects['Protocolo'].unique().tolist()
-
         with col_filter1:
             filter_client = st.multiselect(
                 "Filtrar por Cliente",
@@ -684,17 +893,25 @@ if projects_data:  # Solo mostrar el dashboard si hay datos
                 key="filter_protocol_dashboard"
             )
 
-    # Aplicar filtros
-    df_filtered = df_projects.copy()
-
-    if filter_client:
-        df_filtered = df_filtered[df_filtered['Cliente'].isin(filter_client)]
-
-    if filter_protocol:
-        df_filtered = df_filtered[df_filtered['Protocolo'].isin(filter_protocol)]
+    # Filtros del tablero ({columna: valores}); sin selección, o con todas las opciones, la columna no filtra
+    project_filters = {column: values for column, values, options in
+                       (('Cliente', filter_client, all_clients), ('Protocolo', filter_protocol, all_protocols))
+                       if values and set(values) != set(options)}
+
+    # --- EXPORTACIÓN (CSV / PARQUET / JSON LINES) ---
+    # Los mismos filtros del tablero, aplicados durante el scan de la exportación
+    export_projects_section(project_filters)
+
+    # KPIs y resúmenes en DuckDB sobre los proyectos filtrados, guardados por versión de los
+    # proyectos y filtros del tablero (ver figuras.py)
+    with span('kpis'):
+        project_kpis, protocol_status = figures.value(
+            'proyectos_kpis', projects_version, lambda: project_kpis_block(columns, project_filters),
+            filters=project_filters
+        )
 
     # --- VALIDACIÓN DE DATOS FILTRADOS ---
-    if df_filtered.empty:
+    if not project_kpis['proyectos']:
         st.warning("No hay datos disponibles para los filtros seleccionados.")
     else:
         # --- 7.2 KPIs Y GRÁFICOS ---
@@ -702,7 +919,7 @@ if projects_data:  # Solo mostrar el dashboard si hay datos
         col_kpi_total, col_kpi_count, col_kpi_progress, col_spacer = st.columns([2.5, 2.5, 3, 1])
 
         # 1. KPI de Horas Totales
-        total_hours = df_filtered['Total_Horas'].sum()
+        total_hours = project_kpis['total_horas']
 
         with col_kpi_total:
             st.metric(
@@ -713,7 +930,7 @@ if projects_data:  # Solo mostrar el dashboard si hay datos
             )
 
         # 2. KPI de Conteo de Proyectos
-        total_projects = len(df_filtered)
+        total_projects = int(project_kpis['proyectos'])
         with col_kpi_count:
             st.metric(
                 label="Proyectos Totales",
@@ -723,7 +940,7 @@ if projects_data:  # Solo mostrar el dashboard si hay datos
             )
 
         # 3. Indicador de Proyectos Terminados (Progreso/Tarjeta Personalizada)
-        completed_projects = df_filtered[df_filtered['Informe_Estado'] == 'Completado'].shape[0]
+        completed_projects = int(project_kpis['completados'])
         completion_percentage = (completed_projects / total_projects *100) if total_projects > 0 else 0
 
         # Uso de HTML para una "tarjeta" de progreso más visual
@@ -754,55 +971,23 @@ if projects_data:  # Solo mostrar el dashboard si hay datos
         # 4. Gráfico de Torta de Desglose de Horas por Etapa (Columna completa)
         col_chart, col_extra = st.columns([2, 1])
 
-        stage_hours = {
-            'Planificación': df_filtered['Planificacion_Horas'].sum(),
-            'Recopilación de Datos': df_filtered['Recopilacion_Horas'].sum(),
-            'Generación de Informe': df_filtered['Informe_Horas'].sum()
-        }
-
-        df_stage_hours = pd.DataFrame(
-            list(stage_hours.items()),
-            columns=['Etapa', 'Horas']
-        )
-
-        # Colores que coinciden con los estados (verde para informe, amarillo para recopilación, gris para planificación)
-        color_map_pie = {
-            'Generación de Informe': COLOR_COMPLETADO,
-            'Recopilación de Datos': COLOR_EN_PROCESO,
-            'Planificación': COLOR_NO_INICIADO
-        }
-
-        fig = px.pie(
-            df_stage_hours,
-            values='Horas',
-            names='Etapa',
-            title='Desglose de Horas por Etapa del Proyecto',
-            hole=.4,  # Efecto dona más marcado
-            color='Etapa',
-            color_discrete_map=color_map_pie
-        )
-
-        fig.update_traces(textposition='outside', textinfo='percent+label')
-        fig.update_layout(
-            showlegend=True,
-            margin=dict(l=20, r=20, t=50, b=20),
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(0,0,0,0)',
-            height=400
-        )
+        with span('graficos'):
+            fig = figures.figure(
+                'proyectos_horas_por_etapa', projects_version, lambda: stage_hours_figure(project_kpis),
+                filters=project_filters
+            )
 
         with col_chart:
             st.subheader("Desglose de Esfuerzo")
-            st.plotly_chart(fig, use_container_width=True)
+            with span('graficos'):
+                st.plotly_chart(fig, use_container_width=True)
 
         with col_extra:
             st.subheader("Estado de Protocolos")
-            # Gráfico de barras simple del estado de los protocolos
-            protocol_status = df_filtered.groupby('Protocolo')['Informe_Estado'].value_counts().unstack(fill_value=0)
-
+            # Tabla simple del estado de los protocolos (protocol_status: PIVOT calculado arriba)
             if not protocol_status.empty:
                 # Creamos una tabla simple, sin la columna 'Total' para mantener la limpieza
-                df_status_display = protocol_status.drop(columns=['Total'], errors='ignore').reset_index()
+                df_status_display = protocol_status.drop(columns=['Total'], errors='ignore')
 
                 # Mapeamos los estados a sus colores para visualización simple (opcional)
                 # En este caso, solo mostramos el conteo
@@ -818,3 +1003,10 @@ if projects_data:  # Solo mostrar el dashboard si hay datos
                         "No Iniciado": st.column_config.NumberColumn("No Iniciados", format="%d"),
                     }
                 )
+
+
+project_dashboard_section()
+
+# La instantánea fijada no se retiene entre reruns (la sesión queda solo con su versión)
+get_session().unpin()
+end_rerun()
\ No newline at end of file
@@ -0,0 +1,150 @@
+import math
+
+import pandas as pd
+import streamlit as st
+
+from almacen import QUERY_VIEWS
+
+# =================================================================
+# TABLAS EDITABLES PAGINADAS EN EL SERVIDOR
+# =================================================================
+# Los st.data_editor de clientes, ventas y proyectos recibían el DataFrame
+# completo: el navegador cargaba y dibujaba toda la colección en cada rerun.
+# Ahora reciben solo la página actual. La búsqueda, el orden, los filtros de la
+# página y el corte LIMIT/OFFSET se resuelven con una consulta de DuckDB sobre
+# la vista de la colección (ver consultas.py) o sobre un DataFrame que ya armó
+# la página, así abrir una tabla de 100.000 filas cuesta lo mismo que una de 100.
+# El conteo y la página se consultan sobre una misma instantánea: aunque la
+# sesión no la tenga fijada, una escritura ajena no los puede desencontrar.
+#
+# La página actual, el tamaño, el orden y la búsqueda viven en session_state
+# con el prefijo de la tabla ('<key>_pagina', '<key>_filas', ...). Cambiar de
+# página, de orden o de filtro descarta las ediciones sin guardar del editor:
+# sus filas editadas y eliminadas son posiciones dentro de la página mostrada
+# y dejarían de apuntar a los mismos documentos. Mientras tanto, las páginas
+# traducen esas posiciones al ID del documento con la misma página que le
+# pasaron al editor (ID_Cliente, ID_Venta o id).
+
+PAGE_SIZES = [25, 50, 100, 250]
+DEFAULT_PAGE_SIZE = 50
+
+
+class PagedTable:
+    """Vista paginada, ordenada y filtrada de una colección (o DataFrame) para un st.data_editor.
+
+    editor_key es la clave del st.data_editor (None para una tabla de solo lectura).
+    """
+
+    def __init__(self, key, editor_key, columns, id_column, order_by, descending=False, search_columns=None):
+        self.key = key
+        self.editor_key = editor_key
+        self.columns = list(columns)
+        self.id_column = id_column
+        self.search_columns = list(search_columns or columns)
+        st.session_state.setdefault(f"{key}_pagina", 0)
+        st.session_state.setdefault(f"{key}_filas", DEFAULT_PAGE_SIZE)
+        st.session_state.setdefault(f"{key}_orden", order_by)
+        st.session_state.setdefault(f"{key}_descendente", descending)
+        st.session_state.setdefault(f"{key}_busqueda", '')
+
+    def reset(self):
+        """Vuelve a la primera página y descarta las ediciones sin guardar de la página anterior."""
+        st.session_state[f"{self.key}_pagina"] = 0
+        self._discard_edits()
+
+    def _move(self, step):
+        st.session_state[f"{self.key}_pagina"] += step
+        self._discard_edits()
+
+    def _discard_edits(self):
+        if self.editor_key is not None:
+            st.session_state.pop(self.editor_key, None)
+
+    def controls(self, labels=None):
+        """Búsqueda, orden y filas por página (arriba de la tabla). labels: {columna: nombre visible}."""
+        labels = labels or {}
+        col_search, col_order, col_direction, col_size = st.columns([3, 2, 1, 1])
+        col_search.text_input(
+            "Buscar", key=f"{self.key}_busqueda", on_change=self.reset, placeholder="Texto en cualquier columna"
+        )
+        col_order.selectbox(
+            "Ordenar por", options=self.columns, format_func=lambda column: labels.get(column, column),
+            key=f"{self.key}_orden", on_change=self.reset
+        )
+        col_direction.toggle("Descendente", key=f"{self.key}_descendente", on_change=self.reset)
+        col_size.selectbox("Filas por página", options=PAGE_SIZES, key=f"{self.key}_filas", on_change=self.reset)
+
+    def load(self, session, source, filters=None, **frames):
+        """(DataFrame de la página actual, total de filas que cumplen los filtros y la búsqueda).
+
+        session es la vista de la sesión (get_session()); source, una vista de QUERY_VIEWS o el
+        nombre de un DataFrame de 'frames'; filters: {columna: valores permitidos}.
+        La página viene con índice 0..n-1.
+        """
+        store, snapshot = session.store, session.snapshot()
+        available = self._available_columns(store, snapshot, source, frames)
+        if not available:
+            return pd.DataFrame(columns=self.columns), 0
+
+        conditions, params = [], []
+        for column, values in (filters or {}).items():
+            values = list(values)
+            if column not in available or not values:
+                conditions.append('FALSE')
+            else:
+                conditions.append(f"{_quote(column)} IN ({', '.join('?' * len(values))})")
+                params.extend(values)
+        search = st.session_state[f"{self.key}_busqueda"].strip()
+        if search:
+            searchable = [column for column in self.search_columns if column in available]
+            pattern = '%' + search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            conditions.append('(' + (' OR '.join(
+                f"CAST({_quote(column)} AS VARCHAR) ILIKE ? ESCAPE '\\'" for column in searchable
+            ) or 'FALSE') + ')')
+            params.extend([pattern] * len(searchable))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+        count = store.query(f'SELECT COUNT(*) AS filas FROM {source} {where}', params, snapshot=snapshot, **frames)
+        total = int(count['filas'].iloc[0])
+        page_size = st.session_state[f"{self.key}_filas"]
+        pages = max(1, math.ceil(total / page_size))
+        page = min(max(st.session_state[f"{self.key}_pagina"], 0), pages - 1)
+        st.session_state[f"{self.key}_pagina"] = page
+
+        order = st.session_state[f"{self.key}_orden"]
+        if order not in available:
+            order = self.id_column
+        direction = 'DESC' if st.session_state[f"{self.key}_descendente"] else 'ASC'
+        # El ID desempata: con valores repetidos, cada fila queda siempre en la misma página
+        tiebreak = f", {_quote(self.id_column)}" if self.id_column in available and order != self.id_column else ''
+        select = ', '.join(
+            _quote(column) if column in available else f"NULL AS {_quote(column)}" for column in self.columns
+        )
+        rows = store.query(
+            f'SELECT {select} FROM {source} {where} '
+            f'ORDER BY {_quote(order)} {direction} NULLS LAST{tiebreak} LIMIT ? OFFSET ?',
+            params + [page_size, page * page_size], snapshot=snapshot, **frames
+        )
+        return rows.reset_index(drop=True), total
+
+    def navigation(self, total):
+        """Página anterior / siguiente y la posición actual (debajo de la tabla)."""
+        page = st.session_state[f"{self.key}_pagina"]
+        pages = max(1, math.ceil(total / st.session_state[f"{self.key}_filas"]))
+        col_previous, col_position, col_next = st.columns([1, 4, 1])
+        col_previous.button(
+            "◀ Anterior", key=f"{self.key}_anterior", disabled=page == 0, on_click=self._move, args=(-1,)
+        )
+        col_position.caption(f"Página {page + 1} de {pages} · {total:,} filas")
+        col_next.button(
+            "Siguiente ▶", key=f"{self.key}_siguiente", disabled=page >= pages - 1, on_click=self._move, args=(1,)
+        )
+
+    def _available_columns(self, store, snapshot, source, frames):
+        if source in frames:
+            return set(frames[source].columns)
+        return set(store.columnar.table(snapshot, QUERY_VIEWS[source]).column_names)
+
+
+def _quote(column):
+    return '"' + column.replace('"', '""') + '"'
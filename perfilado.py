@@ -0,0 +1,154 @@
+import cProfile
+import os
+import pstats
+import re
+import shutil
+import threading
+import time
+import tracemalloc
+import unicodedata
+
+# =================================================================
+# CAPTURA DE PERFILES BAJO DEMANDA (cProfile + tracemalloc)
+# =================================================================
+# Envuelve un rerun completo de una página en cProfile y tracemalloc para ver
+# en el despliegue real, con sus datos reales, por qué una página está lenta.
+# Se activa para todas las reruns con SMARTFARM_PROFILE=1, o solo para la
+# sesión que abre la página con '?perfil=1' en la URL. metricas.start_rerun y
+# metricas.end_rerun arrancan y cierran la captura.
+#
+# Cada captura queda en un directorio propio dentro de SMARTFARM_PROFILE_DIR,
+# con el nombre de la página y la hora:
+#   perfiles/Analisis_de_Puntuacion_20250101-120000-123/
+#     rerun.prof        perfil de cProfile (snakeviz, pstats, ...)
+#     funciones.txt     las funciones con más tiempo acumulado
+#     memoria.txt       pico de memoria y líneas que más memoria asignaron
+# Solo se conservan las últimas PROFILE_KEEP capturas.
+#
+# cProfile y tracemalloc son globales del proceso: se captura una rerun a la
+# vez y las que llegan mientras tanto (otras sesiones) corren sin perfilar.
+# Una captura que su rerun no cerró (st.rerun()/st.stop() o una excepción) se
+# descarta cuando su hilo termina o cuando ese mismo hilo (Streamlit reutiliza
+# el de cada sesión) empieza otra.
+
+PROFILE_ALWAYS = os.environ.get('SMARTFARM_PROFILE') == '1'
+PROFILE_DIR = os.environ.get('SMARTFARM_PROFILE_DIR', 'perfiles')
+PROFILE_KEEP = int(os.environ.get('SMARTFARM_PROFILE_KEEP', '20'))
+PROFILE_TOP = 40  # Filas de los informes de texto
+TRACEMALLOC_FRAMES = 1
+
+_capture_lock = threading.Lock()
+_active = None  # Captura en curso (como mucho una por proceso)
+
+
+class ProfileCapture:
+    """cProfile y tracemalloc activos durante una rerun de una página."""
+
+    def __init__(self, page):
+        self.page = page
+        self.timestamp = time.time()
+        self.thread = threading.current_thread()
+        self.profiler = cProfile.Profile()
+        self.started_tracemalloc = not tracemalloc.is_tracing()
+        if self.started_tracemalloc:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        tracemalloc.reset_peak()
+        self.memory_before = tracemalloc.take_snapshot()
+        self.profiler.enable()
+
+    def stop(self):
+        """Detiene la captura y escribe sus informes. Devuelve el directorio de la captura."""
+        self.profiler.disable()
+        memory_after = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+
+        path = os.path.join(PROFILE_DIR, f"{_slug(self.page)}_{_stamp(self.timestamp)}")
+        os.makedirs(path, exist_ok=True)
+        self.profiler.dump_stats(os.path.join(path, 'rerun.prof'))
+        with open(os.path.join(path, 'funciones.txt'), 'w', encoding='utf-8') as f:
+            pstats.Stats(self.profiler, stream=f).sort_stats('cumulative').print_stats(PROFILE_TOP)
+        with open(os.path.join(path, 'memoria.txt'), 'w', encoding='utf-8') as f:
+            f.write(f"Página: {self.page}\n")
+            f.write(f"Memoria trazada al final: {current / 1024:,.1f} KiB | pico de la rerun: {peak / 1024:,.1f} KiB\n\n")
+            f.write(f"Líneas que más memoria asignaron durante la rerun (top {PROFILE_TOP}):\n")
+            filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+            stats = memory_after.filter_traces(filters).compare_to(
+                self.memory_before.filter_traces(filters), 'lineno'
+            )
+            for stat in stats[:PROFILE_TOP]:
+                f.write(f"{stat}\n")
+        _rotate()
+        return path
+
+
+def wanted(query_params):
+    """Si hay que perfilar esta rerun (variable de entorno o '?perfil=1')."""
+    return PROFILE_ALWAYS or query_params.get('perfil') == '1'
+
+
+def start_capture(page):
+    """Comienza a perfilar la rerun actual; None si ya hay otra captura en curso."""
+    global _active
+    if not _capture_lock.acquire(blocking=False):
+        # Una rerun cortada no llegó a cerrar su captura: es vieja si su hilo terminó o si es este mismo
+        stale = _active
+        if stale is None or (stale.thread.is_alive() and stale.thread is not threading.current_thread()):
+            return None
+        _discard(stale)
+        if not _capture_lock.acquire(blocking=False):
+            return None
+    try:
+        _active = ProfileCapture(page)
+    except Exception:
+        _capture_lock.release()
+        raise
+    return _active
+
+
+def stop_capture(capture):
+    """Cierra la captura y escribe sus informes; devuelve el directorio (o None si falló)."""
+    global _active
+    if capture is not _active:
+        return None
+    try:
+        return capture.stop()
+    except (OSError, ValueError) as e:
+        print(f"AVISO: No se pudo guardar el perfil de '{capture.page}': {e}")
+        return None
+    finally:
+        _active = None
+        _capture_lock.release()
+
+
+def discard_capture(capture):
+    """Detiene la captura sin escribir informes (la rerun que la abrió no llegó a cerrarla)."""
+    if capture is _active:
+        _discard(capture)
+
+
+def _discard(capture):
+    global _active
+    capture.profiler.disable()
+    if capture.started_tracemalloc:
+        tracemalloc.stop()
+    _active = None
+    _capture_lock.release()
+
+
+def _rotate():
+    """Borra las capturas más viejas del directorio y deja las últimas PROFILE_KEEP."""
+    entries = [entry for entry in os.scandir(PROFILE_DIR) if entry.is_dir()]
+    entries.sort(key=lambda entry: entry.stat().st_mtime)
+    for entry in entries[:max(len(entries) - PROFILE_KEEP, 0)]:
+        shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def _slug(page):
+    ascii_name = unicodedata.normalize('NFKD', page).encode('ascii', 'ignore').decode()
+    return re.sub(r'[^A-Za-z0-9]+', '_', ascii_name).strip('_') or 'pagina'
+
+
+def _stamp(timestamp):
+    return time.strftime('%Y%m%d-%H%M%S', time.localtime(timestamp)) + f"-{int(timestamp * 1000) % 1000:03d}"
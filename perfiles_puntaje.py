@@ -0,0 +1,195 @@
+import numpy as np
+
+# =================================================================
+# REGISTRO DE PERFILES DE PUNTUACIÓN SMARTFARM
+# =================================================================
+# Ítems, puntajes máximos y descripciones de cada categoría de evaluación, con
+# sus versiones. Es la única definición de la rúbrica: la leen las páginas, el
+# almacén (codificacion_puntajes.py, ScoreAggregates) y los benchmarks.
+#
+# El módulo se importa una vez por proceso y REGISTRY compila cada versión de
+# cada perfil una sola vez: tupla de ítems, posición de cada ítem, vector NumPy
+# de máximos y total máximo. Los reruns de las páginas no vuelven a armar nada.
+#
+# Para cambiar la rúbrica de una categoría: copiar su perfil vigente a
+# PREVIOUS_PROFILES con la versión que tenía, editar SCORING_PROFILES y subir su
+# número en PROFILE_VERSIONS. Cada evaluación guarda la versión con la que se
+# cargó (Version_Perfil), así que las anteriores se siguen decodificando y
+# puntuando con sus propios ítems y máximos.
+
+# Diccionario Maestro que define los items, máximos y descripciones vigentes para cada categoría
+SCORING_PROFILES = {
+    "Granos": {
+        "SCORE_MAX": {
+            "**Item 1:** Organización y estandarización de lotes.": 5, "**Item 2:** Línea de guiado.": 5,
+            "**Item 3:** Organización altamente conectada.": 10, "**Item 4:** Uso de planificador de trabajo.": 15,
+            "**Item 5:** Uso de Operations Center Mobile.": 10, "**Item 6:** JDLink.": 5,
+            "**Item 7:** Envío remoto. Mezcla de tanque.": 10, "**Item 8:** % uso de autotrac en Tractor.": 10,
+            "**Item 9:** % uso autotrac Cosecha.": 10, "**Item 10:** % uso autotrac Pulverización.": 10,
+            "**Item 11:** Uso de funcionalidades avanzadas.": 15, "**Item 12:** Uso de tecnologías integradas.": 10,
+            "**Item 13:** Señal de corrección StarFire.": 5, "**Item 14:** Paquete CSC.": 10,
+            "**Item 15:** Vinculación de API.": 5, "**Item 16:** JDLink en otra marca.": 15
+        },
+        "ITEM_DESCRIPTIONS": {
+            "**Item 1:** Organización y estandarización de lotes.": "Captura de pantalla desde Operations Center: Configuración/ Campos / Campos / Vista tabla. Excel o PDF de vista anterior. **>>Consideraciones:** En el caso de organizaciones con menos del 50% fuera del estándar, la puntuación de este ítem se restablece a cero. Caso contrario se otorgará el puntaje proporcional correspondiente: 50 a 60 % 1 punto | 60 a 70 % 2 puntos | 70 a 80% 3 puntos | 80 a 90 % 4 puntos | más de 90 % 5 puntos.",
+            "**Item 2:** Línea de guiado.": "Captura de pantalla desde Operations Center, de la tabla: Configuración/ Campos/ Filtro <campos sin guiado>; y Captura de pantalla desde Operations Center: Configuración/Campos/Campos totales (sin filtro aplicado). **>>Consideraciones:** Será requisito para obtener los 5 puntos, que el 20% de los lotes cuenten con guiado.",
+            "**Item 3:** Organización altamente conectada.": "Al menos un campo con tres tipos de labores cargadas.",
+            "**Item 4:** Uso de planificador de trabajo.": "Video demostrativo de los Planes de Trabajo enviados al equipo durante los últimos 12 meses, al menos 4 meses antes de la presentación de la evidencia. **>>Consideraciones:** En los últimos 12 meses tener al menos una operación de cada una de las 3 etapas (siembra - pulverización - cosecha) en la cual se haya utilizando el planificador de trabajo. El trabajo necesariamente debe haber sido enviado al equipo y debe tener al menos un 20% de avance. Cada etapa contabiliza 5 puntos, siendo posible acumular 15 puntos al utilizar el planificador de trabajo en las 3 etapas.",
+            "**Item 5:** Uso de Operations Center Mobile.": "Grabación de video que demuestre la navegación en la plataforma Móvil, capturando la pantalla inicial y demostrando información de al menos un equipo y un mapa agronómico y la vista del planificador de trabajo. La ausencia de cualquiera de los ítems descritos anteriormente se considerará puntuación cero para este ítem; y Video del cliente mencionando los beneficios obtenidos al utilizar el Centro de Operaciones, hablando de al menos una ganancia al utilizarlo. **>>Consideraciones:** Al ser un testimonio auténtico y reciente creado para la evaluación de este ítem describiendo la principal funcionalidad utilizada (planificador de trabajo, alertas, analizador de campo) debe incluir un testimonio del cliente y/o miembros de su equipo. Serán descalificados los vídeos grabados que demuestren operaciones del Distribuidor y/o de terceros. Vídeo con una duración mínima de 1,5 minutos y máxima de 3 minutos.",
+            "**Item 6:** JDLink.": "Captura de pantalla desde Operations Center de la pestaña Equipo, que demuestre el Servicio de Conectividad JDLink; y Captura pantalla sin fitro, donde se visualice el total de máquinas. **>>Consideraciones:** En el caso de organizaciones con menos del 30% de máquinas con servicio de conectividad activado, la puntuación de este ítem se restablece a cero. Se otorgará el puntaje proporcional correspondiente: 30 a 40 % 1 punto | 40 a 50% 2 puntos | 50 a 60% 3 puntos | 60 a 70 % 4 puntos | más de 70% 5 puntos. Los dispositivos pendientes de transferencia y/o inactivos no se contarán.",
+            "**Item 7:** Envío remoto. Mezcla de tanque.": "Captura de pantalla desde Operations Center donde se vea una mezcla de tanque generada; o Captura de pantalla desde SIA evidenciando uso de ordenes de trabajo. **>>Consideraciones:** Para el caso de SIA los puntajes impactarán según se detalla a continuación: 20 a 30% 1 puntos | 30 a 40% 2 puntos | 40 a 50 % 5 puntos | más de 50% 10 puntos.",
+            "**Item 8:** % uso de autotrac en Tractor.": "Captura de pantalla en analizador de máquina/ uso de tecnología donde se muestren todos los equipos de la organización. **>>Consideraciones:** Se solicitará en promedio, un 40% de uso de autotrac en tractores de mas de 140 hp.",
+            "**Item 9:** % uso autotrac Cosecha.": "Captura de pantalla en analizador de máquina/ uso de tecnología donde se muestren todos los equipos de la organización. **>>Consideraciones:** Se solicitará en promedio, un 70% de uso de autotrac en cosechadoras.",
+            "**Item 10:** % uso autotrac Pulverización.": "Captura de pantalla en analizador de máquina/ uso de tecnología donde se muestren todos los equipos de la organización. **>>Consideraciones:** Se solicitará en promedio, un 70% de uso de autotrac en pulverizadoras.",
+            "**Item 11:** Uso de funcionalidades avanzadas.": "Reporte de uso de funcionalidades avanzadas: 7 Puntos | Vídeo testimonio de cliente que demuestre el uso de funcionalidades avanzadas: 8 puntos. **>>Consideraciones:** Sólo se considerarán videos que describan la fecha de la operación, la cual debe ser en el año agrícola en curso. El vídeo deberá registrar el testimonio por parte del cliente y/o miembros de su equipo. Serán descalificados los vídeos grabados que demuestren operaciones del Distribuidor y/o de terceros.",
+            "**Item 12:** Uso de tecnologías integradas.": "Captura de pantalla desde Operations Center, que evidencie el uso de tecnologías integradas. **>>Consideraciones:** Combine Advisor/ActiveYield: 4 puntos | ExactApply: 3 puntos | Control de sección: 3 puntos",
+            "**Item 13:** Señal de corrección StarFire.": "Captura de pantalla desde Operations Center en Analizador de máquina/uso de tecnología. **>>Consideraciones:** Señal de corrección StarFire y/o RTK (SF2, SF3, SF-RTK y RTK) en al menos en una etapa del ciclo productivo. Se obtendrá 1 punto extra dentro del item si se utiliza señal SF-RTK.",
+            "**Item 14:** Paquete CSC.": "Factura del paquete contratado.",
+            "**Item 15:** Vinculación de API.": "Captura de pantalla desde Operations Center: Configuración / Conexiones / Seleccionar la herramienta conectada / Administrar / Organizaciones conectadas. **>>Consideraciones:** La fecha de conexión, que debe ser mayor a 4 meses desde la fecha de envío del informe.",
+            "**Item 16:** JDLink en otra marca.": "Captura de pantalla desde <Equipos> en Operations Center."
+        }
+    },
+    "Ganadería": {
+        "SCORE_MAX": {  # 13 Ítems - Total Máximo: 130
+            "**Item 1:** Organización y estandarización de lotes.": 15,
+            "**Item 2:** Digitalizar capa de siembra y mapa de picado.": 10,
+            "**Item 3:** Uso de planificador de trabajo.": 20,
+            "**Item 4:** Equipo registrados en el Centro de Operaciones.": 5,
+            "**Item 5:** Operadores registrados en el Centro de Operaciones.": 5,
+            "**Item 6:** Productos registrados en el Centro de Operaciones.": 5,
+            "**Item 7:** Uso de Operations Center Mobile.": 10,
+            "**Item 8:** JDLink activado en máquinas John Deere.": 10,
+            "**Item 9:** Planes de mantenimiento en tractores.": 10,
+            "**Item 10:** Mapeo de constituyentes.": 20,
+            "**Item 11:** Conectividad alimentación.": 20,
+            "**Item 12:** Generación de informes.": 10,
+            "**Item 13:** Paquete contratado con el concesionario (CSC).": 10
+        },
+        "ITEM_DESCRIPTIONS": {
+            "**Item 1:** Organización y estandarización de lotes.": "Captura de pantalla desde Operations Center: Configuración/ Campos / Campos / Vista tabla. Excel o PDF de vista anterior. **>>Consideraciones:**  En el caso de organizaciones con menos del 50% fuera del estándar, la puntuación de este ítem se restablece a cero. Caso contrario se otorgará el puntaje proporcional correspondiente: 50 a 60 % 1 punto | 60 a 70 % 3 puntos | 70 a 80% 9 puntos | 80 a 90 % 12 puntos | más de 90 % 15 puntos.",
+            "**Item 2:** Digitalizar capa de siembra y mapa de picado.": "En al menos un lote tener digitalizada la capa de siembra y mapa de picado , que se evidenciará con una Captura de pantalla en el Analizador de Trabajo con la herramienta <comparar> , en la que se muestre el mapa de siembra y el mapa de picado dentro de la campaña. **>>Consideraciones:** Adicional de 5 puntos si se realizó alguna labor de manera variable (siembra o fertilización). Adicional de 5 puntos si en el lote hay lineas de guiado.",
+            "**Item 3:** Uso de planificador de trabajo.": "En los últimos 12 meses tener al menos una operación de cada una de las 3 etapas utilizando el planificador de trabajo. **>>Consideraciones:** Siembra vale 6 puntos | Pulverización 7 puntos | Cosecha 7 puntos | Las 3 etapas acumulan 20 puntos.",
+            "**Item 4:** Equipo registrados en el Centro de Operaciones.": "Video demostrativo de la organización donde se vea dos equipos y al menos un implemento asociado a la alimentación en cargador frontal.",
+            "**Item 5:** Operadores registrados en el Centro de Operaciones.": "Video que demuestra el registro de al menos un empleado en la pestaña equipo en Operations Center.",
+            "**Item 6:** Productos registrados en el Centro de Operaciones.": "Video de la pestaña <Productos> demostrando los químicos, variedades, fertilizantes, mezcla (si se usa), con al menos un producto químico o variedad registrada.",
+            "**Item 7:** Uso de Operations Center Mobile.": "Grabación de video que demuestre la navegación en la plataforma Móvil, capturando la pantalla inicial y demostrando información de al menos un equipo y un mapa agronómico y la vista del planificador de trabajo. La ausencia de cualquiera de los ítems descritos anteriormente se considerará puntuación cero para este ítem; y Testimonio de cliente con el beneficio de utilizar el Centro de Operaciones mencionando los beneficios obtenidos al utilizar el Centro de Operaciones, hablando de al menos una ganancia al utilizarlo. **>>Consideraciones:** Al ser un testimonio auténtico y reciente creado para la evaluación de este ítem describiendo la principal funcionalidad utilizada (planificador de trabajo, alertas, analizador de campo) debe incluir un testimonio del cliente y/o miembros de su equipo. Serán descalificados los vídeos grabados que demuestren operaciones del Distribuidor y/o de terceros. Vídeo con una duración mínima de 1,5 minutos y máxima de 3 minutos.",
+            "**Item 8:** JDLink activado en máquinas John Deere.": "Captura de pantalla desde Operations Center de la pestaña Equipo, que demuestre el Servicio de Conectividad JDLink; y Captura pantalla sin filtro, donde se visualice el total de máquinas. **>>Consideraciones:** En el caso de organizaciones con menos del 30% de máquinas con servicio de conectividad activado, la puntuación de este ítem se restablece a cero. Se otorgará el puntaje proporcional correspondiente: 30 a 40 % 1 punto | 40 a 50% 2 puntos | 50 a 60% 4 puntos | 60 a 70 % 6 puntos | más de 70% 10 puntos. Los dispositivos pendientes de transferencia y/o inactivos no se contarán.",
+            "**Item 9:** Planes de mantenimiento en tractores.": "Captura de pantalla de los planes de mantenimiento asociado a tractores responsables de la alimentación.",
+            "**Item 10:** Mapeo de constituyentes.": "10 puntos con al menos un mapa de constituyentes en los últimos 12 meses. 10 puntos por testimonial de importancia de sensado de constituyentes.",
+            "**Item 11:** Conectividad alimentación.": "Al menos un tractor con conectividad visible en Operations Center. Evidencia captura de pantalla o video demostrando el recorrido en el patio de comida.",
+            "**Item 12:** Generación de informes.": "Captura de pantalla desde Archivos/ Informes donde se visualice al menos un informe de máquina generado en los últimos doce meses. La fecha debe ser mayor a 4 meses desde la fecha de envío del informe.",
+            "**Item 13:** Paquete contratado con el concesionario (CSC).": "Factura del paquete contratado."
+        }
+    },
+    "Cultivos de Alto Valor": {
+        "SCORE_MAX": {  # 14 Ítems - Total Máximo: 135
+            "**Item 1:** Organización y estandarización de lotes.": 15,
+            "**Item 2:** Lineas de guiado.": 5,
+            "**Item 3:** Tener al menos una labor digitalizada.": 10,
+            "**Item 4:** Uso de planificador de trabajo para alguna operación.": 15,
+            "**Item 5:** Uso del Operations Center Mobile.": 10,
+            "**Item 6:** JDLink activado en máquinas John Deere.": 10,
+            "**Item 7:** % uso de autotrac en Tractor.": 20,
+            "**Item 8:** Implement Guidance.": 20,
+            "**Item 9:** Señal de corrección StarFire.": 10,
+            "**Item 10:** Paquete contratado con el concesionario (CSC).": 10,
+            "**Item 11:** Equipos Registrados en Operations Center.": 5,
+            "**Item 12:** Operadores registrados en Operations Center.": 5,
+            "**Item 13:** Productos registrados en el Operations Center.": 5,
+            "**Item 14:** Configuración de Alertas Personalizables.": 10
+        },
+        "ITEM_DESCRIPTIONS": {
+            "**Item 1:** Organización y estandarización de lotes.": "Captura de pantalla desde Operations Center: Configuración/ Campos / Campos / Vista tabla. Excel o PDF de vista anterior. **>>Consideraciones:**  En el caso de organizaciones con menos del 50% fuera del estándar, la puntuación de este ítem se restablece a cero. Caso contrario se otorgará el puntaje proporcional correspondiente: 50 a 60 % 1 punto | 60 a 70 % 3 puntos | 70 a 80% 9 puntos | 80 a 90 % 12 puntos | más de 90 % 15 puntos.",
+            "**Item 2:** Lineas de guiado.": "Captura de pantalla desde Operations Center, de la tabla: Configuración/ Campos/ Filtro <campos sin guiado> y, Captura de pantalla desde Operations Center: Configuración/Campos/Campos totales (sin filtro aplicado). **>>Consideraciones:** Será requisito para obtener los 5 puntos, que el 20% de los lotes cuenten con guiado.",
+            "**Item 3:** Tener al menos una labor digitalizada.": "Tener una operación digitalizada. Presentar el pdf del informe del Analizador de Trabajo de cualquier operación, ya sea preparación de suelo, siembra, pulverización o cosecha que se haya realizado.",
+            "**Item 4:** Uso de planificador de trabajo para alguna operación.": "Captura de pantalla en la sección planificador de trabajo con al menos un trabajo enviado en los últimos 12 meses",
+            "**Item 5:** Uso del Operations Center Mobile.": "Grabación de video que demuestre la navegación en la plataforma Móvil, capturando la pantalla inicial y demostrando información de al menos un equipo y un mapa agronómico y la vista del planificador de trabajo. La ausencia de cualquiera de los ítems descritos anteriormente se considerará puntuación cero para este ítem y, Video del cliente mencionando los beneficios obtenidos al utilizar el Centro de Operaciones, hablando de al menos una ganancia al utilizarlo. **>>Consideraciones:** Al ser un testimonio auténtico y reciente creado para la evaluación de este ítem describiendo la principal funcionalidad utilizada (planificador de trabajo, alertas, analizador de campo) debe incluir un testimonio del cliente y/o miembros de su equipo. Serán descalificados los vídeos grabados que demuestren operaciones del Distribuidor y/o de terceros. Vídeo con una duración mínima de 1,5 minutos y máxima de 3 minutos.",
+            "**Item 6:** JDLink activado en máquinas John Deere.": "Captura de pantalla desde Operations Center de la pestaña Equipo, que demuestre el Servicio de Conectividad JDLink; y Captura pantalla sin filtro, donde se visualice el total de máquinas. **>>Consideraciones:** En el caso de organizaciones con menos del 30% de máquinas con servicio de conectividad activado, la puntuación de este ítem se restablece a cero. Se otorgará el puntaje proporcional correspondiente: 30 a 40 % 1 punto | 40 a 50% 2 puntos | 50 a 60% 4 puntos | 60 a 70 % 6 puntos | más de 70% 10 puntos. Los dispositivos pendientes de transferencia y/o inactivos no se contarán.",
+            "**Item 7:** % uso de autotrac en Tractor.": "Captura de pantalla en analizador de máquina/ uso de tecnología donde se muestren todos los equipos de la organización. **>>Consideraciones:** Se solicitará en promedio, un 30% de uso de autotrac en tractores de mas de 140 hp.",
+            "**Item 8:** Implement Guidance.": "Vídeo testimonio de cliente de funcionalidad avanzada. Solo se considerarán videos que describan la fecha de la operación, la cual debe ser en el año agrícola en curso. El vídeo deberá registrar el testimonio por parte del cliente y/o miembros de su equipo. Serán descalificados los vídeos grabados que demuestren operaciones del Distribuidor y/o de terceros. **>>Consideraciones:** Puede considerarse nivelación para México.",
+            "**Item 9:** Señal de corrección StarFire.": "Captura de pantalla desde Operations Center en Analizador de máquina/uso de tecnología. **>>Consideraciones:** Señal de corrección StarFire y/o RTK (SF2, SF3, SF-RTK y RTK) en al menos en una etapa del ciclo productivo. Se obtendrá 1 punto extra dentro del item si se utiliza señal SF-RTK.",
+            "**Item 10:** Paquete contratado con el concesionario (CSC).": "Factura del paquete contratado.",
+            "**Item 11:** Equipos Registrados en Operations Center.": "Video demostrativo de la organización donde se vea dos equipos y al menos un implemento.",
+            "**Item 12:** Operadores registrados en Operations Center.": "Video que demuestra el registro de al menos un empleado en la pestaña equipo en Operations Center.",
+            "**Item 13:** Productos registrados en el Operations Center.": "Video de la pestaña Productos demostrando los químicos, variedades, fertilizantes, mezcla (si se usa), con al menos un producto químico o variedad registrada.",
+            "**Item 14:** Configuración de Alertas Personalizables.": "Captura de pantalla de alguna alerta personalizable mostrando la fecha que debe ser mayor a 4 meses desde la fecha del envío del informe."
+        }
+    }
+}
+
+# Versión vigente del perfil de cada categoría
+PROFILE_VERSIONS = {
+    "Granos": 1,
+    "Ganadería": 1,
+    "Cultivos de Alto Valor": 1,
+}
+
+# Versiones anteriores: {(categoría, versión): {"SCORE_MAX": {...}, "ITEM_DESCRIPTIONS": {...}}}
+PREVIOUS_PROFILES = {}
+
+DEFAULT_DESCRIPTION = 'Detalle no disponible.'
+
+
+class CompiledProfile:
+    """Una versión del perfil de una categoría, con sus ítems precompilados."""
+
+    __slots__ = ('category', 'version', 'items', 'positions', 'max_scores', 'max_vector', 'total_max',
+                 'descriptions', 'labels')
+
+    def __init__(self, category, version, profile):
+        score_max = profile['SCORE_MAX']
+        descriptions = profile.get('ITEM_DESCRIPTIONS', {})
+        self.category = category
+        self.version = version
+        self.items = tuple(score_max)  # Títulos, en el orden de la lista guardada
+        self.positions = {item: position for position, item in enumerate(self.items)}
+        self.max_scores = tuple(score_max.values())
+        self.max_vector = np.array(self.max_scores, dtype=float)
+        self.max_vector.flags.writeable = False
+        self.total_max = sum(self.max_scores)
+        self.descriptions = tuple(descriptions.get(item, DEFAULT_DESCRIPTION) for item in self.items)
+        self.labels = tuple(item.replace('**', '') for item in self.items)  # Títulos sin markdown
+
+    @property
+    def score_max(self):
+        """{ítem: puntaje máximo}, en el orden del perfil."""
+        return dict(zip(self.items, self.max_scores))
+
+
+class ProfileRegistry:
+    """Todas las versiones de los perfiles de puntuación, compiladas al crear el registro."""
+
+    def __init__(self, current, versions, previous):
+        self.categories = list(current)
+        self._current = {}
+        self._history = {category: [] for category in current}
+        for (category, version), profile in previous.items():
+            self._history.setdefault(category, []).append(CompiledProfile(category, version, profile))
+        for category, profile in current.items():
+            compiled = CompiledProfile(category, versions[category], profile)
+            self._current[category] = compiled
+            self._history[category].append(compiled)
+        self._profiles = {}
+        for category, profiles in self._history.items():
+            profiles.sort(key=lambda compiled: compiled.version)
+            for compiled in profiles:
+                self._profiles[(category, compiled.version)] = compiled
+        # Todos los ítems vigentes (sin repetir), en orden de aparición
+        self.all_items = tuple(dict.fromkeys(item for compiled in self._current.values() for item in compiled.items))
+
+    def current(self, category):
+        """Perfil vigente de la categoría (None si no existe)."""
+        return self._current.get(category)
+
+    def get(self, category, version=None):
+        """Perfil de la categoría en esa versión; sin versión (o vacía), el vigente. None si no existe."""
+        if version is None or version != version:
+            return self._current.get(category)
+        return self._profiles.get((category, version))
+
+    def history(self, category):
+        """Todas las versiones del perfil de la categoría, de la más vieja a la vigente."""
+        return list(self._history.get(category, ()))
+
+
+REGISTRY = ProfileRegistry(SCORING_PROFILES, PROFILE_VERSIONS, PREVIOUS_PROFILES)